@@ -0,0 +1,349 @@
+# cli.py
+"""
+Command line for building map IWDs without the GUI.
+
+    python -m cli analyze mp_mymap [--json]
+    python -m cli pack mp_mymap -o zz_mp_mymap.iwd [--full] [--reproducible] [--json]
+    python -m cli batch -d out/ [--filter "mp_*"] [--full] [--reproducible] [--json]
+    python -m cli graph mp_mymap [--format json|dot] [--why FILE]
+    python -m cli budget mp_mymap [--top N] [--json]
+    python -m cli textures mp_mymap [--top N] [--json]
+    python -m cli encode img.png [img2.tga ...] [-d DIR] [--format auto|dxt1|dxt5|argb8|...] [--filter box|lanczos]
+    python -m cli loadscreen mp_mymap loadscreen.png [--format auto|dxt1|...]
+    python -m cli thumbnails [MODEL ...] [--force] [--json]
+
+The CoD2 folder defaults to the one last used in the GUI (config.json).
+Only results go to stdout; progress and debug output go to stderr.
+Exit codes: 0 success, 1 failure (batch: any map failed), 2 bad usage
+(argparse), 3 nothing to pack.
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+from config import DEFAULT_COD2_PATH, load_config
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_NOTHING_TO_PACK = 3
+
+
+def _default_cod2_path() -> str:
+    return load_config().get("last_cod2_path", str(DEFAULT_COD2_PATH))
+
+
+def _to_json(value):
+    """Paths -> strings, recursively, for json.dumps"""
+    if isinstance(value, Path):
+        return str(value)
+    if isinstance(value, dict):
+        return {k: _to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [_to_json(v) for v in value]
+    return value
+
+
+def _detach_stdout():
+    """
+    Points fd 1 (and so sys.stdout and worker processes) at stderr, keeping the
+    original stdout for results. Returns a text file for the real stdout.
+    """
+    sys.stdout.flush()
+    result_fd = os.dup(1)
+    os.dup2(2, 1)
+    return os.fdopen(result_fd, "w", encoding="utf-8")
+
+
+def _analysis_summary(analysis: dict) -> dict:
+    assets = analysis["assets"]
+    return {
+        "files": analysis["files"],
+        "overrides": analysis["overrides"],
+        "duplicates": analysis["duplicates"],
+        "skipped_missing": analysis["skipped_missing"],
+        "missing_xmodels": assets["missing_xmodels"],
+        "missing_materials": assets["missing_materials"],
+        "missing_textures": assets["missing_textures"],
+        "hidden_fx_paths": assets["hidden_fx_paths"],
+        "prefabs_processed": assets["prefabs_processed"],
+        "seconds": round(analysis["seconds"], 3),
+    }
+
+
+def cmd_analyze(args) -> int:
+    from map_packer import analyze_map
+
+    cod2_path = Path(args.cod2)
+    analysis = analyze_map(cod2_path, args.map, jobs=args.jobs)
+    if args.json:
+        print(json.dumps(_to_json(_analysis_summary(analysis)), indent=2), file=args.out)
+    else:
+        for path in analysis["files"]:
+            print(path, file=args.out)
+        print(f"{len(analysis['files'])} files ({len(analysis['overrides'])} stock overrides, "
+              f"{len(analysis['duplicates'])} stock duplicates skipped) in {analysis['seconds']:.1f}s",
+              file=sys.stderr)
+    return EXIT_OK if analysis["files"] else EXIT_NOTHING_TO_PACK
+
+
+def cmd_pack(args) -> int:
+    from map_packer import analyze_map, pack_files
+
+    cod2_path = Path(args.cod2)
+    output = Path(args.output or f"zz_custom_{args.map}.iwd")
+    analysis = analyze_map(cod2_path, args.map, jobs=args.jobs)
+    if not analysis["files"]:
+        print(f"No custom or map files detected for {args.map}", file=sys.stderr)
+        return EXIT_NOTHING_TO_PACK
+
+    report = pack_files(analysis["files"], output, cod2_path, update=not args.full, jobs=args.jobs,
+                        reproducible=args.reproducible)
+    if args.json:
+        print(json.dumps(_to_json({
+            "output": output,
+            "analysis": _analysis_summary(analysis),
+            "pack": report,
+        }), indent=2), file=args.out)
+    elif report["unchanged"]:
+        print(f"{output} is up to date ({report['files']} files, sha256 {report['sha256']})", file=args.out)
+    else:
+        print(f"Packed {report['files']} files into {output} "
+              f"({report['bytes_out'] / 1048576:.1f} MB, {report['seconds']:.1f}s)", file=args.out)
+    return EXIT_OK
+
+
+def cmd_batch(args) -> int:
+    from map_packer import batch_pack_maps
+
+    result = batch_pack_maps(Path(args.cod2), Path(args.output_dir), args.filter, update=not args.full,
+                             jobs=args.jobs, reproducible=args.reproducible)
+    if args.json:
+        print(json.dumps(_to_json(result), indent=2), file=args.out)
+    else:
+        for r in result["maps"]:
+            if r["error"]:
+                status = f"FAILED: {r['error']}"
+            elif r["skipped"]:
+                status = "skipped: no custom or map files"
+            else:
+                status = f"{r['files']} files, {r['bytes_out'] / 1048576:.1f} MB" + (" (up to date)" if r["unchanged"] else "")
+            print(f"{r['map']}\t{status}\tanalyze {r['analyze_seconds']:.1f}s\tpack {r['pack_seconds']:.1f}s", file=args.out)
+        print(f"{len(result['maps'])} maps, {result['skipped']} skipped, {result['failed']} failed, "
+              f"{result['seconds']:.1f}s total", file=args.out)
+    if not result["maps"]:
+        return EXIT_NOTHING_TO_PACK
+    return EXIT_ERROR if result["failed"] else EXIT_OK
+
+
+def cmd_graph(args) -> int:
+    from dep_graph import DependencyGraph
+
+    graph = DependencyGraph(Path(args.cod2), args.map, jobs=args.jobs).build()
+    if not args.why:
+        if args.format == "dot":
+            args.out.write(graph.to_dot())
+        else:
+            print(json.dumps(graph.to_json(), indent=2), file=args.out)
+        return EXIT_OK
+
+    answers = {target: graph.why(target, limit=args.limit) for target in args.why}
+    if args.format == "json":
+        print(json.dumps(answers, indent=2), file=args.out)
+    else:
+        for target, chains in answers.items():
+            print(f"{target}:" if chains else f"{target}: not in the graph of {args.map}", file=args.out)
+            for chain in chains:
+                print("    " + " -> ".join(chain), file=args.out)
+    return EXIT_OK if all(answers.values()) else EXIT_ERROR
+
+
+def cmd_budget(args) -> int:
+    from model_budget import map_model_budget
+
+    budget = map_model_budget(args.cod2, args.map, jobs=args.jobs, top=args.top)
+    if args.json:
+        print(json.dumps(budget, indent=2), file=args.out)
+        return EXIT_OK
+
+    print(f"{'model':<40} {'inst':>6} {'tris':>8} {'verts':>8} {'total tris':>12}", file=args.out)
+    for m in budget["top"]:
+        tris = m["tris"] if m["tris"] is not None else "?"
+        verts = m["verts"] if m["verts"] is not None else "?"
+        print(f"{m['name']:<40} {m['instances']:>6} {tris:>8} {verts:>8} {m['total_tris']:>12}", file=args.out)
+    print(f"{budget['instances']} instances of {budget['unique_models']} models: "
+          f"{budget['total_tris']} tris, {budget['total_verts']} verts (LOD 0)", file=args.out)
+    if budget["unreadable"]:
+        print(f"No geometry for {len(budget['unreadable'])} models: {', '.join(budget['unreadable'][:10])}"
+              + (" ..." if len(budget["unreadable"]) > 10 else ""), file=sys.stderr)
+    return EXIT_OK
+
+
+def cmd_textures(args) -> int:
+    from texture_report import map_texture_memory
+
+    report = map_texture_memory(args.cod2, args.map, jobs=args.jobs, top=args.top)
+    if args.json:
+        print(json.dumps(report, indent=2), file=args.out)
+        return EXIT_OK
+
+    print(f"{'texture':<40} {'format':<6} {'size':>11} {'mips':>4} {'MB':>7}  source", file=args.out)
+    for t in report["top"]:
+        size = f"{t['width']}x{t['height']}"
+        source = "stock IWD" if t["in_iwd"] else "custom"
+        print(f"{t['name']:<40} {t['format']:<6} {size:>11} {t['mips']:>4} {t['gpu_bytes'] / 1048576:>7.2f}  {source}",
+              file=args.out)
+    print(f"{len(report['textures'])} textures: {report['total_bytes'] / 1048576:.1f} MB video memory, "
+          f"{report['custom_bytes'] / 1048576:.1f} MB in custom textures", file=args.out)
+    for label in ("missing", "unreadable"):
+        if report[label]:
+            print(f"{len(report[label])} {label}: {', '.join(report[label][:10])}"
+                  + (" ..." if len(report[label]) > 10 else ""), file=sys.stderr)
+    return EXIT_OK
+
+
+def cmd_encode(args) -> int:
+    from iwi_encoder import encode_files
+
+    output_dir = Path(args.output_dir) if args.output_dir else Path(args.cod2) / "main" / "images"
+    results = encode_files(args.images, output_dir, args.format, mipmaps=not args.no_mipmaps,
+                           filter=args.filter, jobs=args.jobs)
+    if args.json:
+        print(json.dumps(results, indent=2), file=args.out)
+    else:
+        for r in results:
+            if r["error"]:
+                print(f"{r['source']}\tFAILED: {r['error']}", file=args.out)
+            else:
+                print(f"{r['output']}\t{r['format']} {r['width']}x{r['height']}, {r['mips']} mips, "
+                      f"{r['bytes'] / 1024:.0f} KB", file=args.out)
+    return EXIT_ERROR if any(r["error"] for r in results) else EXIT_OK
+
+
+def cmd_loadscreen(args) -> int:
+    from iwi_encoder import create_loadscreen
+
+    result = create_loadscreen(args.cod2, args.map, args.image, args.format, args.filter)
+    if args.json:
+        print(json.dumps(result, indent=2), file=args.out)
+    elif result["error"]:
+        print(f"{args.image}: {result['error']}", file=sys.stderr)
+    else:
+        print(f"{result['output']}\t{result['format']} {result['width']}x{result['height']}", file=args.out)
+        print(f"{result['gdt']}\tmaterial {result['material']} (compile it with the Asset Manager)", file=args.out)
+    return EXIT_ERROR if result["error"] else EXIT_OK
+
+
+def cmd_thumbnails(args) -> int:
+    from model_thumbnails import render_thumbnails
+
+    result = render_thumbnails(args.cod2, args.models or None, overwrite=args.force, jobs=args.jobs)
+    if args.json:
+        print(json.dumps(result, indent=2), file=args.out)
+    else:
+        for name, error in sorted(result["failed"].items()):
+            print(f"{name}\tFAILED: {error}", file=args.out)
+        for name, warning in sorted(result["warnings"].items()):
+            print(f"{name}\t{warning}", file=args.out)
+        print(f"{len(result['rendered'])} rendered, {len(result['skipped'])} up to date, "
+              f"{len(result['failed'])} failed in {result['seconds']:.1f}s", file=args.out)
+    return EXIT_ERROR if result["failed"] else EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m cli", description="CoD2 map IWD tools (headless)")
+    parser.add_argument("--cod2", default=None, help="CoD2 install folder (default: last used in the GUI)")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: one per CPU)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    analyze = sub.add_parser("analyze", help="list the custom files a map needs")
+    analyze.add_argument("map", help="map name, e.g. mp_mymap")
+    analyze.add_argument("--json", action="store_true", help="machine-readable output on stdout")
+    analyze.set_defaults(func=cmd_analyze)
+
+    pack = sub.add_parser("pack", help="analyze a map and write its IWD")
+    pack.add_argument("map", help="map name, e.g. mp_mymap")
+    pack.add_argument("-o", "--output", help="output .iwd (default: zz_custom_<map>.iwd)")
+    pack.add_argument("--full", action="store_true", help="repack from scratch instead of updating")
+    pack.add_argument("--reproducible", action="store_true",
+                      help="byte-stable output plus a .manifest.json; skips the write if the manifest still matches")
+    pack.add_argument("--json", action="store_true", help="machine-readable report on stdout")
+    pack.set_defaults(func=cmd_pack)
+
+    batch = sub.add_parser("batch", help="analyze and pack every map in map_source concurrently")
+    batch.add_argument("-d", "--output-dir", default=".", help="where to write zz_custom_<map>.iwd files")
+    batch.add_argument("--filter", action="append", help="only maps matching this pattern (repeatable), e.g. 'mp_*'")
+    batch.add_argument("--full", action="store_true", help="repack from scratch instead of updating")
+    batch.add_argument("--reproducible", action="store_true", help="as for pack")
+    batch.add_argument("--json", action="store_true", help="machine-readable report on stdout")
+    batch.set_defaults(func=cmd_batch)
+
+    graph = sub.add_parser("graph", help="export a map's dependency graph, or explain why files are included")
+    graph.add_argument("map", help="map name, e.g. mp_mymap")
+    graph.add_argument("--format", choices=("json", "dot"),
+                       help="graph output format (default: json); --why prints text unless json")
+    graph.add_argument("--why", action="append", metavar="FILE",
+                       help="node id (texture:foo.iwi), file path or asset name to explain (repeatable)")
+    graph.add_argument("--limit", type=int, default=10, help="max chains per --why target (default: 10)")
+    graph.set_defaults(func=cmd_graph)
+
+    budget = sub.add_parser("budget", help="triangle/vertex budget of the map's models (needs numpy)")
+    budget.add_argument("map", help="map name, e.g. mp_mymap")
+    budget.add_argument("--top", type=int, default=20, help="how many of the heaviest models to list (default: 20)")
+    budget.add_argument("--json", action="store_true", help="full machine-readable report on stdout")
+    budget.set_defaults(func=cmd_budget)
+
+    textures = sub.add_parser("textures", help="video memory used by the map's textures, heaviest first")
+    textures.add_argument("map", help="map name, e.g. mp_mymap")
+    textures.add_argument("--top", type=int, default=20, help="how many of the heaviest textures to list (default: 20)")
+    textures.add_argument("--json", action="store_true", help="full machine-readable report on stdout")
+    textures.set_defaults(func=cmd_textures)
+
+    formats = ("auto", "dxt1", "dxt5", "argb8", "rgb8", "la8", "a8")
+    encode = sub.add_parser("encode", help="encode PNG/TGA images to .iwi textures (needs numpy)")
+    encode.add_argument("images", nargs="+", help="image files; each becomes <name>.iwi")
+    encode.add_argument("-d", "--output-dir", help="where to write the .iwi files (default: main/images)")
+    encode.add_argument("--format", type=str.lower, choices=formats, default="auto",
+                        help="texture format (default: auto = dxt5 if the image has alpha, else dxt1)")
+    encode.add_argument("--filter", choices=("box", "lanczos"), default="box", help="mipmap filter (default: box)")
+    encode.add_argument("--no-mipmaps", action="store_true", help="store the full-size level only")
+    encode.add_argument("--json", action="store_true", help="machine-readable report on stdout")
+    encode.set_defaults(func=cmd_encode)
+
+    loadscreen = sub.add_parser("loadscreen", help="encode a map's loadscreen texture and write its material stub")
+    loadscreen.add_argument("map", help="map name, e.g. mp_mymap")
+    loadscreen.add_argument("image", help="PNG/TGA image")
+    loadscreen.add_argument("--format", type=str.lower, choices=formats, default="auto",
+                            help="texture format (default: auto)")
+    loadscreen.add_argument("--filter", choices=("box", "lanczos"), default="box", help=argparse.SUPPRESS)
+    loadscreen.add_argument("--json", action="store_true", help="machine-readable report on stdout")
+    loadscreen.set_defaults(func=cmd_loadscreen)
+
+    thumbnails = sub.add_parser("thumbnails", help="render Model Viewer previews of stock and custom xmodels (needs numpy)")
+    thumbnails.add_argument("models", nargs="*", help="xmodel names (default: every model)")
+    thumbnails.add_argument("--force", action="store_true", help="re-render models whose images are up to date")
+    thumbnails.add_argument("--json", action="store_true", help="machine-readable report on stdout")
+    thumbnails.set_defaults(func=cmd_thumbnails)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    args.cod2 = args.cod2 or _default_cod2_path()
+    if not Path(args.cod2).is_dir():
+        print(f"CoD2 path not found: {args.cod2}", file=sys.stderr)
+        return EXIT_ERROR
+    args.out = _detach_stdout()
+    try:
+        return args.func(args)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        args.out.flush()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
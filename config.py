@@ -6,6 +6,9 @@ DEFAULT_COD2_PATH = r"C:\Program Files\Call of Duty 2"
 
 CONFIG_FILE = Path(__file__).parent / "config.json"
 
+# On-disk caches (dependency cache, indexes) live here
+CACHE_DIR = Path(__file__).parent / "cache"
+
 def load_config():
     if CONFIG_FILE.exists():
         try:
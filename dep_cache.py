@@ -0,0 +1,122 @@
+# dep_cache.py
+"""
+Persistent cache of parsed file references (maps, prefabs, xmodels, materials)
+and file CRCs.
+
+Each entry is keyed by file path and validated against the file's size and
+mtime, so a file is only parsed again when it changes on disk. Files read
+from inside an IWD pass their own key and stamp (see VfsEntry). Values are
+stored as JSON in a local SQLite database under CACHE_DIR.
+"""
+
+from pathlib import Path
+import json
+import os
+import sqlite3
+import threading
+
+from config import CACHE_DIR
+
+DEFAULT_DB_PATH = CACHE_DIR / "dependencies.sqlite"
+
+# Bump a kind's version whenever its parser output changes
+PARSER_VERSIONS = {
+    "map": 2,
+    "xmodel": 3,
+    "material": 2,
+    "crc": 1,
+    "xmodelsurfs": 1,
+    "iwi": 1,
+}
+
+
+class DependencyCache:
+    def __init__(self, db_path: Path = DEFAULT_DB_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS refs (
+                kind    TEXT NOT NULL,
+                path    TEXT NOT NULL,
+                size    INTEGER NOT NULL,
+                mtime   INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                data    TEXT NOT NULL,
+                PRIMARY KEY (kind, path)
+            )"""
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _stat(path: Path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def get(self, kind: str, path: Path, stamp: tuple = None):
+        """
+        Returns the cached value for path, or None if missing or stale.
+        stamp replaces the (size, mtime) of path, e.g. for IWD members.
+        """
+        stat = stamp or self._stat(path)
+        if stat is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime, version, data FROM refs WHERE kind = ? AND path = ?",
+                (kind, os.path.abspath(path))
+            ).fetchone()
+        if row is None:
+            return None
+        size, mtime, version, data = row
+        if (size, mtime) != tuple(stat) or version != PARSER_VERSIONS.get(kind, 1):
+            return None
+        return json.loads(data)
+
+    def put(self, kind: str, path: Path, value, stamp: tuple = None):
+        """Stores a JSON-serializable value for path at its current size/mtime (or stamp)"""
+        stat = stamp or self._stat(path)
+        if stat is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO refs (kind, path, size, mtime, version, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, os.path.abspath(path), stat[0], stat[1],
+                 PARSER_VERSIONS.get(kind, 1), json.dumps(value))
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM refs")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_shared_cache = None
+_shared_pid = None
+_shared_lock = threading.Lock()
+
+
+def get_dependency_cache() -> DependencyCache:
+    """Returns the process-wide cache, opening it on first use"""
+    global _shared_cache, _shared_pid
+    with _shared_lock:
+        # A connection must not be reused across fork(); worker processes open their own
+        if _shared_cache is None or _shared_pid != os.getpid():
+            _shared_pid = os.getpid()
+            try:
+                _shared_cache = DependencyCache()
+            except (OSError, sqlite3.Error) as e:
+                print(f"[WARNING] Dependency cache unavailable, using memory only: {e}")
+                _shared_cache = DependencyCache(Path(":memory:"))
+        return _shared_cache
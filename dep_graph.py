@@ -0,0 +1,467 @@
+# dep_graph.py
+"""
+Dependency graph of everything a map pulls in.
+
+Each asset is a node "<kind>:<name>" (e.g. "xmodel:foo", "texture:bar.iwi")
+and each kind has a resolver that finds the node's file and its children:
+
+    map -> core files, .map source -> prefabs -> xmodels -> xmodelsurfs/xmodelparts, materials -> textures
+    .efx -> shaders (materials) -> textures
+    .csv -> loadscreen material -> texture
+
+Nodes are resolved once, however many parents share them, and level by level
+so each level's uncached xmodels and materials are parsed together on the
+worker pool. Stock assets are leaves: recorded, but neither followed nor packed.
+The finished graph answers "why is this file included?" and exports to JSON or
+Graphviz DOT.
+"""
+
+from collections import deque
+from pathlib import Path
+import re
+from typing import Callable, Dict, List, Optional
+
+from dir_index import get_directory_index
+from helpers import (collect_map_references, extract_null_strings,
+                     get_textures_for_materials, get_xmodel_dependencies_bulk)
+from stock_index import get_stock_index
+from vfs import get_game_fs
+
+# Kinds whose node stands for a file that goes into the IWD
+PACKED_KINDS = frozenset({
+    "file", "gsc", "fxgsc", "script", "csv", "soundaliases", "sound", "fx",
+    "xmodel", "xmodelsurfs", "xmodelparts", "material", "loadscreen", "texture",
+})
+
+_SHADER_BLOCK_RE = re.compile(r'shaders\s*\[\s*([^]]*)\s*\]', re.IGNORECASE | re.DOTALL)
+_LOADSCREEN_RE = re.compile(r'levelBriefing\s*,\s*(load(?:ing)?screen_[^\s,]+)', re.IGNORECASE)
+_LOADFX_RE = re.compile(r'loadfx\s*\(\s*"([^"]+)"\s*\)', re.IGNORECASE)
+_SCRIPT_CALL_RE = re.compile(r'maps\\mp\\([^:]+)::[^;]+;')
+
+
+class GraphNode:
+    __slots__ = ("kind", "name", "path", "exists", "stock", "resolved", "children", "parents")
+
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+        self.path: Optional[Path] = None     # file on disk (expected location if missing)
+        self.exists = False
+        self.stock = False
+        self.resolved = False
+        self.children: Dict[str, "GraphNode"] = {}   # id -> node, in discovery order
+        self.parents: Dict[str, "GraphNode"] = {}
+
+    @property
+    def id(self) -> str:
+        return f"{self.kind}:{self.name}"
+
+    @property
+    def packed(self) -> bool:
+        """True if this node's file belongs in the map's IWD"""
+        return self.kind in PACKED_KINDS and not self.stock and self.exists
+
+    def __repr__(self):
+        return f"GraphNode({self.id!r})"
+
+
+def fx_node_name(fx_ref: str) -> str:
+    """'fx/foo/bar', 'foo\\bar.efx', ... -> 'fx/foo/bar.efx'"""
+    clean = fx_ref.strip().replace("\\", "/").removeprefix("fx/").strip()
+    return f"fx/{clean}" if clean.lower().endswith(".efx") else f"fx/{clean}.efx"
+
+
+class DependencyGraph:
+    """
+    Builds and holds the dependency graph of one map.
+
+    Usage:
+        graph = DependencyGraph(cod2_path, "mp_mymap").build()
+        graph.files()                 # what to pack
+        graph.why("texture:foo.iwi")  # chains from the map down to the node
+    """
+
+    def __init__(self, cod2_path, mapname: str, jobs: int = None, stock=None):
+        self.cod2_path = Path(cod2_path)
+        self.mapname = mapname
+        self.jobs = jobs
+        self.main_dir = self.cod2_path / "main"
+        self.prefab_dir = self.cod2_path / "map_source" / "prefabs"
+        self.nodes: Dict[str, GraphNode] = {}
+        # Pick up IWDs added or replaced since the last analysis; lookups after this are throttled
+        get_game_fs(self.cod2_path, revalidate=True)
+        self.stock = stock if stock is not None else get_stock_index(cod2_path=str(self.cod2_path))
+        self.root = self.node("map", mapname)
+
+        self._resolvers: Dict[str, Callable[[GraphNode], list]] = {
+            "map": self._resolve_map,
+            "mapsource": self._resolve_map_file,
+            "prefab": self._resolve_map_file,
+            "file": self._resolve_file,
+            "script": self._resolve_file,
+            "sound": self._resolve_file,
+            "gsc": self._resolve_gsc,
+            "fxgsc": self._resolve_fxgsc,
+            "csv": self._resolve_csv,
+            "soundaliases": self._resolve_soundaliases,
+            "fx": self._resolve_fx,
+            "xmodel": self._resolve_xmodel,
+            "xmodelsurfs": self._resolve_file,
+            "xmodelparts": self._resolve_file,
+            "material": self._resolve_material,
+            "loadscreen": self._resolve_loadscreen,
+            "texture": self._resolve_texture,
+        }
+        self._image_index = None
+        self._map_refs: Optional[Dict[str, dict]] = None
+        self._xmodel_deps: Dict[str, dict] = {}
+        self._material_textures: Dict[str, set] = {}
+
+    # ── Building ──
+
+    def node(self, kind: str, name: str) -> GraphNode:
+        """Returns the node, creating it (unresolved) on first use"""
+        key = f"{kind}:{name}"
+        node = self.nodes.get(key)
+        if node is None:
+            node = GraphNode(kind, name)
+            self.nodes[key] = node
+        return node
+
+    def build(self, on_phase=None, on_node=None, check_cancel=None) -> "DependencyGraph":
+        """
+        Resolves every node reachable from the map, breadth-first.
+
+        on_phase(label) is called as each level starts, on_node(node) after each
+        node is resolved and check_cancel() before each node (it may raise to abort).
+        """
+        main_map = self.cod2_path / "map_source" / f"{self.mapname}.map"
+        if not main_map.is_file():
+            raise FileNotFoundError(f"Main map not found: {main_map}")
+
+        level = [self.root]
+        depth = 0
+        while level:
+            pending = [n for n in dict.fromkeys(level) if not n.resolved]
+            if on_phase and pending:
+                kinds = ", ".join(dict.fromkeys(n.kind for n in pending))
+                on_phase(f"Resolving {kinds} ({len(pending)})")
+            self._prefetch(pending)
+
+            next_level = []
+            for node in pending:
+                if check_cancel:
+                    check_cancel()
+                if node.resolved:
+                    continue
+                for kind, name in self._resolvers[node.kind](node):
+                    child = self.node(kind, name)
+                    if child.id not in node.children:
+                        node.children[child.id] = child
+                        child.parents[node.id] = node
+                        if not child.resolved:
+                            next_level.append(child)
+                node.resolved = True
+                if on_node:
+                    on_node(node)
+            level = next_level
+            depth += 1
+
+        print(f"[Graph] {self.mapname}: {len(self.nodes)} nodes, {depth} levels")
+        return self
+
+    def _prefetch(self, nodes: List[GraphNode]):
+        """Parses this level's uncached maps, xmodels and materials together"""
+        if self._map_refs is None and any(n.kind == "mapsource" for n in nodes):
+            main_map = self.cod2_path / "map_source" / f"{self.mapname}.map"
+            self._map_refs = collect_map_references(main_map, self.prefab_dir, self.jobs)
+
+        xmodels = [n.name for n in nodes if n.kind == "xmodel" and n.name not in self._xmodel_deps
+                   and not self.stock.has_xmodel(n.name)]
+        if xmodels:
+            self._xmodel_deps.update(get_xmodel_dependencies_bulk(str(self.cod2_path), xmodels, jobs=self.jobs))
+
+        materials = [n.name for n in nodes if n.kind == "material" and n.name not in self._material_textures
+                     and not self.stock.has_material(n.name)]
+        if materials:
+            self._material_textures.update(get_textures_for_materials(str(self.cod2_path), materials, self.jobs))
+
+    def _set_file(self, node: GraphNode, path: Path):
+        node.path = path
+        node.exists = path.is_file()
+
+    def _material_path(self, name: str) -> Path:
+        raw_mat = self.cod2_path / "raw" / "materials" / name
+        return raw_mat if raw_mat.exists() else self.main_dir / "materials" / name
+
+    def _read_text(self, node: GraphNode) -> str:
+        try:
+            return node.path.read_text(encoding="utf-8", errors="ignore")
+        except OSError as e:
+            print(f"[Graph] Could not read {node.path}: {e}")
+            return ""
+
+    # ── Resolvers: each sets the node's file and returns its children as (kind, name) ──
+
+    def _resolve_map(self, node: GraphNode) -> list:
+        m = node.name
+        # Core files first, so they resolve (and show up) before the map is parsed
+        return [
+            ("gsc", f"maps/mp/{m}.gsc"),
+            ("fxgsc", f"maps/mp/{m}_fx.gsc"),
+            ("csv", f"maps/mp/{m}.csv"),
+            ("file", f"maps/mp/{m}.d3dbsp"),
+            ("file", f"mp/{m}.arena"),
+            ("soundaliases", f"soundaliases/{m}.csv"),
+            ("file", f"sun/{m}.sun"),
+            ("mapsource", f"{m}.map"),
+        ]
+
+    def _resolve_map_file(self, node: GraphNode) -> list:
+        if node.kind == "mapsource":
+            self._set_file(node, self.cod2_path / "map_source" / node.name)
+        else:
+            self._set_file(node, self.prefab_dir / node.name)
+        if not node.exists:
+            return []
+
+        refs = self._map_refs[str(node.path.resolve())]
+        children = [("prefab", p.removeprefix("prefabs/")) for p in refs["prefabs"]]
+        children += [("xmodel", x) for x in refs["xmodels"]]
+        children += [("material", m) for m in refs["materials"]]
+        children += [("fx", fx_node_name(fx)) for fx in refs["fx"]]
+        return children
+
+    def _resolve_file(self, node: GraphNode) -> list:
+        folder = {"xmodelsurfs": "xmodelsurfs/", "xmodelparts": "xmodelparts/"}.get(node.kind, "")
+        self._set_file(node, self.main_dir / f"{folder}{node.name}")
+        return []
+
+    def _resolve_gsc(self, node: GraphNode) -> list:
+        self._set_file(node, self.main_dir / node.name)
+        if not node.exists:
+            return []
+        calls = _SCRIPT_CALL_RE.findall(self._read_text(node))
+        return [("script", "maps/mp/" + call.strip().replace("\\", "/") + ".gsc") for call in calls]
+
+    def _resolve_fxgsc(self, node: GraphNode) -> list:
+        self._set_file(node, self.main_dir / node.name)
+        if not node.exists:
+            return []
+        return [("fx", fx_node_name(fx)) for fx in _LOADFX_RE.findall(self._read_text(node))]
+
+    def _resolve_csv(self, node: GraphNode) -> list:
+        self._set_file(node, self.main_dir / node.name)
+        if not node.exists:
+            return []
+        match = _LOADSCREEN_RE.search(self._read_text(node))
+        return [("loadscreen", match.group(1).strip())] if match else []
+
+    def _resolve_soundaliases(self, node: GraphNode) -> list:
+        self._set_file(node, self.main_dir / node.name)
+        if not node.exists:
+            return []
+        children = []
+        for line in self._read_text(node).splitlines():
+            if line.startswith('#') or not line.strip():
+                continue
+            parts = [p.strip() for p in line.split(',')]
+            if len(parts) > 2 and parts[2].lower().endswith(('.wav', '.mp3')):
+                children.append(("sound", f"sound/{parts[2]}"))
+        return children
+
+    def _resolve_fx(self, node: GraphNode) -> list:
+        node.stock = self.stock.has_fx(node.name)
+        self._set_file(node, self.main_dir / node.name)
+        if node.stock or not node.exists:
+            return []
+        children = []
+        for block in _SHADER_BLOCK_RE.findall(self._read_text(node)):
+            for shader in re.split(r'[\r\n,]+', block):
+                shader = shader.strip().strip('"').strip()
+                if shader:
+                    children.append(("material", shader))
+        return children
+
+    def _resolve_xmodel(self, node: GraphNode) -> list:
+        node.stock = self.stock.has_xmodel(node.name)
+        self._set_file(node, self.main_dir / "xmodel" / node.name)
+        if node.stock:
+            return []
+        deps = self._xmodel_deps[node.name]
+        children = [("xmodelsurfs", s) for s in deps["surfs"]]
+        if deps["parts"]:
+            children.append(("xmodelparts", deps["parts"]))
+        children += [("material", m) for m in deps["materials"]]
+        return children
+
+    def _resolve_material(self, node: GraphNode) -> list:
+        node.stock = self.stock.has_material(node.name)
+        self._set_file(node, self._material_path(node.name))
+        if node.stock:
+            return []
+        return [("texture", f"{tex}.iwi") for tex in sorted(self._material_textures[node.name])]
+
+    def _resolve_loadscreen(self, node: GraphNode) -> list:
+        mat_name = node.name
+        self._set_file(node, self._material_path(mat_name))
+        if not node.exists:
+            return []
+        candidates = extract_null_strings(node.path.read_bytes())
+
+        tex_base = None
+        for s in candidates:
+            base_name = Path(s).stem
+            if base_name.startswith(("loadingscreen_", "loadscreen_")) and base_name != mat_name:
+                tex_base = base_name
+                break
+        if not tex_base:
+            for s in reversed(candidates):
+                base_name = Path(s).stem
+                if base_name not in {mat_name, "colorMap", "normalMap"}:
+                    tex_base = base_name
+                    break
+        return [("texture", f"{tex_base}.iwi")] if tex_base else []
+
+    def _resolve_texture(self, node: GraphNode) -> list:
+        if self._image_index is None:
+            self._image_index = get_directory_index(self.main_dir / "images")
+        found = self._image_index.find(node.name)
+        self._set_file(node, found if found else self.main_dir / "images" / node.name)
+        return []
+
+    # ── Queries ──
+
+    def files(self) -> List[Path]:
+        """Existing custom files to pack, sorted"""
+        return sorted({n.path for n in self.nodes.values() if n.packed})
+
+    def missing_files(self) -> List[Path]:
+        """Custom files that are referenced but not on disk, in discovery order"""
+        missing = [n.path for n in self.nodes.values()
+                   if n.kind in PACKED_KINDS and n.resolved and not n.stock and not n.exists]
+        return list(dict.fromkeys(missing))
+
+    def find(self, target) -> List[GraphNode]:
+        """Nodes matching an id ('texture:foo.iwi'), a file path or a bare asset name"""
+        target_str = str(target)
+        if target_str in self.nodes:
+            return [self.nodes[target_str]]
+        as_path = Path(target_str)
+        matches = [n for n in self.nodes.values() if n.path is not None and n.path == as_path]
+        if not matches:
+            matches = [n for n in self.nodes.values()
+                       if n.name.lower() == target_str.lower()
+                       or (n.path is not None and n.path.name.lower() == target_str.lower())]
+        return matches
+
+    def why(self, target, limit: int = 10) -> List[List[str]]:
+        """
+        Why is this node/file included? Returns up to `limit` dependency chains
+        (lists of node ids from the map down to the target), shortest first.
+        """
+        chains: List[List[str]] = []
+        for start in self.find(target):
+            queue = deque([[start]])
+            while queue and len(chains) < limit:
+                chain = queue.popleft()
+                head = chain[-1]
+                if head is self.root:
+                    chains.append([n.id for n in reversed(chain)])
+                    continue
+                for parent in head.parents.values():
+                    if parent not in chain:
+                        queue.append(chain + [parent])
+        return chains[:limit]
+
+    def map_summary(self) -> dict:
+        """
+        What the .map and its prefabs reference directly.
+
+        Returns:
+            dict with:
+                missing_xmodels: list[str]      # custom (non-stock)
+                missing_materials: list[str]
+                missing_textures: list[str]     # .iwi filenames of the custom materials
+                hidden_fx_paths: list[str]      # "fx/....efx" from map entities
+                dropped_xmodels, dropped_materials: int   # stock, not packed
+                total_xmodels, total_materials: int
+                prefabs_processed: list[str]    # prefab file names, depth-first
+        """
+        xmodels, materials, fx = {}, {}, {}
+        prefabs_processed: List[str] = []
+        visited = set()
+
+        def walk(map_node: GraphNode):
+            for child in map_node.children.values():
+                if child.kind == "xmodel":
+                    xmodels[child.name] = child
+                elif child.kind == "material":
+                    materials[child.name] = child
+                elif child.kind == "fx":
+                    fx[child.name] = child
+                elif child.kind == "prefab" and child.exists and child.id not in visited:
+                    visited.add(child.id)
+                    prefabs_processed.append(child.path.name)
+                    walk(child)
+
+        for node in self.root.children.values():
+            if node.kind == "mapsource":
+                walk(node)
+
+        missing_xmodels = sorted(n for n, node in xmodels.items() if not node.stock)
+        missing_materials = sorted(n for n, node in materials.items() if not node.stock)
+        textures = {t.name for m in missing_materials
+                    for t in materials[m].children.values() if t.kind == "texture"}
+        return {
+            "missing_xmodels": missing_xmodels,
+            "missing_materials": missing_materials,
+            "missing_textures": sorted(textures),
+            "hidden_fx_paths": sorted(fx),
+            "dropped_xmodels": len(xmodels) - len(missing_xmodels),
+            "dropped_materials": len(materials) - len(missing_materials),
+            "total_xmodels": len(xmodels),
+            "total_materials": len(materials),
+            "prefabs_processed": prefabs_processed,
+        }
+
+    # ── Export ──
+
+    def to_json(self) -> dict:
+        """Plain data for json.dumps: nodes plus [parent, child] edges"""
+        return {
+            "map": self.mapname,
+            "root": self.root.id,
+            "nodes": [{
+                "id": n.id,
+                "kind": n.kind,
+                "name": n.name,
+                "path": str(n.path) if n.path is not None else None,
+                "exists": n.exists,
+                "stock": n.stock,
+                "packed": n.packed,
+            } for n in self.nodes.values()],
+            "edges": [[n.id, c] for n in self.nodes.values() for c in n.children],
+        }
+
+    def to_dot(self) -> str:
+        """Graphviz source; stock nodes are grey, missing files red and dashed"""
+        def escape(s: str) -> str:
+            return s.replace("\\", "\\\\").replace('"', '\\"')
+
+        def quote(s: str) -> str:
+            return f'"{escape(s)}"'
+
+        lines = [f"digraph {quote(self.mapname)} {{", "  rankdir=LR;", "  node [shape=box, fontsize=10];"]
+        for n in self.nodes.values():
+            attrs = [f'label="{escape(n.kind)}\\n{escape(n.name)}"']
+            if n.stock:
+                attrs.append('color=gray, fontcolor=gray')
+            elif n.kind in PACKED_KINDS and not n.exists:
+                attrs.append('color=red, style=dashed')
+            lines.append(f"  {quote(n.id)} [{', '.join(attrs)}];")
+        for n in self.nodes.values():
+            for c in n.children:
+                lines.append(f"  {quote(n.id)} -> {quote(c)};")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,84 @@
+# dir_index.py
+"""
+Case-insensitive file-name index of a directory tree (e.g. main/images).
+
+The tree is walked once with os.scandir and every file is recorded by its
+lower-cased name, so finding a texture is a dictionary lookup instead of a
+recursive glob. An index stays valid for as long as none of its directories'
+mtimes change; adding, removing or renaming a file updates the mtime of the
+folder that holds it.
+"""
+
+from collections import deque
+from pathlib import Path
+import os
+import threading
+from typing import Dict, Optional
+
+
+class DirectoryIndex:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._files: Dict[str, Path] = {}
+        self._dir_mtimes: Dict[str, int] = {}
+        self._build()
+
+    def _build(self):
+        files: Dict[str, Path] = {}
+        dir_mtimes: Dict[str, int] = {}
+
+        # Breadth-first and sorted, so the shallowest match wins and results are repeatable
+        pending = deque([str(self.root)])
+        while pending:
+            folder = pending.popleft()
+            try:
+                dir_mtimes[folder] = os.stat(folder).st_mtime_ns
+                with os.scandir(folder) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file():
+                        files.setdefault(entry.name.lower(), Path(entry.path))
+                except OSError:
+                    continue
+
+        self._files = files
+        self._dir_mtimes = dir_mtimes
+
+    def is_stale(self) -> bool:
+        """True if any indexed folder was modified (or removed) since the walk"""
+        if not self._dir_mtimes:
+            return self.root.is_dir()
+        for folder, mtime in self._dir_mtimes.items():
+            try:
+                if os.stat(folder).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def find(self, filename: str) -> Optional[Path]:
+        """Returns the path of filename anywhere under root (case-insensitive), or None"""
+        return self._files.get(filename.lower())
+
+    def __len__(self):
+        return len(self._files)
+
+
+_indexes: Dict[str, DirectoryIndex] = {}
+_lock = threading.Lock()
+
+
+def get_directory_index(root: Path) -> DirectoryIndex:
+    """Returns a cached index of root, re-walking it only if it changed"""
+    key = os.path.abspath(root)
+    with _lock:
+        index = _indexes.get(key)
+        if index is None or index.is_stale():
+            index = DirectoryIndex(Path(key))
+            _indexes[key] = index
+        return index
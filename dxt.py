@@ -0,0 +1,289 @@
+# dxt.py
+"""
+NumPy decoders and encoders for the pixel formats used by .iwi textures.
+
+DXT1/DXT3/DXT5 are decoded for all 4x4 blocks at once: the colour endpoints
+and index bits of every block are unpacked into arrays and the palettes are
+looked up with fancy indexing, so there is no per-block Python loop.
+Every decoder returns an (height, width, 4) uint8 RGBA array.
+
+The DXT1/DXT5 encoders work the same way: each block's endpoints are the
+extremes of its colours along their principal axis, and every pixel takes
+the nearest palette entry.
+"""
+
+import numpy as np
+
+from iwi import (FORMAT_A8, FORMAT_ARGB8, FORMAT_DXT1, FORMAT_DXT3, FORMAT_DXT5,
+                 FORMAT_LA8, FORMAT_RGB8, level_size)
+
+_SHIFT2 = np.arange(16, dtype=np.uint32) * 2
+_SHIFT3 = np.arange(16, dtype=np.uint64) * 3
+_SHIFT4 = np.arange(16, dtype=np.uint64) * 4
+
+# Blocks encoded per batch; bounds the (blocks, 16, palette, channels) distance arrays
+ENCODE_CHUNK_BLOCKS = 16384
+
+
+def _blocks(data: bytes, width: int, height: int, block_bytes: int) -> np.ndarray:
+    count = max(1, (width + 3) // 4) * max(1, (height + 3) // 4)
+    if len(data) < count * block_bytes:
+        raise ValueError(f"expected {count * block_bytes} bytes of block data, got {len(data)}")
+    return np.frombuffer(data, dtype=np.uint8, count=count * block_bytes).reshape(count, block_bytes)
+
+
+def _unpack_565(c: np.ndarray) -> np.ndarray:
+    r = (c >> 11) & 31
+    g = (c >> 5) & 63
+    b = c & 31
+    return np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], axis=-1)
+
+
+def _color_blocks(blocks: np.ndarray, dxt1: bool) -> np.ndarray:
+    """(N, 8) colour blocks -> (N, 16, 4) RGBA pixels"""
+    n = len(blocks)
+    c0 = blocks[:, 0].astype(np.uint16) | (blocks[:, 1].astype(np.uint16) << 8)
+    c1 = blocks[:, 2].astype(np.uint16) | (blocks[:, 3].astype(np.uint16) << 8)
+    p0 = _unpack_565(c0).astype(np.uint16)
+    p1 = _unpack_565(c1).astype(np.uint16)
+
+    palette = np.empty((n, 4, 4), dtype=np.uint8)
+    palette[:, 0, :3] = p0
+    palette[:, 1, :3] = p1
+    palette[:, :, 3] = 255
+    palette[:, 2, :3] = (2 * p0 + p1) // 3
+    palette[:, 3, :3] = (p0 + 2 * p1) // 3
+    if dxt1:
+        # c0 <= c1: three colours plus transparent black
+        three = c0 <= c1
+        palette[three, 2, :3] = (p0[three] + p1[three]) // 2
+        palette[three, 3] = 0
+
+    bits = blocks[:, 4:8].copy().view("<u4")[:, 0]
+    indices = (bits[:, None] >> _SHIFT2) & 3
+    return palette[np.arange(n)[:, None], indices]
+
+
+def _explicit_alpha(blocks: np.ndarray) -> np.ndarray:
+    """DXT3: (N, 8) 4-bit alpha -> (N, 16)"""
+    bits = blocks.copy().view("<u8")[:, 0]
+    return (((bits[:, None] >> _SHIFT4) & 15) * 17).astype(np.uint8)
+
+
+def _interpolated_alpha(blocks: np.ndarray) -> np.ndarray:
+    """DXT5: (N, 8) alpha endpoints + 3-bit indices -> (N, 16)"""
+    n = len(blocks)
+    a0 = blocks[:, 0].astype(np.uint16)
+    a1 = blocks[:, 1].astype(np.uint16)
+    palette = np.empty((n, 8), dtype=np.uint16)
+    palette[:, 0] = a0
+    palette[:, 1] = a1
+    eight = a0 > a1
+    for i in range(1, 7):
+        palette[:, i + 1] = ((7 - i) * a0 + i * a1) // 7
+    six = ~eight
+    for i in range(1, 5):
+        palette[six, i + 1] = ((5 - i) * a0[six] + i * a1[six]) // 5
+    palette[six, 6] = 0
+    palette[six, 7] = 255
+
+    padded = np.zeros((n, 8), dtype=np.uint8)
+    padded[:, :6] = blocks[:, 2:8]
+    bits = padded.view("<u8")[:, 0]
+    indices = ((bits[:, None] >> _SHIFT3) & 7).astype(np.intp)
+    return palette[np.arange(n)[:, None], indices].astype(np.uint8)
+
+
+def _assemble(pixels: np.ndarray, width: int, height: int) -> np.ndarray:
+    """(N, 16, 4) block pixels -> (height, width, 4) image"""
+    bw = max(1, (width + 3) // 4)
+    bh = max(1, (height + 3) // 4)
+    image = pixels.reshape(bh, bw, 4, 4, 4).transpose(0, 2, 1, 3, 4).reshape(bh * 4, bw * 4, 4)
+    return image[:height, :width]
+
+
+def decode_dxt1(data: bytes, width: int, height: int) -> np.ndarray:
+    return _assemble(_color_blocks(_blocks(data, width, height, 8), dxt1=True), width, height)
+
+
+def decode_dxt3(data: bytes, width: int, height: int) -> np.ndarray:
+    blocks = _blocks(data, width, height, 16)
+    pixels = _color_blocks(blocks[:, 8:], dxt1=False)
+    pixels[:, :, 3] = _explicit_alpha(blocks[:, :8])
+    return _assemble(pixels, width, height)
+
+
+def decode_dxt5(data: bytes, width: int, height: int) -> np.ndarray:
+    blocks = _blocks(data, width, height, 16)
+    pixels = _color_blocks(blocks[:, 8:], dxt1=False)
+    pixels[:, :, 3] = _interpolated_alpha(blocks[:, :8])
+    return _assemble(pixels, width, height)
+
+
+def decode_level(fmt: int, data: bytes, width: int, height: int) -> np.ndarray:
+    """Decodes one mip level of any IWI format to (height, width, 4) RGBA"""
+    if fmt == FORMAT_DXT1:
+        return decode_dxt1(data, width, height)
+    if fmt == FORMAT_DXT3:
+        return decode_dxt3(data, width, height)
+    if fmt == FORMAT_DXT5:
+        return decode_dxt5(data, width, height)
+
+    size = level_size(fmt, width, height)
+    if len(data) < size:
+        raise ValueError(f"expected {size} bytes of pixel data, got {len(data)}")
+    raw = np.frombuffer(data, dtype=np.uint8, count=size)
+    image = np.empty((height, width, 4), dtype=np.uint8)
+    if fmt == FORMAT_ARGB8:
+        image[:] = raw.reshape(height, width, 4)[:, :, [2, 1, 0, 3]]   # stored B, G, R, A
+    elif fmt == FORMAT_RGB8:
+        image[:, :, :3] = raw.reshape(height, width, 3)[:, :, ::-1]    # stored B, G, R
+        image[:, :, 3] = 255
+    elif fmt == FORMAT_LA8:
+        la = raw.reshape(height, width, 2)
+        image[:, :, :3] = la[:, :, :1]
+        image[:, :, 3] = la[:, :, 1]
+    elif fmt == FORMAT_A8:
+        image[:, :, :3] = 255
+        image[:, :, 3] = raw.reshape(height, width)
+    else:
+        raise ValueError(f"unknown format 0x{fmt:02x}")
+    return image
+
+
+def _split_blocks(rgba: np.ndarray) -> np.ndarray:
+    """(height, width, 4) image -> (N, 16, 4) blocks, edges repeated up to a multiple of 4"""
+    h, w = rgba.shape[:2]
+    bh, bw = (h + 3) // 4, (w + 3) // 4
+    padded = np.pad(rgba, ((0, bh * 4 - h), (0, bw * 4 - w), (0, 0)), mode="edge")
+    return padded.reshape(bh, 4, bw, 4, 4).transpose(0, 2, 1, 3, 4).reshape(bh * bw, 16, 4)
+
+
+def _pack_565(rgb: np.ndarray) -> np.ndarray:
+    q = np.rint(np.clip(rgb, 0, 255) * np.array([31, 63, 31]) / 255).astype(np.uint16)
+    return (q[..., 0] << 11) | (q[..., 1] << 5) | q[..., 2]
+
+
+def _principal_endpoints(colors: np.ndarray, weights: np.ndarray) -> tuple:
+    """
+    (N, 16, 3) colours -> two (N,) 565 endpoints spanning the weighted colours
+    along their principal axis (found by power iteration)
+    """
+    w = weights[:, :, None]
+    total = np.maximum(w.sum(axis=1), 1e-6)
+    mean = (colors * w).sum(axis=1) / total
+    centered = (colors - mean[:, None]) * (w > 0)
+    cov = np.einsum("nki,nkj->nij", centered, centered)
+    # Start from the covariance row of largest norm: never orthogonal to the principal axis
+    rows = np.linalg.norm(cov, axis=2).argmax(axis=1)
+    axis = cov[np.arange(len(colors)), rows]
+    for _ in range(4):
+        axis = np.einsum("nij,nj->ni", cov, axis)
+        axis /= np.maximum(np.abs(axis).max(axis=1, keepdims=True), 1e-6)
+    axis /= np.maximum(np.linalg.norm(axis, axis=1, keepdims=True), 1e-6)
+
+    proj = np.einsum("nki,ni->nk", centered, axis)
+    lo = np.where(weights > 0, proj, np.inf).min(axis=1)
+    hi = np.where(weights > 0, proj, -np.inf).max(axis=1)
+    lo = np.where(np.isfinite(lo), lo, 0)
+    hi = np.where(np.isfinite(hi), hi, 0)
+    return _pack_565(mean + axis * hi[:, None]), _pack_565(mean + axis * lo[:, None])
+
+
+def _nearest(values: np.ndarray, palette: np.ndarray) -> np.ndarray:
+    """Index of the closest palette entry per pixel: (N, 16, C) vs (N, P, C) -> (N, 16)"""
+    diff = values[:, :, None, :] - palette[:, None, :, :]
+    return np.einsum("nkpc,nkpc->nkp", diff, diff).argmin(axis=2)
+
+
+def _encode_color_blocks(pixels: np.ndarray, dxt1: bool) -> np.ndarray:
+    """(N, 16, 4) RGBA -> (N, 8) colour blocks; DXT1 blocks with alpha < 128 use 1-bit alpha"""
+    n = len(pixels)
+    colors = pixels[:, :, :3].astype(np.float32)
+    transparent = (pixels[:, :, 3] < 128) if dxt1 else np.zeros(pixels.shape[:2], dtype=bool)
+    c0, c1 = _principal_endpoints(colors, (~transparent).astype(np.float32))
+
+    # Four-colour mode needs c0 > c1, three-colour (punch-through alpha) mode c0 <= c1
+    punch = transparent.any(axis=1)
+    swap = np.where(punch, c0 > c1, c0 < c1)
+    c0, c1 = np.where(swap, c1, c0), np.where(swap, c0, c1)
+
+    p0 = _unpack_565(c0).astype(np.float32)
+    p1 = _unpack_565(c1).astype(np.float32)
+    palette = np.stack([p0, p1, (2 * p0 + p1) // 3, (p0 + 2 * p1) // 3], axis=1)
+    palette[punch, 2] = (p0[punch] + p1[punch]) // 2
+    palette[punch, 3] = 1e6         # never the nearest colour; only transparent pixels use it
+    indices = _nearest(colors, palette).astype(np.uint32)
+    indices[transparent] = 3
+    indices[(c0 == c1) & ~punch] = 0
+
+    blocks = np.empty((n, 8), dtype=np.uint8)
+    blocks[:, 0:2] = c0.astype("<u2").view(np.uint8).reshape(n, 2)
+    blocks[:, 2:4] = c1.astype("<u2").view(np.uint8).reshape(n, 2)
+    bits = (indices << _SHIFT2).sum(axis=1, dtype=np.uint32)
+    blocks[:, 4:8] = bits.astype("<u4").view(np.uint8).reshape(n, 4)
+    return blocks
+
+
+def _encode_interpolated_alpha(alpha: np.ndarray) -> np.ndarray:
+    """(N, 16) alpha -> (N, 8) DXT5 alpha blocks (eight-value mode, a0 = max, a1 = min)"""
+    n = len(alpha)
+    a0 = alpha.max(axis=1).astype(np.int32)
+    a1 = alpha.min(axis=1).astype(np.int32)
+    palette = np.empty((n, 8), dtype=np.int32)
+    palette[:, 0] = a0
+    palette[:, 1] = a1
+    for i in range(1, 7):
+        palette[:, i + 1] = ((7 - i) * a0 + i * a1) // 7
+    indices = np.abs(alpha[:, :, None].astype(np.int32) - palette[:, None, :]).argmin(axis=2)
+    indices[a0 == a1] = 0           # flat block: a0 == a1 selects six-value mode, index 0 is still a0
+
+    blocks = np.empty((n, 8), dtype=np.uint8)
+    blocks[:, 0] = a0
+    blocks[:, 1] = a1
+    bits = (indices.astype(np.uint64) << _SHIFT3).sum(axis=1, dtype=np.uint64)
+    blocks[:, 2:8] = bits.astype("<u8").view(np.uint8).reshape(n, 8)[:, :6]
+    return blocks
+
+
+def _dxt5_blocks(pixels: np.ndarray) -> np.ndarray:
+    blocks = np.empty((len(pixels), 16), dtype=np.uint8)
+    blocks[:, :8] = _encode_interpolated_alpha(pixels[:, :, 3])
+    blocks[:, 8:] = _encode_color_blocks(pixels, dxt1=False)
+    return blocks
+
+
+def _encode_chunked(rgba: np.ndarray, encode) -> bytes:
+    pixels = _split_blocks(rgba)
+    return b"".join(encode(pixels[i:i + ENCODE_CHUNK_BLOCKS]).tobytes()
+                    for i in range(0, len(pixels), ENCODE_CHUNK_BLOCKS))
+
+
+def encode_dxt1(rgba: np.ndarray) -> bytes:
+    """(height, width, 4) uint8 RGBA -> DXT1 data; pixels with alpha < 128 become transparent"""
+    return _encode_chunked(rgba, lambda pixels: _encode_color_blocks(pixels, dxt1=True))
+
+
+def encode_dxt5(rgba: np.ndarray) -> bytes:
+    return _encode_chunked(rgba, _dxt5_blocks)
+
+
+def encode_level(fmt: int, rgba: np.ndarray) -> bytes:
+    """Encodes one (height, width, 4) RGBA mip level; the inverse of decode_level (DXT3 excepted)"""
+    rgba = np.ascontiguousarray(rgba, dtype=np.uint8)
+    if fmt == FORMAT_DXT1:
+        return encode_dxt1(rgba)
+    if fmt == FORMAT_DXT5:
+        return encode_dxt5(rgba)
+    if fmt == FORMAT_ARGB8:
+        return rgba[:, :, [2, 1, 0, 3]].tobytes()
+    if fmt == FORMAT_RGB8:
+        return rgba[:, :, 2::-1].tobytes()
+    if fmt == FORMAT_LA8:
+        la = np.empty(rgba.shape[:2] + (2,), dtype=np.uint8)
+        la[:, :, 0] = np.rint(rgba[:, :, :3] @ np.array([0.299, 0.587, 0.114]))
+        la[:, :, 1] = rgba[:, :, 3]
+        return la.tobytes()
+    if fmt == FORMAT_A8:
+        return rgba[:, :, 3].tobytes()
+    raise ValueError(f"cannot encode format 0x{fmt:02x}")
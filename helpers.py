@@ -3,9 +3,17 @@
 from pathlib import Path
 import os
 import re
-import json
+from collections import Counter
+from functools import lru_cache
 from typing import List, Dict, Set
 
+from map_scanner import scan_map_file
+from dep_cache import get_dependency_cache
+from worker_pool import parallel_map
+from xmodel_reader import read_xmodel, XModelFormatError
+from stock_index import get_stock_index
+from vfs import get_game_fs
+
 def get_map_list(cod2_path: str) -> list[str]:
     """Returns list of map names from map_source folder"""
     map_source = Path(cod2_path) / "map_source"
@@ -51,45 +59,46 @@ def write_file(path: Path, content: str, overwrite: bool = False):
     path.write_text(content.strip() + "\n", encoding="utf-8")
 
 
-def get_xmodel_dependencies(cod2_path: str, model_name: str) -> dict[str, any]:
-    """
-    Parses a CoD2 xmodel file and returns the required dependencies.
-    """
-    xmodel_path = Path(cod2_path) / "main" / "xmodel" / model_name
+# Bytes the old decode('ascii', errors='ignore').strip() dropped at either end of a string
+_STRIP_BYTES = rb'[\t\n\x0b\x0c\r\x1c-\x1f \x80-\xff]*'
 
-    suggested_parts = model_name + "0"
+# Character set of texture/material names inside binary asset files
+ASSET_NAME_CHARS = rb'a-zA-Z0-9_~/\.&\-'
+XMODEL_NAME_CHARS = rb'a-z0-9_'
 
-    if not xmodel_path.is_file():
-        return {
-            "surfs": [],
-            "materials": [],
-            "parts": suggested_parts
-        }
 
-    data = xmodel_path.read_bytes()
-
-    pos = 0
-    candidates = []
-    while pos < len(data):
-        start = pos
-        while pos < len(data) and data[pos] != 0:
-            pos += 1
-        if pos > start:
-            try:
-                s = data[start:pos].decode('ascii', errors='ignore').strip()
-                if s:
-                    candidates.append(s)
-            except:
-                pass
-        pos += 1
-
-    pattern = re.compile(r'^[a-z0-9_]+$')
-    filtered = []
-    for s in candidates:
-        if (len(s) >= 6 and
-            pattern.match(s) and
-            ('_' in s or any(c.isdigit() for c in s))):
-            filtered.append(s)
+@lru_cache(maxsize=None)
+def _null_string_patterns(charset: bytes, min_len: int):
+    body = rb'([' + charset + rb']{' + str(min_len).encode() + rb',})'
+    tail = _STRIP_BYTES + rb'(?=\x00|\Z)'
+    # First string (no leading NUL), then every NUL-prefixed string after it.
+    # The literal \x00 prefix lets the regex engine skip ahead with a fast search.
+    head = re.compile(_STRIP_BYTES + body + tail)
+    rest = re.compile(rb'\x00' + _STRIP_BYTES + body + tail)
+    return head, rest
+
+
+def extract_null_strings(data, charset: bytes = ASSET_NAME_CHARS, min_len: int = 1) -> List[str]:
+    """
+    Returns the NUL-separated strings in a binary asset that consist only of
+    `charset` characters and are at least `min_len` long, in file order.
+    Accepts bytes, bytearray, memoryview or mmap.
+    """
+    head, rest = _null_string_patterns(charset, min_len)
+    strings = []
+    first = head.match(data)
+    if first:
+        strings.append(first.group(1).decode("ascii"))
+    strings.extend(b.decode("ascii") for b in rest.findall(data))
+    return strings
+
+
+def _scan_xmodel_strings(data: bytes, model_name: str) -> dict:
+    """Fallback for files read_xmodel() can't parse: guesses names from printable strings"""
+    filtered = [
+        s for s in extract_null_strings(data, XMODEL_NAME_CHARS, min_len=6)
+        if '_' in s or any(c.isdigit() for c in s)
+    ]
 
     materials = []
     surfs = []
@@ -109,236 +118,257 @@ def get_xmodel_dependencies(cod2_path: str, model_name: str) -> dict[str, any]:
     return {
         "surfs": surfs,
         "materials": materials,
-        "parts": suggested_parts
+        "parts": model_name + "0",
     }
 
 
+def get_xmodel_dependencies(cod2_path: str, model_name: str) -> dict[str, any]:
+    """
+    Parses a CoD2 xmodel file and returns the required dependencies.
+    The model is read loose or straight from the stock IWDs (see vfs.py).
+
+    Returns:
+        dict with:
+            surfs: list[str]        # xmodelsurfs names, LOD 0 first
+            parts: Optional[str]    # xmodelparts name (None if the model doesn't exist)
+            materials: list[str]
+            exact: bool             # False if the header didn't parse and names were guessed
+            version, lods, collision_lod, bounds, lod_materials   # only when exact (see xmodel_reader.py)
+    """
+    entry = get_game_fs(cod2_path).resolve(f"xmodel/{model_name}")
+
+    if entry is None:
+        return {
+            "surfs": [],
+            "materials": [],
+            "parts": None,
+            "exact": False,
+        }
+
+    cache = get_dependency_cache()
+    cached = cache.get("xmodel", entry.cache_key, entry.stamp)
+    if cached is not None:
+        return cached
+
+    try:
+        result = read_xmodel(entry)
+        result["exact"] = True
+    except XModelFormatError as e:
+        print(f"  [DEBUG] xmodel/{model_name}: {e}, guessing names from strings")
+        result = _scan_xmodel_strings(entry.read_bytes(), model_name)
+        result["exact"] = False
+
+    cache.put("xmodel", entry.cache_key, result, entry.stamp)
+    return result
+
+
 def parse_map_entities(file_path: Path) -> List[Dict[str, str]]:
     """Parses only keyvalue entities (ignores brushes/patches for speed)"""
-    if not file_path.is_file():
-        return []
+    return scan_map_file(file_path)["entities"]
 
-    text = file_path.read_text(encoding="latin1", errors="replace")
-    lines = [line.rstrip() for line in text.splitlines()]
-
-    entities = []
-    current = None
-    for line in lines:
-        stripped = line.strip()
-        if stripped == "{":
-            current = {}
-        elif stripped == "}":
-            if current is not None:
-                entities.append(current)
-                current = None
-        elif current is not None and not stripped.startswith("//"):
-            match = re.match(r'\s*"([^"]+)"\s*"([^"]*)"\s*', line)
-            if match:
-                key, value = match.groups()
-                current[key] = value
-    return entities
 
+HIDDEN_FX_KEYS = ["script_noteworthy", "fx", "effect", "corona", "script_fx", "targetname"]
 
-def get_textures_from_material(cod2_path: str, material_name: str) -> set[str]:
+
+def get_map_references(map_path: Path) -> dict:
     """
-    Parses a binary material file (NO extension) and extracts referenced texture base names (without .iwi).
-    Allows '&' and '-' in names for specular maps, etc.
+    Extracts the asset references of a single .map/prefab (no recursion).
+    Results are cached on disk and reused until the file changes.
+
+    Returns:
+        dict with:
+            materials: list[str]    # brush + curve/patch materials
+            xmodels: list[str]      # misc_model names (without "xmodel/")
+            xmodel_counts: dict[str, int]   # misc_model instances per name
+            fx: list[str]           # hidden "fx/..." paths (with .efx)
+            prefabs: list[str]      # misc_prefab "model" values, in entity order
     """
-    cod2 = Path(cod2_path)
+    cache = get_dependency_cache()
+    cached = cache.get("map", map_path)
+    if cached is not None:
+        return cached
+
+    scan = scan_map_file(map_path)
+
+    xmodels = Counter()
+    fx_paths: Set[str] = set()
+    prefabs: List[str] = []
+
+    for ent in scan["entities"]:
+        classname = ent.get("classname", "").lower()
+
+        # XModels from misc_model
+        if classname == "misc_model":
+            model = ent.get("model", "")
+            if model.startswith("xmodel/"):
+                name = model[len("xmodel/"):].strip()
+                if name:
+                    xmodels[name] += 1
+
+        # Hidden FX from various keys
+        for key in HIDDEN_FX_KEYS:
+            if key in ent:
+                val = ent[key].strip()
+                if "fx/" in val.lower() or val.lower().startswith("fx/"):
+                    # Normalize
+                    fx_path = val.replace("\\", "/").strip()
+                    if not fx_path.lower().endswith(".efx"):
+                        fx_path += ".efx"
+                    fx_paths.add(fx_path)
+
+        # Prefab references
+        if classname == "misc_prefab":
+            prefab_raw = ent.get("model", "")
+            if prefab_raw and prefab_raw.endswith(".map"):
+                prefabs.append(prefab_raw)
+
+    refs = {
+        "materials": sorted(scan["brush_materials"] | scan["patch_materials"]),
+        "xmodels": sorted(xmodels),
+        "xmodel_counts": dict(sorted(xmodels.items())),
+        "fx": sorted(fx_paths),
+        "prefabs": prefabs,
+    }
+    cache.put("map", map_path, refs)
+    return refs
 
-    possible_paths = [
-        cod2 / "raw" / "materials" / material_name,
-        cod2 / "main" / "materials" / material_name
-    ]
 
-    material_path = None
-    for p in possible_paths:
-        if p.is_file():
-            material_path = p
-            break
+MATERIAL_EXCLUDE_KEYS = {
+    "colorMap", "normalMap", "specularMap", "detailMap", "detailScale",
+    "wallpaper", "phong_replace_detail", "specularColorMap", "alphaMap",
+    "alphaTest", "phong_alphatest_spec", "specularFactor", "glossScale",
+    "bumpMap", "heightMap", "lightMap", "diffuseMap", "emissiveMap",
+    "qer_editorimage", "qer_trans", "surfaceparm", "nomipmaps"
+}
+MATERIAL_EXCLUDE_PREFIXES = ("phong_", "mtl_", "qer_", "surfaceparm")
+
 
-    if not material_path:
+def get_textures_from_material(cod2_path: str, material_name: str) -> set[str]:
+    """
+    Parses a binary material file (NO extension) and extracts referenced texture base names (without .iwi).
+    Allows '&' and '-' in names for specular maps, etc.
+    Looks in raw/ and main/ first, then inside the stock IWDs.
+    """
+    entry = get_game_fs(cod2_path).resolve(f"materials/{material_name}")
+    if entry is None:
         print(f"  [DEBUG] No material file found for {material_name}")
         return set()
 
-    print(f"  [DEBUG] Parsing material: {material_path.name}")
-
-    data = material_path.read_bytes()
-
-    pos = 0
-    candidates = []
-    while pos < len(data):
-        start = pos
-        while pos < len(data) and data[pos] != 0:
-            pos += 1
-        if pos > start:
-            try:
-                s = data[start:pos].decode('ascii', errors='ignore').strip()
-                if s:
-                    candidates.append(s)
-            except:
-                pass
-        pos += 1
-
-    exclude_keys = {
-        "colorMap", "normalMap", "specularMap", "detailMap", "detailScale",
-        "wallpaper", "phong_replace_detail", "specularColorMap", "alphaMap",
-        "alphaTest", "phong_alphatest_spec", "specularFactor", "glossScale",
-        "bumpMap", "heightMap", "lightMap", "diffuseMap", "emissiveMap",
-        "qer_editorimage", "qer_trans", "surfaceparm", "nomipmaps"
-    }
+    cache = get_dependency_cache()
+    cached = cache.get("material", entry.cache_key, entry.stamp)
+    if cached is not None:
+        return set(cached)
 
-    textures = set()
-    for s in candidates:
-        if (len(s) > 3 and
-            re.match(r'^[a-zA-Z0-9_~/\.&\-]+$', s) and
-            s not in exclude_keys and
-            not s.startswith(("phong_", "mtl_", "qer_", "surfaceparm"))):
+    data = entry.read_bytes()
 
+    textures = set()
+    for s in set(extract_null_strings(data, min_len=4)) - MATERIAL_EXCLUDE_KEYS:
+        if not s.startswith(MATERIAL_EXCLUDE_PREFIXES):
             base = Path(s).stem
             if base:
                 textures.add(base)
 
-    if textures:
-        print(f"  → Textures extracted: {', '.join(sorted(textures))}")
-    else:
-        print(f"  → No textures found")
-
+    cache.put("material", entry.cache_key, sorted(textures), entry.stamp)
     return textures
 
 
+def get_textures_for_materials(cod2_path: str, material_names: List[str], jobs: int = None) -> Dict[str, Set[str]]:
+    """
+    Resolves textures for many materials at once. Cached materials are answered
+    directly; the rest are parsed across the worker pool.
+    """
+    cache = get_dependency_cache()
+    fs = get_game_fs(cod2_path)
+    results: Dict[str, Set[str]] = {}
+    to_parse: List[str] = []
+    for name in material_names:
+        entry = fs.resolve(f"materials/{name}")
+        if entry is None:
+            print(f"  [DEBUG] No material file found for {name}")
+            results[name] = set()
+            continue
+        cached = cache.get("material", entry.cache_key, entry.stamp)
+        if cached is None:
+            to_parse.append(name)
+        else:
+            results[name] = set(cached)
+
+    parsed = parallel_map(get_textures_from_material, [cod2_path] * len(to_parse), to_parse, jobs=jobs)
+    results.update(zip(to_parse, parsed))
+    return results
+
+
+def get_xmodel_dependencies_bulk(cod2_path: str, model_names: List[str], jobs: int = None) -> Dict[str, dict]:
+    """
+    get_xmodel_dependencies() for many models, with uncached models parsed across the worker pool.
+    """
+    cache = get_dependency_cache()
+    fs = get_game_fs(cod2_path)
+    results: Dict[str, dict] = {}
+    to_parse: List[str] = []
+    for name in model_names:
+        entry = fs.resolve(f"xmodel/{name}")
+        cached = cache.get("xmodel", entry.cache_key, entry.stamp) if entry else None
+        if cached is None:
+            to_parse.append(name)
+        else:
+            results[name] = cached
+
+    parsed = parallel_map(get_xmodel_dependencies, [cod2_path] * len(to_parse), to_parse, jobs=jobs)
+    results.update(zip(to_parse, parsed))
+    return results
+
+
+def collect_map_references(main_map_path: Path, prefab_dir: Path, jobs: int = None) -> Dict[str, dict]:
+    """
+    Walks the prefab graph breadth-first and returns references for every reachable
+    map/prefab, keyed by resolved path. Each wave of uncached files is parsed in parallel.
+    """
+    cache = get_dependency_cache()
+    refs_by_key: Dict[str, dict] = {}
+    seen: Set[str] = {str(main_map_path.resolve())}
+    frontier = [main_map_path]
+
+    while frontier:
+        to_parse = []
+        for path in frontier:
+            cached = cache.get("map", path)
+            if cached is None:
+                to_parse.append(path)
+            else:
+                refs_by_key[str(path.resolve())] = cached
+        for path, refs in zip(to_parse, parallel_map(get_map_references, to_parse, jobs=jobs)):
+            refs_by_key[str(path.resolve())] = refs
+
+        next_frontier = []
+        for path in frontier:
+            for prefab_raw in refs_by_key[str(path.resolve())]["prefabs"]:
+                prefab_path = prefab_dir / prefab_raw.removeprefix("prefabs/")
+                key = str(prefab_path.resolve())
+                if key not in seen and prefab_path.is_file():
+                    seen.add(key)
+                    next_frontier.append(prefab_path)
+        frontier = next_frontier
+
+    return refs_by_key
+
+
 def get_missing_custom_assets_from_map(
     cod2_path: str,
     map_name: str,
     xmodel_json: str = "lists/xmodel_list.json",
-    material_json: str = "lists/materials.json"
+    material_json: str = "lists/materials.json",
+    jobs: int = None
 ) -> dict:
     """
     Parses map + prefabs → finds custom xmodels, materials, textures, and hidden FX references.
+    Kept for existing callers; the walk is done by dep_graph.DependencyGraph.
 
     Returns:
-        dict with:
-            missing_xmodels: list[str]
-            missing_materials: list[str]
-            missing_textures: list[str]     # .iwi filenames
-            hidden_fx_paths: list[str]      # NEW: full "fx/..." paths (with .efx)
-            dropped_xmodels: int
-            dropped_materials: int
-            total_xmodels: int
-            total_materials: int
-            prefabs_processed: list[str]
+        DependencyGraph.map_summary() (missing_xmodels, missing_materials,
+        missing_textures, hidden_fx_paths, dropped/total counts, prefabs_processed)
     """
-    cod2 = Path(cod2_path)
-    main_map_path = cod2 / "map_source" / f"{map_name}.map"
-    prefab_dir = cod2 / "map_source" / "prefabs"
+    from dep_graph import DependencyGraph   # dep_graph imports this module
 
-    if not main_map_path.is_file():
-        raise FileNotFoundError(f"Main map not found: {main_map_path}")
-
-    known_xmodels: Set[str] = set()
-    xjson_path = Path(xmodel_json)
-    if xjson_path.is_file():
-        try:
-            with open(xjson_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                known_xmodels = {item["name"] for item in data if isinstance(item, dict) and "name" in item}
-        except Exception as e:
-            print(f"[WARNING] Failed to load {xmodel_json}: {e}")
-
-    known_materials: Set[str] = set()
-    mjson_path = Path(material_json)
-    if mjson_path.is_file():
-        try:
-            with open(mjson_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                known_materials = {item["name"] for item in data if isinstance(item, dict) and "name" in item}
-        except Exception as e:
-            print(f"[WARNING] Failed to load {material_json}: {e}")
-
-    used_xmodels: Set[str] = set()
-    used_materials: Set[str] = set()
-    hidden_fx_paths: Set[str] = set()
-    prefabs_processed: List[str] = []
-    visited: Set[str] = set()
-
-    brush_mat_regex = re.compile(r'\)\s*\)\s*\)\s*([a-z0-9_/]+)')
-    cm_mat_regex = re.compile(r'(?:curve|mesh|patchDef2)\s*\{\s*([a-z0-9_/]+)')
-
-    def recurse(map_path: Path):
-        print(f"  Parsing: {map_path.name}")
-        text = map_path.read_text(encoding="latin1", errors="replace")
-
-        # Materials from brushes/curves
-        used_materials.update(brush_mat_regex.findall(text))
-        for match in cm_mat_regex.finditer(text):
-            used_materials.add(match.group(1))
-
-        # Entities
-        entities = parse_map_entities(map_path)
-        for ent in entities:
-            classname = ent.get("classname", "").lower()
-
-            # XModels from misc_model
-            if classname == "misc_model":
-                model = ent.get("model", "")
-                if model.startswith("xmodel/"):
-                    name = model[len("xmodel/"):].strip()
-                    if name:
-                        used_xmodels.add(name)
-
-            # Hidden FX from various keys
-            for key in ["script_noteworthy", "fx", "effect", "corona", "script_fx", "targetname"]:
-                if key in ent:
-                    val = ent[key].strip()
-                    if "fx/" in val.lower() or val.lower().startswith("fx/"):
-                        # Normalize
-                        fx_path = val.replace("\\", "/").strip()
-                        if not fx_path.lower().endswith(".efx"):
-                            fx_path += ".efx"
-                        hidden_fx_paths.add(fx_path)
-
-            # Prefab recursion
-            if classname == "misc_prefab":
-                prefab_raw = ent.get("model", "")
-                if prefab_raw and prefab_raw.endswith(".map"):
-                    prefab_rel = prefab_raw.removeprefix("prefabs/")
-                    prefab_path = prefab_dir / prefab_rel
-                    key = str(prefab_path.resolve())
-                    if prefab_path.is_file() and key not in visited:
-                        visited.add(key)
-                        prefabs_processed.append(prefab_path.name)
-                        recurse(prefab_path)
-
-    recurse(main_map_path)
-
-    missing_xmodels = sorted(used_xmodels - known_xmodels)
-    missing_materials = sorted(used_materials - known_materials)
-
-    dropped_xmodels = len(used_xmodels & known_xmodels)
-    dropped_materials = len(used_materials & known_materials)
-
-    total_xmodels = len(used_xmodels)
-    total_materials = len(used_materials)
-
-    missing_textures = set()
-    print(f"\nParsing {len(missing_materials)} missing materials for textures...")
-    for mat in missing_materials:
-        tex_bases = get_textures_from_material(cod2_path, mat)
-        missing_textures.update(tex_bases)
-
-    missing_iwis = sorted([t + ".iwi" for t in missing_textures])
-
-    # Final hidden FX list (deduped, sorted)
-    hidden_fx_list = sorted(hidden_fx_paths)
-
-    return {
-        "missing_xmodels": missing_xmodels,
-        "missing_materials": missing_materials,
-        "missing_textures": missing_iwis,
-        "hidden_fx_paths": hidden_fx_list,          # ← NEW
-        "dropped_xmodels": dropped_xmodels,
-        "dropped_materials": dropped_materials,
-        "total_xmodels": total_xmodels,
-        "total_materials": total_materials,
-        "prefabs_processed": prefabs_processed
-    }
+    stock = get_stock_index(xmodel_json=Path(xmodel_json), material_json=Path(material_json), cod2_path=cod2_path)
+    return DependencyGraph(cod2_path, map_name, jobs=jobs, stock=stock).build().map_summary()
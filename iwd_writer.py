@@ -0,0 +1,723 @@
+# iwd_writer.py
+"""
+Writes .iwd archives (plain zip files) straight from the source files.
+
+Nothing is staged in a temporary folder. The archive is written next to the
+destination as "<name>.tmp" and only renamed into place once it is complete,
+so a failed pack leaves nothing behind.
+
+Members are compressed according to COMPRESSION_POLICY (by extension):
+already-compressed data such as .mp3 is stored, .iwi textures are stored
+unless a trial compression of a sample shrinks them noticeably, and text
+assets get maximum compression. With jobs > 1 members are compressed
+concurrently on the worker pool; RawZipWriter then writes the precompressed
+streams and the central directory in order. With jobs = 1 each member is
+streamed from its source in chunks and compressed on the way, so no whole
+member is held in memory. Stored members are always copied in chunks.
+
+The deflate level of each member is recorded in a small central-directory
+extra field, so an update can tell a level-6 member from a level-9 one.
+
+update_iwd() repacks incrementally: members whose source is unchanged are
+copied from the previous archive as raw compressed bytes.
+
+With reproducible=True identical inputs give byte-identical archives: members
+are sorted by game path, and every member gets the same timestamp and
+permissions. A sidecar "<name>.iwd.manifest.json" records the archive's
+SHA-256 and each member's size and CRC-32, so a pack can be checked against
+its inputs without opening it. It also records the zlib version and the
+compression policy, since a reproducible update only reuses compressed
+members written under the same ones.
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import os
+import struct
+import time
+import zipfile
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from dep_cache import get_dependency_cache
+from worker_pool import default_jobs, imap_bounded
+
+CHUNK_SIZE = 1024 * 1024
+# zlib's default level, spelled out: it is recorded with each member, and
+# reproducible output must not depend on zlib's default
+DEFLATE_LEVEL = 6
+
+# Reproducible mode: every member gets this timestamp and these permissions (rw-r--r--)
+REPRODUCIBLE_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+REPRODUCIBLE_ATTR = 0o100644 << 16
+MANIFEST_SUFFIX = ".manifest.json"
+_MANIFEST_FORMAT = 1
+
+# Compression policy values: STORE, ADAPTIVE, or a deflate level (0-9)
+STORE = "store"
+ADAPTIVE = "adaptive"
+
+COMPRESSION_POLICY: Dict[str, Union[str, int]] = {
+    ".mp3": STORE,
+    ".iwi": ADAPTIVE,
+    ".gsc": 9,
+    ".csv": 9,
+    ".efx": 9,
+}
+# Material files have no extension, so they are matched by their top-level folder
+FOLDER_POLICY: Dict[str, Union[str, int]] = {
+    "materials": 9,
+}
+
+# ADAPTIVE: deflate only if a sample shrinks by at least this fraction
+ADAPTIVE_MIN_SAVING = 0.10
+ADAPTIVE_SAMPLES = 4
+ADAPTIVE_SAMPLE_SIZE = 64 * 1024
+
+# Central-directory extra field holding a deflated member's level (1 byte)
+_LEVEL_EXTRA_ID = 0x4C57
+_LEVEL_EXTRA = struct.Struct("<HHB")
+
+# Beyond these the archive would need zip64, which the game does not read
+_ZIP32_MAX_SIZE = 0xFFFFFFFF
+_ZIP32_MAX_ENTRIES = 0xFFFF
+
+
+def iwd_archive_name(src_path: Path, cod2_path: Path = None) -> str:
+    """
+    Game path of a source file inside the IWD, e.g.
+    <cod2>/raw/materials/foo -> materials/foo, <cod2>/main/images/bar.iwi -> images/bar.iwi
+    """
+    src_path = Path(src_path)
+    if cod2_path is not None:
+        for base in ("raw", "main"):
+            try:
+                return src_path.relative_to(Path(cod2_path) / base).as_posix()
+            except ValueError:
+                pass
+
+    if "raw" in src_path.parts:
+        idx = src_path.parts.index("raw")
+        return Path(*src_path.parts[idx+1:]).as_posix()
+    elif "main" in src_path.parts:
+        idx = src_path.parts.index("main")
+        return Path(*src_path.parts[idx+1:]).as_posix()
+    return src_path.name
+
+
+def plan_iwd_members(files: Iterable[Path], cod2_path: Path = None) -> Dict[str, Path]:
+    """
+    Maps archive names to source files, sorted by source path.
+    If two sources land on the same game path (case-insensitive), the first one wins.
+    """
+    members: Dict[str, Path] = {}
+    seen_lower = {}
+    for src in sorted(Path(f) for f in files):
+        if not src.is_file():
+            continue
+        arcname = iwd_archive_name(src, cod2_path)
+        key = arcname.lower()
+        if key in seen_lower:
+            print(f"[IWD] Duplicate game path {arcname}: keeping {seen_lower[key]}, skipping {src}")
+            continue
+        seen_lower[key] = src
+        members[arcname] = src
+    return members
+
+
+def compression_policy(arcname: str) -> Union[str, int]:
+    """Policy for a game path: STORE, ADAPTIVE or a deflate level"""
+    path = arcname.lower()
+    policy = COMPRESSION_POLICY.get(os.path.splitext(path)[1])
+    if policy is None:
+        policy = FOLDER_POLICY.get(path.split("/", 1)[0], DEFLATE_LEVEL)
+    return policy
+
+
+def _read_sample(src: Path, size: int) -> bytes:
+    """A few evenly spaced windows of the file, or the whole file if it is small"""
+    with open(src, "rb") as f:
+        if size <= ADAPTIVE_SAMPLES * ADAPTIVE_SAMPLE_SIZE:
+            return f.read()
+        step = size // ADAPTIVE_SAMPLES
+        parts = []
+        for i in range(ADAPTIVE_SAMPLES):
+            f.seek(i * step)
+            parts.append(f.read(ADAPTIVE_SAMPLE_SIZE))
+        return b"".join(parts)
+
+
+def _trial_deflate(src: Path):
+    """Deflates a sample. Returns (fraction saved, estimated seconds to deflate the whole file)."""
+    size = os.path.getsize(src)
+    sample = _read_sample(src, size)
+    if not sample:
+        return 0.0, 0.0
+    start = time.perf_counter()
+    compressor = zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -15)
+    packed = len(compressor.compress(sample)) + len(compressor.flush())
+    elapsed = time.perf_counter() - start
+    return 1.0 - packed / len(sample), elapsed * size / len(sample)
+
+
+def _policy_level(policy: Union[str, int]) -> Optional[int]:
+    """Deflate level a policy compresses with, None for STORE"""
+    if policy == STORE:
+        return None
+    return DEFLATE_LEVEL if policy == ADAPTIVE else policy
+
+
+def _choose_level(src: Path, policy: Union[str, int]):
+    """
+    Deflate level for src under policy, or None to store it. Returns (level,
+    seconds saved): the estimated deflate time skipped when an ADAPTIVE
+    member is stored. STORE members are not trial-compressed.
+    """
+    if policy == ADAPTIVE:
+        saving, seconds = _trial_deflate(src)
+        if saving < ADAPTIVE_MIN_SAVING:
+            return None, seconds
+    return _policy_level(policy), 0.0
+
+
+def compress_file(src: Path, policy: Union[str, int] = DEFLATE_LEVEL):
+    """
+    Compresses a whole file according to policy (worker function).
+    Returns (compress_type, crc32, compressed bytes, seconds saved). For stored
+    members the data is None (copy it from src).
+    """
+    level, seconds = _choose_level(src, policy)
+    if level is None:
+        return zipfile.ZIP_STORED, file_crc32(src), None, seconds
+
+    crc, data = deflate_file(src, level)
+    return zipfile.ZIP_DEFLATED, crc, data, 0.0
+
+
+def deflate_file(src: Path, level: int = DEFLATE_LEVEL):
+    """Raw-deflates a whole file. Returns (crc32, compressed bytes)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    crc = 0
+    parts = []
+    with open(src, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            parts.append(compressor.compress(chunk))
+    parts.append(compressor.flush())
+    return crc, b"".join(parts)
+
+
+class RawZipWriter:
+    """
+    Minimal zip writer for members whose compressed bytes are already known.
+    Metadata is carried in zipfile.ZipInfo objects (CRC, sizes, method, date, attributes).
+    """
+
+    def __init__(self, fileobj):
+        self.fp = fileobj
+        self.entries = []
+
+    @staticmethod
+    def _dos_datetime(date_time):
+        y, mo, d, h, mi, s = date_time
+        return (h << 11) | (mi << 5) | (s // 2), ((y - 1980) << 9) | (mo << 5) | d
+
+    @staticmethod
+    def _encode_name(zinfo: zipfile.ZipInfo):
+        try:
+            return zinfo.filename.encode("ascii"), zinfo.flag_bits & ~0x800
+        except UnicodeEncodeError:
+            return zinfo.filename.encode("utf-8"), zinfo.flag_bits | 0x800
+
+    def _write_local_header(self, zinfo: zipfile.ZipInfo):
+        if max(self.fp.tell(), zinfo.compress_size, zinfo.file_size) > _ZIP32_MAX_SIZE:
+            raise ValueError(f"IWD would exceed 4 GB at {zinfo.filename}")
+        name, flags = self._encode_name(zinfo)
+        dostime, dosdate = self._dos_datetime(zinfo.date_time)
+        self.fp.write(struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 20, flags, zinfo.compress_type, dostime, dosdate,
+            zinfo.CRC, zinfo.compress_size, zinfo.file_size, len(name), 0
+        ))
+        self.fp.write(name)
+        zinfo.flag_bits = flags
+
+    def write_member(self, zinfo: zipfile.ZipInfo, chunks: Iterable[bytes]):
+        """Writes a local header followed by the (already compressed) member data"""
+        if len(self.entries) >= _ZIP32_MAX_ENTRIES:
+            raise ValueError("Too many files for an IWD (65535 max)")
+        offset = self.fp.tell()
+        self._write_local_header(zinfo)
+        written = 0
+        for chunk in chunks:
+            self.fp.write(chunk)
+            written += len(chunk)
+        if written != zinfo.compress_size:
+            raise ValueError(f"{zinfo.filename}: wrote {written} bytes, expected {zinfo.compress_size}")
+
+        zinfo.header_offset = offset
+        self.entries.append(zinfo)
+
+    def write_member_from_file(self, zinfo: zipfile.ZipInfo, src: Path, level: Optional[int]):
+        """
+        Streams src into the archive in chunks, deflated at level (None: stored).
+        The CRC and sizes are only known at the end, so the local header is
+        written as a placeholder and rewritten in place.
+        """
+        if len(self.entries) >= _ZIP32_MAX_ENTRIES:
+            raise ValueError("Too many files for an IWD (65535 max)")
+        offset = self.fp.tell()
+        zinfo.compress_type = zipfile.ZIP_STORED if level is None else zipfile.ZIP_DEFLATED
+        zinfo.CRC = zinfo.compress_size = zinfo.file_size = 0
+        self._write_local_header(zinfo)
+
+        compressor = None if level is None else zlib.compressobj(level, zlib.DEFLATED, -15)
+        crc = size = written = 0
+        for chunk in iter_file(src):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            data = compressor.compress(chunk) if compressor else chunk
+            self.fp.write(data)
+            written += len(data)
+        if compressor:
+            data = compressor.flush()
+            self.fp.write(data)
+            written += len(data)
+
+        end = self.fp.tell()
+        zinfo.CRC, zinfo.file_size, zinfo.compress_size = crc, size, written
+        self.fp.seek(offset)
+        self._write_local_header(zinfo)
+        self.fp.seek(end)
+        if end > _ZIP32_MAX_SIZE:
+            raise ValueError(f"IWD would exceed 4 GB at {zinfo.filename}")
+
+        zinfo.header_offset = offset
+        self.entries.append(zinfo)
+
+    def close(self):
+        """Writes the central directory and end-of-central-directory record"""
+        cd_offset = self.fp.tell()
+        for zinfo in self.entries:
+            name, flags = self._encode_name(zinfo)
+            dostime, dosdate = self._dos_datetime(zinfo.date_time)
+            self.fp.write(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, (zinfo.create_system << 8) | 20, 20, flags,
+                zinfo.compress_type, dostime, dosdate, zinfo.CRC, zinfo.compress_size,
+                zinfo.file_size, len(name), len(zinfo.extra), 0, 0, 0, zinfo.external_attr & 0xFFFFFFFF,
+                zinfo.header_offset
+            ))
+            self.fp.write(name)
+            self.fp.write(zinfo.extra)
+        cd_size = self.fp.tell() - cd_offset
+        if cd_offset + cd_size > _ZIP32_MAX_SIZE:
+            raise ValueError("IWD would exceed 4 GB")
+        self.fp.write(struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, len(self.entries), len(self.entries), cd_size, cd_offset, 0
+        ))
+
+
+def iter_file(path: Path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def file_crc32(path: Path) -> int:
+    crc = 0
+    for chunk in iter_file(path):
+        crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def cached_file_crc32(path: Path) -> int:
+    """file_crc32() through the dependency cache (validated by size and full-resolution mtime)"""
+    cache = get_dependency_cache()
+    crc = cache.get("crc", path)
+    if crc is None:
+        crc = file_crc32(path)
+        cache.put("crc", path, crc)
+    return crc
+
+
+def _member_info(src: Path, arcname: str, reproducible: bool) -> zipfile.ZipInfo:
+    zinfo = zipfile.ZipInfo.from_file(src, arcname)
+    if reproducible:
+        zinfo.date_time = REPRODUCIBLE_DATE_TIME
+        zinfo.external_attr = REPRODUCIBLE_ATTR
+        zinfo.create_system = 3
+    return zinfo
+
+
+def _set_level(zinfo: zipfile.ZipInfo, level: Optional[int]):
+    zinfo.extra = b"" if level is None else _LEVEL_EXTRA.pack(_LEVEL_EXTRA_ID, 1, level)
+
+
+def _member_level(zinfo: zipfile.ZipInfo) -> Optional[int]:
+    """Deflate level recorded by _set_level(), None if absent (e.g. archives from other tools)"""
+    extra = zinfo.extra
+    pos = 0
+    while pos + 4 <= len(extra):
+        field_id, size = struct.unpack_from("<HH", extra, pos)
+        if field_id == _LEVEL_EXTRA_ID and size == 1 and pos + 5 <= len(extra):
+            return extra[pos + 4]
+        pos += 4 + size
+    return None
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    for chunk in iter_file(path):
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def manifest_path(iwd_path: Path) -> Path:
+    iwd_path = Path(iwd_path)
+    return iwd_path.with_name(iwd_path.name + MANIFEST_SUFFIX)
+
+
+def content_digest(members: Iterable[Tuple[str, int, int]]) -> str:
+    """SHA-256 over sorted (game path, size, crc32) triples: identifies an archive's content"""
+    h = hashlib.sha256()
+    for name, size, crc in sorted(members):
+        h.update(f"{name}\0{size}\0{crc:08x}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def policy_fingerprint() -> str:
+    """SHA-256 of every setting that decides how a member is compressed"""
+    settings = {
+        "deflate_level": DEFLATE_LEVEL,
+        "extensions": COMPRESSION_POLICY,
+        "folders": FOLDER_POLICY,
+        "adaptive": [ADAPTIVE_MIN_SAVING, ADAPTIVE_SAMPLES, ADAPTIVE_SAMPLE_SIZE],
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def read_manifest(iwd_path: Path) -> Optional[dict]:
+    """The sidecar manifest of a reproducible pack, or None"""
+    try:
+        with open(manifest_path(iwd_path), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get("format") != _MANIFEST_FORMAT:
+        return None
+    return manifest
+
+
+def _write_manifest(iwd_path: Path, members: List[Tuple[str, int, int]], sha256: str):
+    manifest = {
+        "format": _MANIFEST_FORMAT,
+        "iwd": iwd_path.name,
+        "size": iwd_path.stat().st_size,
+        "sha256": sha256,
+        "content_digest": content_digest(members),
+        "zlib": zlib.ZLIB_VERSION,
+        "policy": policy_fingerprint(),
+        "members": [{"name": n, "size": size, "crc32": f"{crc:08x}"} for n, size, crc in members],
+    }
+    path = manifest_path(iwd_path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class _PackStats:
+    def __init__(self):
+        self.bytes_in = 0
+        self.stored = 0
+        self.bytes_saved = 0
+        self.seconds_saved = 0.0
+        self.members: List[Tuple[str, int, int]] = []
+
+    def add(self, zinfo: zipfile.ZipInfo):
+        self.members.append((zinfo.filename, zinfo.file_size, zinfo.CRC))
+        self.bytes_in += zinfo.file_size
+        self.bytes_saved += zinfo.file_size - zinfo.compress_size
+        if zinfo.compress_type == zipfile.ZIP_STORED:
+            self.stored += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "bytes_in": self.bytes_in,
+            "stored": self.stored,
+            "bytes_saved": self.bytes_saved,
+            "seconds_saved": self.seconds_saved,
+        }
+
+
+def _write_compressed(writer: RawZipWriter, src: Path, arcname: str, result, stats: _PackStats,
+                      reproducible: bool = False):
+    compress_type, crc, data, seconds_saved = result
+    zinfo = _member_info(src, arcname, reproducible)
+    zinfo.compress_type = compress_type
+    zinfo.CRC = crc
+    if data is None:
+        zinfo.compress_size = zinfo.file_size
+        writer.write_member(zinfo, iter_file(src))
+        _set_level(zinfo, None)
+    else:
+        zinfo.compress_size = len(data)
+        writer.write_member(zinfo, [data])
+        _set_level(zinfo, _policy_level(compression_policy(arcname)))
+    stats.add(zinfo)
+    stats.seconds_saved += seconds_saved
+
+
+def _stream_compressed(writer: RawZipWriter, src: Path, arcname: str, stats: _PackStats,
+                       reproducible: bool = False):
+    """Serial path: chooses the level per policy and streams the member without buffering it"""
+    level, seconds_saved = _choose_level(src, compression_policy(arcname))
+    zinfo = _member_info(src, arcname, reproducible)
+    writer.write_member_from_file(zinfo, src, level)
+    _set_level(zinfo, level)
+    stats.add(zinfo)
+    stats.seconds_saved += seconds_saved
+
+
+def _compressed_members(members: Dict[str, Path], jobs: int):
+    """
+    compress_file() results for members, in order, computed on the worker
+    pool; None (stream it with _stream_compressed) when running serially
+    """
+    if (jobs or default_jobs()) <= 1:
+        return iter([None] * len(members))
+    policies = [compression_policy(arcname) for arcname in members]
+    return imap_bounded(compress_file, list(members.values()), policies, jobs=jobs)
+
+
+def _write_members(tmp_path: Path, members: Dict[str, Path], jobs: int, reproducible: bool = False):
+    stats = _PackStats()
+    with open(tmp_path, "wb") as f:
+        writer = RawZipWriter(f)
+        for (arcname, src), result in zip(members.items(), _compressed_members(members, jobs)):
+            if result is None:
+                _stream_compressed(writer, src, arcname, stats, reproducible)
+            else:
+                _write_compressed(writer, src, arcname, result, stats, reproducible)
+        writer.close()
+    return stats
+
+
+def _plan(files: Iterable[Path], cod2_path: Path, reproducible: bool) -> Dict[str, Path]:
+    members = plan_iwd_members(files, cod2_path)
+    if reproducible:
+        members = dict(sorted(members.items()))
+    return members
+
+
+def _finish(output_path: Path, stats: _PackStats, reproducible: bool) -> dict:
+    report = {"files": len(stats.members), "bytes_out": output_path.stat().st_size}
+    report.update(stats.as_dict())
+    if reproducible:
+        sha256 = _file_sha256(output_path)
+        _write_manifest(output_path, stats.members, sha256)
+        report["sha256"] = sha256
+        report["manifest"] = manifest_path(output_path)
+    else:
+        # A manifest from an earlier reproducible pack would no longer match
+        try:
+            manifest_path(output_path).unlink()
+        except OSError:
+            pass
+    return report
+
+
+def iter_raw_member(fp, zinfo: zipfile.ZipInfo, chunk_size: int = CHUNK_SIZE):
+    """Yields a member's compressed bytes straight from an open archive file, without inflating"""
+    fp.seek(zinfo.header_offset)
+    header = fp.read(30)
+    if len(header) != 30 or header[:4] != b"PK\x03\x04":
+        raise zipfile.BadZipFile(f"Bad local header for {zinfo.filename}")
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    fp.seek(zinfo.header_offset + 30 + name_len + extra_len)
+    remaining = zinfo.compress_size
+    while remaining:
+        chunk = fp.read(min(chunk_size, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated data for {zinfo.filename}")
+        remaining -= len(chunk)
+        yield chunk
+
+
+def pack_iwd(files: Iterable[Path], output_path: Path, cod2_path: Path = None, jobs: int = None,
+             reproducible: bool = False) -> dict:
+    """
+    Packs files into output_path, compressing each member according to
+    compression_policy(). With jobs > 1 (default: one per CPU) members are
+    compressed concurrently; jobs=1 streams them one by one in this process.
+    With reproducible=True the output is byte-stable and a manifest is written.
+
+    Returns:
+        dict with:
+            files: int              # members written
+            bytes_in: int           # uncompressed size
+            bytes_out: int          # size of the finished .iwd
+            stored: int             # members stored without compression
+            bytes_saved: int        # bytes_in minus the compressed size of all members
+            seconds_saved: float    # estimated deflate time skipped for ADAPTIVE members that were stored
+            seconds: float
+            sha256: str             # of the .iwd (reproducible only)
+            manifest: Path          # sidecar manifest (reproducible only)
+    """
+    start = time.perf_counter()
+    output_path = Path(output_path)
+    members = _plan(files, cod2_path, reproducible)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    try:
+        stats = _write_members(tmp_path, members, jobs, reproducible)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        raise
+
+    report = _finish(output_path, stats, reproducible)
+    report["seconds"] = time.perf_counter() - start
+    return report
+
+
+def _matches_policy(old_info: zipfile.ZipInfo, policy: Union[str, int]) -> bool:
+    """Whether an existing member was written the way policy would write it now (method and level)"""
+    if old_info.compress_type == zipfile.ZIP_STORED:
+        return policy in (STORE, ADAPTIVE)
+    if old_info.compress_type != zipfile.ZIP_DEFLATED:
+        return False
+    return policy != STORE and _member_level(old_info) == _policy_level(policy)
+
+
+def _reproducible_reuse_ok(output_path: Path, old_infos: Iterable[zipfile.ZipInfo]) -> bool:
+    """
+    Whether the members of the archive at output_path can be copied into a
+    reproducible pack: it must have been written reproducibly with the current
+    zlib and compression policy, as its manifest (which must match it) says.
+    Otherwise another level or zlib build could have produced different bytes.
+    """
+    manifest = read_manifest(output_path)
+    if manifest is None:
+        return False
+    try:
+        size = output_path.stat().st_size
+    except OSError:
+        return False
+    return (manifest.get("zlib") == zlib.ZLIB_VERSION
+            and manifest.get("policy") == policy_fingerprint()
+            and manifest.get("size") == size
+            and manifest.get("content_digest") == content_digest(
+                (zi.filename, zi.file_size, zi.CRC) for zi in old_infos))
+
+
+def _is_unchanged(src: Path, new_info: zipfile.ZipInfo, old_info: zipfile.ZipInfo) -> bool:
+    """
+    Size, compression method (per policy) and CRC must all match. The DOS
+    timestamp is not trusted: with 2-second resolution it misses quick
+    same-size edits. The CRC comes from the cache while the file is unchanged.
+    """
+    if old_info is None or old_info.file_size != new_info.file_size:
+        return False
+    if old_info.flag_bits & 0x1:
+        return False
+    if not _matches_policy(old_info, compression_policy(new_info.filename)):
+        return False
+    return cached_file_crc32(src) == old_info.CRC
+
+
+def update_iwd(files: Iterable[Path], output_path: Path, cod2_path: Path = None, jobs: int = None,
+               reproducible: bool = False) -> dict:
+    """
+    Incrementally repacks an existing IWD. Unchanged members are copied as raw
+    compressed bytes, changed and new ones are compressed per
+    compression_policy(), and members whose source is gone are dropped.
+    Falls back to pack_iwd() if there is no readable archive at output_path
+    yet. In reproducible mode members are only
+    reused from an archive whose manifest shows it was packed reproducibly with
+    the same zlib and compression policy (everything is recompressed
+    otherwise), so the result is byte-identical to a fresh reproducible
+    pack_iwd().
+
+    Returns the pack_iwd() report plus:
+        reused: int         # members copied without recompressing
+        compressed: int     # members (re)compressed
+        removed: int        # members dropped from the previous archive
+    """
+    start = time.perf_counter()
+    output_path = Path(output_path)
+    try:
+        old_zip = zipfile.ZipFile(output_path)
+    except (OSError, zipfile.BadZipFile):
+        report = pack_iwd(files, output_path, cod2_path, jobs, reproducible)
+        report.update(reused=0, compressed=report["files"], removed=0)
+        return report
+
+    members = _plan(files, cod2_path, reproducible)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    stats = _PackStats()
+    reused = 0
+    try:
+        with old_zip, open(output_path, "rb") as old_fp:
+            old_infos = {zi.filename.lower(): zi for zi in old_zip.infolist()}
+            removed = len(set(old_infos) - {a.lower() for a in members})
+            if reproducible and not _reproducible_reuse_ok(output_path, old_infos.values()):
+                print(f"[IWD] {output_path.name}: no matching reproducible manifest, recompressing every member")
+                old_infos = {}
+            plan = []
+            to_compress: Dict[str, Path] = {}
+            for arcname, src in members.items():
+                new_info = zipfile.ZipInfo.from_file(src, arcname)
+                old_info = old_infos.get(arcname.lower())
+                if _is_unchanged(src, new_info, old_info):
+                    plan.append((arcname, src, old_info))
+                else:
+                    plan.append((arcname, src, None))
+                    to_compress[arcname] = src
+
+            with open(tmp_path, "wb") as f:
+                writer = RawZipWriter(f)
+                compressed = _compressed_members(to_compress, jobs)
+                for arcname, src, old_info in plan:
+                    if old_info is not None:
+                        zinfo = _member_info(src, arcname, reproducible)
+                        zinfo.compress_type = old_info.compress_type
+                        zinfo.CRC = old_info.CRC
+                        zinfo.compress_size = old_info.compress_size
+                        writer.write_member(zinfo, iter_raw_member(old_fp, old_info))
+                        _set_level(zinfo, _member_level(old_info))
+                        stats.add(zinfo)
+                        reused += 1
+                        continue
+                    result = next(compressed)
+                    if result is None:
+                        _stream_compressed(writer, src, arcname, stats, reproducible)
+                    else:
+                        _write_compressed(writer, src, arcname, result, stats, reproducible)
+                writer.close()
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        raise
+
+    report = _finish(output_path, stats, reproducible)
+    report.update(
+        seconds=time.perf_counter() - start,
+        reused=reused,
+        compressed=len(members) - reused,
+        removed=removed,
+    )
+    return report
@@ -0,0 +1,174 @@
+# iwi.py
+"""
+CoD2 .iwi texture format: header, mip layout, memory size and writing.
+
+Header (28 bytes, little-endian):
+
+    char    magic[3]        # "IWi"
+    uint8   version         # 5 for CoD2
+    uint8   format          # see FORMATS
+    uint8   flags           # see FLAG_*
+    uint16  width, height, depth
+    uint32  offsets[4]      # offsets[0] = file size; offsets[i] = start of mip i-1 (= end of mip i)
+
+Mip levels follow the header smallest first, so the full-size image is the
+last block in the file.
+"""
+
+import struct
+from typing import List, Optional, Tuple
+
+IWI_MAGIC = b"IWi"
+IWI_VERSION = 5
+HEADER = struct.Struct("<3sBBBHHH4I")
+HEADER_SIZE = HEADER.size
+
+FORMAT_ARGB8 = 0x01
+FORMAT_RGB8 = 0x02
+FORMAT_LA8 = 0x03
+FORMAT_A8 = 0x04
+FORMAT_DXT1 = 0x0B
+FORMAT_DXT3 = 0x0C
+FORMAT_DXT5 = 0x0D
+
+# format -> (name, bytes per pixel or per 4x4 block, block-compressed)
+FORMATS = {
+    FORMAT_ARGB8: ("ARGB8", 4, False),
+    FORMAT_RGB8: ("RGB8", 3, False),
+    FORMAT_LA8: ("LA8", 2, False),
+    FORMAT_A8: ("A8", 1, False),
+    FORMAT_DXT1: ("DXT1", 8, True),
+    FORMAT_DXT3: ("DXT3", 16, True),
+    FORMAT_DXT5: ("DXT5", 16, True),
+}
+
+FLAG_NOPICMIP = 0x01
+FLAG_NOMIPMAPS = 0x02
+FLAG_CUBEMAP = 0x04
+
+
+class IwiFormatError(ValueError):
+    pass
+
+
+def level_size(fmt: int, width: int, height: int) -> int:
+    """Bytes of one mip level of one face"""
+    _name, unit, blocks = FORMATS[fmt]
+    if blocks:
+        return max(1, (width + 3) // 4) * max(1, (height + 3) // 4) * unit
+    return width * height * unit
+
+
+def mip_dimensions(width: int, height: int, count: int) -> List[Tuple[int, int]]:
+    """(width, height) of mip levels 0..count-1, largest first"""
+    return [(max(1, width >> i), max(1, height >> i)) for i in range(count)]
+
+
+def full_mip_count(width: int, height: int) -> int:
+    return max(width, height, 1).bit_length()
+
+
+def _count_mips(fmt: int, width: int, height: int, faces: int, data_size: int) -> Optional[int]:
+    total = 0
+    for i, (w, h) in enumerate(mip_dimensions(width, height, full_mip_count(width, height))):
+        total += level_size(fmt, w, h) * faces
+        if total == data_size:
+            return i + 1
+        if total > data_size:
+            break
+    return None
+
+
+def parse_iwi_header(head: bytes) -> dict:
+    """
+    Parses the 28-byte header.
+
+    Returns:
+        dict with:
+            format: str                 # "DXT1", "ARGB8", ...
+            format_id: int
+            flags: int
+            width, height: int
+            faces: int                  # 6 for cube maps
+            mips: int                   # mip levels stored in the file
+            file_size: int              # from the header
+    """
+    if len(head) < HEADER_SIZE:
+        raise IwiFormatError("file too short")
+    magic, version, fmt, flags, width, height, _depth, *offsets = HEADER.unpack_from(head)
+    if magic != IWI_MAGIC:
+        raise IwiFormatError("not an IWI file")
+    if version != IWI_VERSION:
+        raise IwiFormatError(f"unsupported IWI version {version}")
+    if fmt not in FORMATS:
+        raise IwiFormatError(f"unknown format 0x{fmt:02x}")
+    if not width or not height:
+        raise IwiFormatError("zero size")
+
+    faces = 6 if flags & FLAG_CUBEMAP else 1
+    file_size = offsets[0]
+    if flags & FLAG_NOMIPMAPS:
+        mips = 1
+    else:
+        # Stored levels are whatever fills the file; a full chain if the sizes don't add up
+        mips = _count_mips(fmt, width, height, faces, file_size - HEADER_SIZE) or full_mip_count(width, height)
+
+    return {
+        "format": FORMATS[fmt][0],
+        "format_id": fmt,
+        "flags": flags,
+        "width": width,
+        "height": height,
+        "faces": faces,
+        "mips": mips,
+        "file_size": file_size,
+    }
+
+
+def mip_offsets(header: dict) -> List[Tuple[int, int]]:
+    """(offset, size) of each stored mip level in the file, largest first (all faces together)"""
+    fmt, faces = header["format_id"], header["faces"]
+    levels = mip_dimensions(header["width"], header["height"], header["mips"])
+    sizes = [level_size(fmt, w, h) * faces for w, h in levels]
+    offsets = []
+    end = header["file_size"]
+    for size in sizes:
+        offsets.append((end - size, size))
+        end -= size
+    return offsets
+
+
+def build_iwi(fmt: int, width: int, height: int, levels: List[bytes], flags: int = 0) -> bytes:
+    """
+    A complete .iwi file from encoded mip levels (largest first, as from
+    mip_dimensions). A single level gets FLAG_NOMIPMAPS.
+    """
+    if fmt not in FORMATS:
+        raise IwiFormatError(f"unknown format 0x{fmt:02x}")
+    for i, ((w, h), data) in enumerate(zip(mip_dimensions(width, height, len(levels)), levels)):
+        if len(data) != level_size(fmt, w, h):
+            raise IwiFormatError(f"mip {i} is {len(data)} bytes, expected {level_size(fmt, w, h)}")
+    if len(levels) == 1:
+        flags |= FLAG_NOMIPMAPS
+
+    file_size = HEADER_SIZE + sum(map(len, levels))
+    offsets = [file_size]
+    end = file_size
+    for data in levels[:3]:
+        end -= len(data)
+        offsets.append(end)
+    offsets += [HEADER_SIZE] * (4 - len(offsets))
+    header = HEADER.pack(IWI_MAGIC, IWI_VERSION, fmt, flags, width, height, 1, *offsets)
+    return header + b"".join(reversed(levels))
+
+
+def gpu_bytes(header: dict) -> int:
+    """Video memory for all stored levels and faces; RGB8 is padded to 4 bytes per pixel on the card"""
+    fmt = header["format_id"]
+    total = 0
+    for w, h in mip_dimensions(header["width"], header["height"], header["mips"]):
+        if fmt == FORMAT_RGB8:
+            total += w * h * 4
+        else:
+            total += level_size(fmt, w, h)
+    return total * header["faces"]
@@ -0,0 +1,191 @@
+# iwi_encoder.py
+"""
+Encodes images (PNG, TGA, anything Pillow reads) to .iwi textures.
+
+Mip chains are built either with a NumPy 2x2 box filter, each level from the
+previous one, or with Pillow's Lanczos filter, each level from the full-size
+image. Levels are block-compressed by dxt.py. Batches are spread across the
+shared worker pool, one image per task.
+
+Since the game only loads textures through materials, a material stub (an
+Asset Manager .gdt entry) can be written alongside the texture.
+"""
+
+from pathlib import Path
+import time
+from typing import List, Union
+
+import numpy as np
+from PIL import Image
+
+from dxt import encode_level
+from iwi import FORMATS, build_iwi, full_mip_count, mip_dimensions
+from worker_pool import parallel_map
+
+# Formats the encoder can write, by name; "auto" is DXT5 if the image has alpha, else DXT1
+ENCODABLE_FORMATS = {name: fmt for fmt, (name, _unit, _blocks) in FORMATS.items() if name != "DXT3"}
+FILTERS = ("box", "lanczos")
+
+
+def format_id(name: str, image: Image.Image = None) -> int:
+    """ENCODABLE_FORMATS entry for name (any case); "auto" picks DXT5/DXT1 from the image's alpha"""
+    name = name.upper()
+    if name == "AUTO":
+        if image is None:
+            raise ValueError("format 'auto' needs the image")
+        has_alpha = image.mode in ("RGBA", "LA", "PA") and image.getchannel("A").getextrema()[0] < 255
+        name = "DXT5" if has_alpha else "DXT1"
+    if name not in ENCODABLE_FORMATS:
+        raise ValueError(f"unsupported format '{name}' (choose from {', '.join(ENCODABLE_FORMATS)} or auto)")
+    return ENCODABLE_FORMATS[name]
+
+
+def _box_halve(level: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Averages 2x2 pixels (2x1 / 1x2 once a side reaches 1) down to width x height"""
+    h, w = level.shape[:2]
+    fy, fx = h // height, w // width
+    level = level[:height * fy, :width * fx]
+    return level.reshape(height, fy, width, fx, level.shape[2]).mean(axis=(1, 3))
+
+
+def build_mipmaps(image: Image.Image, mips: int = None, filter: str = "box") -> List[np.ndarray]:
+    """
+    (height, width, 4) uint8 RGBA levels, largest first. mips defaults to the
+    full chain down to 1x1.
+    """
+    if filter not in FILTERS:
+        raise ValueError(f"unknown filter '{filter}' (choose from {', '.join(FILTERS)})")
+    image = image.convert("RGBA")
+    width, height = image.size
+    sizes = mip_dimensions(width, height, mips or full_mip_count(width, height))
+
+    if filter == "lanczos":
+        return [np.asarray(image if i == 0 else image.resize(size, Image.LANCZOS))
+                for i, size in enumerate(sizes)]
+
+    levels = [np.asarray(image)]
+    current = levels[0].astype(np.float32)
+    for w, h in sizes[1:]:
+        current = _box_halve(current, w, h)
+        levels.append(np.rint(current).astype(np.uint8))
+    return levels
+
+
+def encode_image(image: Image.Image, fmt: Union[int, str] = "auto", mipmaps: bool = True,
+                 filter: str = "box") -> bytes:
+    """A complete .iwi file for the image"""
+    if isinstance(fmt, str):
+        fmt = format_id(fmt, image)
+    width, height = image.size
+    if width & (width - 1) or height & (height - 1):
+        print(f"[WARNING] {width}x{height} is not a power of two; the game may not mipmap it correctly")
+    levels = build_mipmaps(image, None if mipmaps else 1, filter)
+    return build_iwi(fmt, width, height, [encode_level(fmt, level) for level in levels])
+
+
+def encode_file(source: Union[Path, str], output: Union[Path, str], fmt: str = "auto",
+                mipmaps: bool = True, filter: str = "box") -> dict:
+    """
+    Encodes one image file to output (.iwi). Errors are reported, not raised,
+    so one bad file does not stop a batch.
+
+    Returns:
+        dict with:
+            source, output: str
+            format: str             # None on error
+            width, height, mips: int
+            bytes: int              # size of the written file
+            seconds: float
+            error: str              # None on success
+    """
+    start = time.perf_counter()
+    result = {"source": str(source), "output": str(output), "format": None,
+              "width": 0, "height": 0, "mips": 0, "bytes": 0, "seconds": 0.0, "error": None}
+    try:
+        with Image.open(source) as image:
+            image.load()
+            fmt_id = format_id(fmt, image)
+            data = encode_image(image, fmt_id, mipmaps, filter)
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_bytes(data)
+        result.update(format=FORMATS[fmt_id][0], width=image.width, height=image.height,
+                      mips=full_mip_count(image.width, image.height) if mipmaps else 1, bytes=len(data))
+    except (OSError, ValueError) as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def encode_files(sources: List[Union[Path, str]], output_dir: Union[Path, str], fmt: str = "auto",
+                 mipmaps: bool = True, filter: str = "box", jobs: int = None) -> List[dict]:
+    """
+    Encodes every image to output_dir/<stem>.iwi across the worker pool.
+    Returns encode_file() results in input order.
+    """
+    output_dir = Path(output_dir)
+    outputs = [output_dir / f"{Path(s).stem}.iwi" for s in sources]
+    n = len(sources)
+    results = parallel_map(encode_file, sources, outputs, [fmt] * n, [mipmaps] * n, [filter] * n, jobs=jobs)
+    failed = sum(1 for r in results if r["error"])
+    print(f"[Encoder] {n - failed} of {n} images encoded to {output_dir}" + (f", {failed} failed" if failed else ""))
+    return results
+
+
+def material_stub(material: str, color_map: str, material_type: str = "2d") -> str:
+    """Asset Manager .gdt text defining one material with a colour map"""
+    color_map = color_map.replace("/", "\\").replace("\\", "\\\\")
+    return (
+        "{\n"
+        f'\t"{material}" ( "material.gdf" )\n'
+        "\t{\n"
+        f'\t\t"materialType" "{material_type}"\n'
+        f'\t\t"colorMap" "{color_map}"\n'
+        "\t}\n"
+        "}\n"
+    )
+
+
+def write_material_stub(cod2_path: Union[Path, str], material: str, image_path: Union[Path, str],
+                        material_type: str = "2d", overwrite: bool = False) -> Path:
+    """
+    Writes source_data/<material>.gdt for the Asset Manager, pointing its colour
+    map at image_path (relative to the CoD2 folder when inside it). An existing
+    .gdt is kept unless overwrite is set. Returns the .gdt path.
+    """
+    cod2 = Path(cod2_path)
+    image_path = Path(image_path)
+    try:
+        color_map = str(image_path.resolve().relative_to(cod2.resolve()))
+    except ValueError:
+        color_map = str(image_path)
+
+    gdt_path = cod2 / "source_data" / f"{material}.gdt"
+    if gdt_path.exists() and not overwrite:
+        print(f"[Encoder] Keeping existing {gdt_path}")
+        return gdt_path
+    gdt_path.parent.mkdir(parents=True, exist_ok=True)
+    gdt_path.write_text(material_stub(material, color_map, material_type), encoding="utf-8")
+    print(f"[Encoder] Wrote material stub {gdt_path}")
+    return gdt_path
+
+
+def create_loadscreen(cod2_path: Union[Path, str], mapname: str, image_path: Union[Path, str],
+                      fmt: str = "auto", filter: str = "box") -> dict:
+    """
+    Encodes image_path to main/images/loadscreen_<map>.iwi and writes the
+    loadscreen_<map> material stub, matching the map's levelBriefing CSV line.
+    Loadscreens are drawn at screen size only, so no mipmaps are stored.
+
+    Returns:
+        encode_file() result plus material: str and gdt: str
+    """
+    cod2 = Path(cod2_path)
+    material = f"loadscreen_{mapname}"
+    result = encode_file(image_path, cod2 / "main" / "images" / f"{material}.iwi", fmt, mipmaps=False,
+                         filter=filter)
+    result["material"] = material
+    result["gdt"] = None
+    if not result["error"]:
+        result["gdt"] = str(write_material_stub(cod2, material, image_path))
+    return result
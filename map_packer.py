@@ -0,0 +1,235 @@
+# map_packer.py
+"""
+Headless core of the IWD packer: finds the custom files a map needs and packs them.
+
+Used by the IWD Packer tab and by the command line (cli.py); nothing here
+imports Tk. batch_pack_maps() packs many maps at once on the worker pool.
+"""
+
+from pathlib import Path
+import fnmatch
+import threading
+import time
+from typing import List
+
+from stock_index import get_stock_index
+from dep_cache import get_dependency_cache
+from vfs import get_game_fs
+from iwd_writer import pack_iwd, update_iwd, plan_iwd_members, read_manifest, content_digest, manifest_path
+from stock_dupes import classify_stock_files, local_crc32s
+from worker_pool import parallel_map
+from helpers import get_map_list
+from dep_graph import DependencyGraph
+
+
+class AnalysisCancelled(Exception):
+    pass
+
+
+def analyze_map(cod2_path: Path, mapname: str, jobs: int = None,
+                on_phase=None, on_file=None, cancel: threading.Event = None) -> dict:
+    """
+    Collects every custom (non-stock) file the map needs by building its
+    dependency graph (see dep_graph.py): assets referenced by the .map and its
+    prefabs, custom FX with their shaders and textures, the core map files,
+    the loadscreen, sounds from the soundaliases and scripts called from the
+    main .gsc. Byte-identical copies of stock files are dropped.
+
+    For live progress, on_phase(name) is called as each phase starts and
+    on_file(path) for every file as it is found (from the calling thread;
+    files later found to duplicate stock are dropped from the final result).
+    Setting `cancel` makes the analysis raise AnalysisCancelled at the next
+    checkpoint.
+
+    Returns:
+        dict with:
+            files: List[Path]           # existing files to pack, sorted
+            overrides: List[Path]       # files that replace a stock file with different content
+            duplicates: List[Path]      # dropped, identical to a stock file
+            skipped_missing: List[Path] # referenced but not on disk
+            assets: dict                # DependencyGraph.map_summary()
+            graph: DependencyGraph
+            seconds: float
+    """
+    start = time.perf_counter()
+    cod2_path = Path(cod2_path)
+    found = set()
+
+    def check_cancel():
+        if cancel is not None and cancel.is_set():
+            raise AnalysisCancelled()
+
+    def phase(name: str):
+        check_cancel()
+        if on_phase:
+            on_phase(name)
+
+    def node_resolved(node):
+        if node.packed and node.path not in found:
+            found.add(node.path)
+            if on_file:
+                on_file(node.path)
+
+    graph = DependencyGraph(cod2_path, mapname, jobs=jobs)
+    graph.build(on_phase=phase, on_node=node_resolved, check_cancel=check_cancel)
+
+    custom_files = set(graph.files())
+    skipped_missing = graph.missing_files()
+    for path in skipped_missing:
+        print(f"[IWD Packer] Skipped missing file: {path}")
+
+    # Drop byte-identical copies of stock files (size + CRC vs. the stock IWDs)
+    phase("Checking against stock IWDs")
+    stock_check = classify_stock_files(str(cod2_path), custom_files, jobs=jobs)
+    for dup in stock_check["duplicates"]:
+        custom_files.discard(dup)
+        print(f"[IWD Packer] Identical to stock, skipped: {dup}")
+    overrides = set(stock_check["overrides"])
+    for path in sorted(overrides):
+        print(f"[IWD Packer] Overrides a stock file: {path}")
+
+    return {
+        "files": sorted(custom_files),
+        "overrides": sorted(overrides),
+        "duplicates": stock_check["duplicates"],
+        "skipped_missing": skipped_missing,
+        "assets": graph.map_summary(),
+        "graph": graph,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def pack_is_current(files, output_path: Path, cod2_path: Path, jobs: int = None) -> bool:
+    """
+    True if output_path is a reproducible pack of exactly these files, judged
+    from its sidecar manifest and the inputs' (cached) CRCs without opening it.
+    """
+    output_path = Path(output_path)
+    manifest = read_manifest(output_path)
+    try:
+        if manifest is None or output_path.stat().st_size != manifest["size"]:
+            return False
+    except OSError:
+        return False
+    members = plan_iwd_members(files, Path(cod2_path))
+    crcs = local_crc32s(members.values(), jobs)
+    digest = content_digest(
+        (arcname, src.stat().st_size, crcs[src]) for arcname, src in members.items()
+    )
+    return digest == manifest.get("content_digest")
+
+
+def pack_files(files, output_path: Path, cod2_path: Path, update: bool = True, jobs: int = None,
+               reproducible: bool = False) -> dict:
+    """
+    Writes files into output_path, incrementally if update is set (see iwd_writer).
+    In reproducible mode an archive whose manifest already matches the inputs is
+    left alone; the report then only has files, bytes_out, sha256, manifest and seconds.
+    The report's "unchanged" key tells the two cases apart.
+    """
+    start = time.perf_counter()
+    files = list(files)
+    output_path = Path(output_path)
+    if reproducible and pack_is_current(files, output_path, cod2_path, jobs):
+        manifest = read_manifest(output_path)
+        return {
+            "unchanged": True,
+            "files": len(manifest["members"]),
+            "bytes_out": manifest["size"],
+            "sha256": manifest["sha256"],
+            "manifest": manifest_path(output_path),
+            "seconds": time.perf_counter() - start,
+        }
+    if update:
+        report = update_iwd(files, output_path, Path(cod2_path), jobs, reproducible)
+    else:
+        report = pack_iwd(files, output_path, Path(cod2_path), jobs, reproducible)
+    report["unchanged"] = False
+    return report
+
+
+def pack_map(cod2_path: Path, mapname: str, output_path: Path, update: bool = True, jobs: int = None,
+             reproducible: bool = False) -> dict:
+    """
+    analyze_map() followed by pack_files().
+
+    Returns:
+        dict with:
+            analysis: dict      # analyze_map() result
+            pack: dict          # pack_iwd()/update_iwd() report
+    """
+    analysis = analyze_map(cod2_path, mapname, jobs)
+    if not analysis["files"]:
+        raise ValueError(f"No custom or map files detected for {mapname}")
+    report = pack_files(analysis["files"], output_path, cod2_path, update, jobs, reproducible)
+    return {"analysis": analysis, "pack": report}
+
+
+def default_iwd_name(mapname: str) -> str:
+    return f"zz_custom_{mapname}.iwd"
+
+
+def _batch_pack_one(cod2_path: str, mapname: str, output_path: str, update: bool, reproducible: bool) -> dict:
+    """Worker: analyzes and packs one map serially (the parallelism is across maps)"""
+    result = {"map": mapname, "output": output_path, "files": 0, "bytes_out": 0, "unchanged": False,
+              "skipped": False, "analyze_seconds": 0.0, "pack_seconds": 0.0, "error": None}
+    try:
+        analysis = analyze_map(Path(cod2_path), mapname, jobs=1)
+        result["analyze_seconds"] = analysis["seconds"]
+        if not analysis["files"]:
+            result["skipped"] = True
+            return result
+        report = pack_files(analysis["files"], Path(output_path), Path(cod2_path), update, 1, reproducible)
+        result.update(files=report["files"], bytes_out=report["bytes_out"], unchanged=report["unchanged"],
+                      pack_seconds=report["seconds"])
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def batch_pack_maps(cod2_path: Path, output_dir: Path, patterns: List[str] = None,
+                    update: bool = True, jobs: int = None, reproducible: bool = False) -> dict:
+    """
+    Analyzes and packs every map from get_map_list() (optionally only those
+    matching one of the fnmatch patterns) into output_dir/zz_custom_<map>.iwd,
+    one map per worker process, even for only two or three maps. A failing map
+    does not stop the others; a map with nothing to pack is skipped, not failed.
+
+    The VFS index and the stock index are built here and saved under CACHE_DIR,
+    and the dependency cache database is created, so workers find them on disk
+    instead of each building its own.
+
+    Returns:
+        dict with:
+            maps: List[dict]    # per map: map, output, files, bytes_out, unchanged,
+                                # skipped (nothing to pack), analyze_seconds,
+                                # pack_seconds, error (None if ok)
+            skipped: int
+            failed: int
+            seconds: float      # wall time for the whole batch
+    """
+    start = time.perf_counter()
+    cod2_path = Path(cod2_path)
+    output_dir = Path(output_dir)
+    maps = get_map_list(str(cod2_path))
+    if patterns:
+        maps = [m for m in maps if any(fnmatch.fnmatch(m, p) for p in patterns)]
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    get_game_fs(cod2_path, revalidate=True)
+    get_stock_index(cod2_path=str(cod2_path))
+    get_dependency_cache()
+    outputs = [str(output_dir / default_iwd_name(m)) for m in maps]
+    n = len(maps)
+    results = parallel_map(_batch_pack_one, [str(cod2_path)] * n, maps, outputs, [update] * n,
+                           [reproducible] * n, jobs=jobs, min_items=1)
+
+    for r in results:
+        status = r["error"] or ("nothing to pack" if r["skipped"] else f"{r['files']} files")
+        print(f"[Batch] {r['map']}: {status} (analyze {r['analyze_seconds']:.1f}s, pack {r['pack_seconds']:.1f}s)")
+    return {
+        "maps": results,
+        "skipped": sum(1 for r in results if r["skipped"]),
+        "failed": sum(1 for r in results if r["error"]),
+        "seconds": time.perf_counter() - start,
+    }
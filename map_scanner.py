@@ -0,0 +1,115 @@
+# map_scanner.py
+"""
+Streaming tokenizer for Radiant .map / prefab files.
+
+The file is memory-mapped and walked once, window by window, as raw bytes, so
+a 200 MB map is never decoded or split into a list of lines. Each window is
+swept by two compiled bytes regexes while it is hot in the page cache:
+
+  * a line-start tokenizer for entity braces, "key" "value" pairs and
+    curve/mesh/patchDef2 materials
+  * the brush-face material pattern
+
+Both patterns begin with a literal byte, which lets the regex engine skip
+ahead with a fast search instead of trying every position.
+"""
+
+from pathlib import Path
+import mmap
+import re
+from typing import Dict, List
+
+# Line-start tokens: brace lines, keyvalue lines and patch materials.
+_LINE_RE = re.compile(
+    rb'\n[ \t]*(?:'
+    rb'([{}])[ \t]*\r?(?=\n|\Z)'
+    rb'|"([^"\r\n]+)"[ \t]*"([^"\r\n]*)"'
+    rb'|(?:curve|mesh|patchDef2)\s*\{\s*([a-z0-9_/]+)'
+    rb')'
+)
+
+# Brush-face materials
+_BRUSH_RE = re.compile(rb'\)\s*\)\s*\)\s*([a-z0-9_/]+)')
+
+# Windows are cut just before a "}" line; neither pattern can match across one.
+_WINDOW_SIZE = 16 * 1024 * 1024
+
+
+def _empty_result() -> dict:
+    return {"entities": [], "brush_materials": set(), "patch_materials": set()}
+
+
+def _scan_buffer(buf) -> dict:
+    entities: List[Dict[str, str]] = []
+    brush_materials = set()
+    patch_materials = set()
+    current = None
+    depth = 0
+
+    def consume(tokens):
+        nonlocal current, depth
+        for brace, key, value, patch in tokens:
+            if brace == b"{":
+                depth += 1
+                if depth == 1:
+                    current = {}
+            elif brace == b"}":
+                if depth == 1 and current is not None:
+                    entities.append(current)
+                    current = None
+                depth = max(depth - 1, 0)
+            elif key:
+                # Keyvalues belong to the entity itself, never to its brushes
+                if depth == 1 and current is not None:
+                    current[key.decode("latin1")] = value.decode("latin1")
+            elif patch:
+                # The token swallowed the patch's "{"; its "}" is still matched on its own
+                depth += 1
+                patch_materials.add(patch)
+
+    # Every line token starts with "\n", so the first line is matched on its own
+    size = len(buf)
+    first_nl = buf.find(b"\n")
+    first_line = buf[:first_nl if first_nl != -1 else size]
+    consume(_LINE_RE.findall(b"\n" + first_line))
+
+    pos = 0
+    while pos < size:
+        end = buf.find(b"\n}", pos + _WINDOW_SIZE)
+        if end == -1:
+            end = size
+        consume(_LINE_RE.findall(buf, pos, end))
+        brush_materials.update(_BRUSH_RE.findall(buf, pos, end))
+        pos = end
+
+    return {
+        "entities": entities,
+        "brush_materials": {b.decode("latin1") for b in brush_materials},
+        "patch_materials": {p.decode("latin1") for p in patch_materials},
+    }
+
+
+def scan_map_file(file_path: Path) -> dict:
+    """
+    Scans a .map/prefab file in a single streaming pass.
+
+    Returns:
+        dict with:
+            entities: list[dict[str, str]]   # keyvalues of every top-level entity
+            brush_materials: set[str]        # materials on brush faces
+            patch_materials: set[str]        # materials on curves/meshes/patches
+    """
+    file_path = Path(file_path)
+    if not file_path.is_file():
+        return _empty_result()
+
+    with open(file_path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return _empty_result()
+        try:
+            return _scan_buffer(mm)
+        finally:
+            mm.close()
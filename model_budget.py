@@ -0,0 +1,173 @@
+# model_budget.py
+"""
+Polygon budget of a map's models.
+
+Every misc_model in the .map and its prefabs is counted (a prefab placed N
+times counts its models N times) from the per-file references cached for the
+map analysis, and joined with the vertex and triangle counts of the model's
+LODs, read from its xmodelsurfs files. Geometry stats are cached per surfs
+file, like the other parse results.
+"""
+
+from collections import Counter
+from pathlib import Path
+import time
+from typing import Dict, List, Optional
+
+from dep_cache import get_dependency_cache
+from helpers import collect_map_references, get_xmodel_dependencies_bulk
+from stock_index import get_stock_index
+from vfs import get_game_fs
+from worker_pool import parallel_map
+from xmodel_surfs import read_xmodelsurfs, surfs_stats, XModelSurfsFormatError
+
+
+def get_xmodelsurfs_stats(cod2_path: str, surf_name: str) -> dict:
+    """
+    Vertex/triangle totals of xmodelsurfs/<surf_name> (loose or inside an IWD).
+
+    Returns:
+        dict with surfaces, verts, tris, degenerate_tris (see xmodel_surfs.surfs_stats),
+        or {"error": str} if the file is missing or unreadable
+    """
+    entry = get_game_fs(cod2_path).resolve(f"xmodelsurfs/{surf_name}")
+    if entry is None:
+        return {"error": "missing"}
+
+    cache = get_dependency_cache()
+    cached = cache.get("xmodelsurfs", entry.cache_key, entry.stamp)
+    if cached is not None:
+        return cached
+
+    try:
+        stats = surfs_stats(read_xmodelsurfs(entry.read_bytes()))
+    except XModelSurfsFormatError as e:
+        stats = {"error": str(e)}
+    cache.put("xmodelsurfs", entry.cache_key, stats, entry.stamp)
+    return stats
+
+
+def _surfs_stats_bulk(cod2_path: str, surf_names: List[str], jobs: int = None) -> Dict[str, dict]:
+    cache = get_dependency_cache()
+    fs = get_game_fs(cod2_path)
+    results: Dict[str, dict] = {}
+    to_parse: List[str] = []
+    for name in surf_names:
+        entry = fs.resolve(f"xmodelsurfs/{name}")
+        cached = cache.get("xmodelsurfs", entry.cache_key, entry.stamp) if entry else {"error": "missing"}
+        if cached is None:
+            to_parse.append(name)
+        else:
+            results[name] = cached
+
+    parsed = parallel_map(get_xmodelsurfs_stats, [cod2_path] * len(to_parse), to_parse, jobs=jobs)
+    results.update(zip(to_parse, parsed))
+    return results
+
+
+def count_model_instances(cod2_path: str, mapname: str, jobs: int = None) -> Dict[str, int]:
+    """
+    Placed instances of every xmodel in the map, prefabs expanded.
+    The files are walked by helpers.collect_map_references().
+    """
+    cod2 = Path(cod2_path)
+    main_map = cod2 / "map_source" / f"{mapname}.map"
+    prefab_dir = cod2 / "map_source" / "prefabs"
+    if not main_map.is_file():
+        raise FileNotFoundError(f"Main map not found: {main_map}")
+
+    refs_by_key = collect_map_references(main_map, prefab_dir, jobs)
+    totals: Dict[str, Counter] = {}
+
+    def expand(key: str) -> Counter:
+        if key in totals:
+            return totals[key]
+        totals[key] = Counter()     # a prefab that contains itself adds nothing
+        result = Counter(refs_by_key[key]["xmodel_counts"])
+        for raw in refs_by_key[key]["prefabs"]:
+            sub = str((prefab_dir / raw.removeprefix("prefabs/")).resolve())
+            if sub in refs_by_key:
+                result.update(expand(sub))
+        totals[key] = result
+        return result
+
+    return dict(expand(str(main_map.resolve())))
+
+
+def map_model_budget(cod2_path: str, mapname: str, jobs: int = None, top: int = 20) -> dict:
+    """
+    Per-model and total polygon budget of the map. Budgets use LOD 0, the
+    detail level drawn up close.
+
+    Returns:
+        dict with:
+            models: List[dict]      # sorted by total_tris, descending; each with:
+                                    #   name, instances, stock, exact (header parsed),
+                                    #   lods: [{name, distance, verts, tris}] (counts None if unreadable),
+                                    #   verts, tris, degenerate_tris (LOD 0, None if unreadable),
+                                    #   total_verts, total_tris (instances x LOD 0)
+            top: List[dict]         # the first `top` models
+            instances: int
+            unique_models: int
+            total_verts: int
+            total_tris: int
+            unreadable: List[str]   # models whose LOD 0 geometry could not be read
+            seconds: float
+    """
+    start = time.perf_counter()
+    cod2_path = str(cod2_path)
+    instances = count_model_instances(cod2_path, mapname, jobs)
+    names = sorted(instances)
+    deps = get_xmodel_dependencies_bulk(cod2_path, names, jobs=jobs)
+    surf_names = sorted({s for d in deps.values() for s in d["surfs"]})
+    stats = _surfs_stats_bulk(cod2_path, surf_names, jobs)
+    stock = get_stock_index(cod2_path=cod2_path)
+
+    models = []
+    unreadable = []
+    for name in names:
+        dep = deps[name]
+        lod_info = dep.get("lods") or [{"name": s, "distance": None} for s in dep["surfs"][:1]]
+        lods = []
+        for lod in lod_info:
+            st = stats.get(lod["name"], {"error": "missing"})
+            lods.append({
+                "name": lod["name"],
+                "distance": lod["distance"],
+                "verts": st.get("verts"),
+                "tris": st.get("tris"),
+            })
+        lod0: Optional[dict] = stats.get(lods[0]["name"]) if lods else None
+        if lod0 is None or "error" in lod0:
+            unreadable.append(name)
+            lod0 = {}
+
+        count = instances[name]
+        tris = lod0.get("tris")
+        verts = lod0.get("verts")
+        models.append({
+            "name": name,
+            "instances": count,
+            "stock": stock.has_xmodel(name),
+            "exact": dep.get("exact", False),
+            "lods": lods,
+            "verts": verts,
+            "tris": tris,
+            "degenerate_tris": lod0.get("degenerate_tris"),
+            "total_verts": count * verts if verts is not None else 0,
+            "total_tris": count * tris if tris is not None else 0,
+        })
+
+    models.sort(key=lambda m: (-m["total_tris"], m["name"]))
+    print(f"[Budget] {mapname}: {sum(instances.values())} instances of {len(names)} models, "
+          f"{sum(m['total_tris'] for m in models)} tris ({len(unreadable)} unreadable)")
+    return {
+        "models": models,
+        "top": models[:top],
+        "instances": sum(instances.values()),
+        "unique_models": len(names),
+        "total_verts": sum(m["total_verts"] for m in models),
+        "total_tris": sum(m["total_tris"] for m in models),
+        "unreadable": unreadable,
+        "seconds": time.perf_counter() - start,
+    }
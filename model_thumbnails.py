@@ -0,0 +1,172 @@
+# model_thumbnails.py
+"""
+Renders xmodel preview images for the Model Viewer.
+
+Every model (stock ones inside the IWDs and custom ones in raw/ and main/)
+is drawn by xmodel_render.py and saved as <name>.png twice: FULL_SIZE into
+xmodel/ and THUMB_SIZE into thumbnails/, the folders the viewer reads.
+Models are rendered across the worker pool, in chunks so progress can be
+reported, and a model is skipped while its images are newer than its file.
+A pass over every model that is not cancelled leaves COMPLETE_MARKER in the
+thumbnails folder.
+"""
+
+from pathlib import Path
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+from PIL import Image
+
+from vfs import get_game_fs
+from worker_pool import parallel_map
+from xmodel_render import load_xmodel_mesh, render_mesh
+
+APP_DIR = Path(__file__).parent
+THUMB_DIR = APP_DIR / "thumbnails"
+FULL_DIR = APP_DIR / "xmodel"
+THUMB_SIZE = 256
+FULL_SIZE = 768
+# Models per parallel_map call; progress is reported between chunks
+CHUNK_MODELS = 32
+# Written to thumb_dir when render_thumbnails() finishes a pass over every model
+COMPLETE_MARKER = ".complete"
+
+
+def list_xmodels(cod2_path) -> List[str]:
+    """Names of every xmodel in raw/, main/ and the IWDs, sorted case-insensitively"""
+    cod2 = Path(cod2_path)
+    names = {}
+    for path in get_game_fs(cod2).archived_paths("xmodel/"):
+        name = path.split("/", 1)[1]
+        if name and "/" not in name:
+            names.setdefault(name.lower(), name)
+    for base in ("raw", "main"):
+        folder = cod2 / base / "xmodel"
+        if folder.is_dir():
+            for path in folder.iterdir():
+                if path.is_file():
+                    names[path.name.lower()] = path.name
+    return sorted(names.values(), key=str.lower)
+
+
+def images_complete(thumb_dir: Path = THUMB_DIR) -> bool:
+    """True once render_thumbnails() has gone through every model without being cancelled"""
+    return (Path(thumb_dir) / COMPLETE_MARKER).is_file()
+
+
+def _is_current(entry, *images: Path) -> bool:
+    """True if every image exists and is newer than the model's file (or its IWD)"""
+    try:
+        model_mtime = os.path.getmtime(entry.source)
+        return all(os.path.getmtime(p) >= model_mtime for p in images)
+    except OSError:
+        return False
+
+
+def render_model_thumbnail(cod2_path: str, name: str, thumb_dir: str = str(THUMB_DIR),
+                           full_dir: str = str(FULL_DIR), overwrite: bool = False) -> dict:
+    """
+    Renders one model to full_dir/<name>.png and thumb_dir/<name>.png.
+    Errors are reported, not raised, so one bad model does not stop a batch.
+
+    Returns:
+        dict with:
+            name: str
+            skipped: bool           # images already up to date
+            tris: int               # triangles drawn
+            seconds: float
+            error: str              # None on success
+            warning: str            # e.g. why the skeleton was ignored, or None
+    """
+    start = time.perf_counter()
+    result = {"name": name, "skipped": False, "tris": 0, "seconds": 0.0, "error": None, "warning": None}
+    full_path = Path(full_dir) / f"{name}.png"
+    thumb_path = Path(thumb_dir) / f"{name}.png"
+    entry = get_game_fs(cod2_path).resolve(f"xmodel/{name}")
+    if entry is None:
+        result["error"] = "missing"
+        return result
+    if not overwrite and _is_current(entry, full_path, thumb_path):
+        result["skipped"] = True
+        return result
+
+    try:
+        vertices, triangles, skeleton_error = load_xmodel_mesh(cod2_path, name)
+        if skeleton_error:
+            result["warning"] = f"skeleton ignored ({skeleton_error})"
+        image = render_mesh(vertices, triangles, FULL_SIZE)
+        thumb = image.resize((THUMB_SIZE, THUMB_SIZE), Image.LANCZOS)
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        thumb_path.parent.mkdir(parents=True, exist_ok=True)
+        image.save(full_path, "PNG")
+        thumb.save(thumb_path, "PNG")
+        result["tris"] = len(triangles)
+    except (OSError, ValueError) as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def render_thumbnails(cod2_path, names: List[str] = None, thumb_dir: Path = THUMB_DIR,
+                      full_dir: Path = FULL_DIR, overwrite: bool = False, jobs: int = None,
+                      on_total: Optional[Callable[[int], None]] = None,
+                      on_model: Optional[Callable[[dict], None]] = None,
+                      cancel: Optional[threading.Event] = None) -> dict:
+    """
+    Renders previews of `names` (default: every model, see list_xmodels).
+    on_total is called once with the number of models to go through, and
+    on_model with each render_model_thumbnail() result as chunks finish;
+    setting `cancel` stops after the current chunk. A finished pass over
+    every model writes COMPLETE_MARKER (see images_complete).
+
+    Returns:
+        dict with:
+            rendered: List[str]
+            skipped: List[str]      # already up to date
+            failed: Dict[str, str]  # name -> error
+            warnings: Dict[str, str]    # name -> warning, for models drawn anyway
+            cancelled: bool
+            seconds: float
+    """
+    start = time.perf_counter()
+    cod2_path = str(cod2_path)
+    every_model = names is None
+    if every_model:
+        names = list_xmodels(cod2_path)
+    if on_total:
+        on_total(len(names))
+
+    rendered, skipped, failed, warnings = [], [], {}, {}
+    cancelled = False
+    for i in range(0, len(names), CHUNK_MODELS):
+        if cancel is not None and cancel.is_set():
+            cancelled = True
+            break
+        chunk = names[i:i + CHUNK_MODELS]
+        n = len(chunk)
+        for result in parallel_map(render_model_thumbnail, [cod2_path] * n, chunk, [str(thumb_dir)] * n,
+                                   [str(full_dir)] * n, [overwrite] * n, jobs=jobs):
+            if result["error"]:
+                failed[result["name"]] = result["error"]
+            elif result["skipped"]:
+                skipped.append(result["name"])
+            else:
+                rendered.append(result["name"])
+            if result["warning"]:
+                warnings[result["name"]] = result["warning"]
+            if on_model:
+                on_model(result)
+
+    if every_model and not cancelled:
+        Path(thumb_dir).mkdir(parents=True, exist_ok=True)
+        (Path(thumb_dir) / COMPLETE_MARKER).write_text(f"{len(names)}\n")
+    return {
+        "rendered": rendered,
+        "skipped": skipped,
+        "failed": failed,
+        "warnings": warnings,
+        "cancelled": cancelled,
+        "seconds": time.perf_counter() - start,
+    }
@@ -0,0 +1,73 @@
+# stock_dupes.py
+"""
+Finds pack candidates that are already shipped in the stock IWDs.
+
+A candidate is compared with the stock member at the same game path using
+only the size and CRC32 recorded in the IWD central directory, so nothing is
+decompressed. Local CRCs are computed on the worker pool and cached by
+size/mtime in the dependency cache.
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from dep_cache import get_dependency_cache
+from iwd_writer import file_crc32, iwd_archive_name
+from vfs import get_game_fs
+from worker_pool import parallel_map
+
+
+def local_crc32s(paths: Iterable[Path], jobs: int = None) -> Dict[Path, int]:
+    """CRC32 of each file, from the cache where the file is unchanged"""
+    cache = get_dependency_cache()
+    crcs: Dict[Path, int] = {}
+    to_hash: List[Path] = []
+    for path in paths:
+        cached = cache.get("crc", path)
+        if cached is None:
+            to_hash.append(path)
+        else:
+            crcs[path] = cached
+
+    for path, crc in zip(to_hash, parallel_map(file_crc32, to_hash, jobs=jobs)):
+        cache.put("crc", path, crc)
+        crcs[path] = crc
+    return crcs
+
+
+def classify_stock_files(cod2_path: str, files: Iterable[Path], jobs: int = None) -> dict:
+    """
+    Splits candidate files by how they relate to the stock IWDs.
+
+    Returns:
+        dict with:
+            custom: List[Path]       # no stock file at the same game path
+            duplicates: List[Path]   # byte-identical to the stock file (size + CRC32)
+            overrides: List[Path]    # same game path as a stock file, different content
+    """
+    fs = get_game_fs(cod2_path)
+    custom: List[Path] = []
+    same_size: Dict[Path, int] = {}
+    overrides: List[Path] = []
+
+    for path in sorted(Path(f) for f in files):
+        stock = fs.resolve_archived(iwd_archive_name(path, cod2_path))
+        if stock is None:
+            custom.append(path)
+        elif path.stat().st_size != stock.size:
+            overrides.append(path)
+        else:
+            same_size[path] = stock.crc
+
+    duplicates: List[Path] = []
+    for path, crc in local_crc32s(same_size, jobs).items():
+        if crc == same_size[path]:
+            duplicates.append(path)
+        else:
+            overrides.append(path)
+
+    return {
+        "custom": custom,
+        "duplicates": sorted(duplicates),
+        "overrides": sorted(overrides),
+    }
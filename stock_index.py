@@ -0,0 +1,165 @@
+# stock_index.py
+"""
+Stock asset index built from lists/xmodel_list.json, materials.json and fx_files.json.
+
+The JSON lists are parsed once, normalized to lower case and frozen into sets.
+The result is also written as a marshal blob under CACHE_DIR, so later runs
+load it directly instead of parsing JSON. The blob is rebuilt whenever one of
+the source lists changes. Once loaded, an index stays in memory for the life
+of the process (or until its lists are regenerated).
+
+Given a cod2_path, get_stock_index() also merges in the lists generated from
+that install's IWDs (see stock_lists.py).
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import marshal
+import os
+import sys
+import threading
+
+from config import CACHE_DIR
+from stock_lists import build_stock_lists
+
+LISTS_DIR = Path(__file__).parent / "lists"
+DEFAULT_XMODEL_JSON = LISTS_DIR / "xmodel_list.json"
+DEFAULT_MATERIAL_JSON = LISTS_DIR / "materials.json"
+DEFAULT_FX_JSON = LISTS_DIR / "fx_files.json"
+
+_BLOB_FORMAT = 1
+
+
+def normalize_fx_path(path: str) -> str:
+    """'fx/Fire/Torch.EFX' -> 'fire/torch'"""
+    clean = str(path).strip().replace("\\", "/").removeprefix("fx/").strip().lower()
+    return clean.removesuffix(".efx")
+
+
+class StockIndex:
+    """Frozen, case-insensitive sets of stock xmodels, materials and fx"""
+
+    def __init__(self, xmodels: frozenset, materials: frozenset, fx: frozenset):
+        self.xmodels = xmodels
+        self.materials = materials
+        self.fx = fx
+
+    def has_xmodel(self, name: str) -> bool:
+        return name.lower() in self.xmodels
+
+    def has_material(self, name: str) -> bool:
+        return name.lower() in self.materials
+
+    def has_fx(self, path: str) -> bool:
+        return normalize_fx_path(path) in self.fx
+
+
+def _load_json_list(json_path: Path, key: str) -> list:
+    if not json_path.is_file():
+        return []
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return [str(item[key]) for item in data if isinstance(item, dict) and key in item]
+    except Exception as e:
+        print(f"[WARNING] Failed to load {json_path}: {e}")
+        return []
+
+
+def _source_stamp(paths) -> tuple:
+    stamp = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            stamp.append((str(p), st.st_size, st.st_mtime_ns))
+        except OSError:
+            stamp.append((str(p), -1, -1))
+    return tuple(stamp)
+
+
+def _blob_path(sources) -> Path:
+    digest = hashlib.sha1("|".join(str(p) for p in sources).encode("utf-8")).hexdigest()[:12]
+    return CACHE_DIR / f"stock_index_{digest}.marshal"
+
+
+def _build_index(xmodel_json: Path, material_json: Path, fx_json: Path) -> StockIndex:
+    return StockIndex(
+        frozenset(n.lower() for n in _load_json_list(xmodel_json, "name")),
+        frozenset(n.lower() for n in _load_json_list(material_json, "name")),
+        frozenset(normalize_fx_path(p) for p in _load_json_list(fx_json, "path")),
+    )
+
+
+def _load_or_build(xmodel_json: Path, material_json: Path, fx_json: Path) -> StockIndex:
+    sources = (xmodel_json, material_json, fx_json)
+    stamp = _source_stamp(sources)
+    header = (_BLOB_FORMAT, sys.version_info[:2], stamp)
+    blob_path = _blob_path(sources)
+
+    try:
+        with open(blob_path, "rb") as f:
+            blob = marshal.load(f)
+        if blob[0] == header:
+            return StockIndex(*blob[1:])
+    except (OSError, EOFError, ValueError, TypeError, IndexError):
+        pass
+
+    index = _build_index(*sources)
+    try:
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = blob_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            marshal.dump((header, index.xmodels, index.materials, index.fx), f)
+        os.replace(tmp_path, blob_path)
+    except OSError as e:
+        print(f"[WARNING] Could not write stock index cache: {e}")
+    return index
+
+
+_indexes = {}
+_merged = {}
+_lock = threading.Lock()
+
+
+def _get_index(xmodel_json: Path, material_json: Path, fx_json: Path, reload: bool = False) -> StockIndex:
+    key = (str(xmodel_json), str(material_json), str(fx_json))
+    with _lock:
+        index = _indexes.get(key)
+        if index is None or reload:
+            index = _load_or_build(Path(xmodel_json), Path(material_json), Path(fx_json))
+            _indexes[key] = index
+        return index
+
+
+def get_stock_index(
+    xmodel_json: Path = DEFAULT_XMODEL_JSON,
+    material_json: Path = DEFAULT_MATERIAL_JSON,
+    fx_json: Path = DEFAULT_FX_JSON,
+    cod2_path: str = None
+) -> StockIndex:
+    """
+    Returns the stock index for these lists, loading it on first use.
+    With cod2_path, the lists generated from that install's IWDs are merged in
+    (and regenerated first if the IWDs changed).
+    """
+    index = _get_index(xmodel_json, material_json, fx_json)
+    if cod2_path is None:
+        return index
+
+    lists = build_stock_lists(cod2_path)
+    installed = _get_index(lists["xmodel_json"], lists["material_json"], lists["fx_json"],
+                           reload=lists["rebuilt"])
+    key = (str(xmodel_json), str(material_json), str(fx_json), str(lists["xmodel_json"]))
+    with _lock:
+        cached = _merged.get(key)
+        # Re-merge whenever either side was reloaded
+        if cached is None or cached[0] is not index or cached[1] is not installed:
+            merged = StockIndex(
+                index.xmodels | installed.xmodels,
+                index.materials | installed.materials,
+                index.fx | installed.fx,
+            )
+            cached = (index, installed, merged)
+            _merged[key] = cached
+        return cached[2]
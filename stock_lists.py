@@ -0,0 +1,130 @@
+# stock_lists.py
+"""
+Regenerates the stock asset lists (xmodel_list.json, materials.json,
+fx_files.json) from the installed iw_*.iwd files.
+
+Names come straight from the IWD central directories via the VFS index, so no
+archive is decompressed. The lists are written per install under
+CACHE_DIR/lists together with a fingerprint of the IWD set (names, sizes and
+mtimes) and are only rebuilt when that fingerprint changes. The lists shipped
+in lists/ are kept as a fallback; get_stock_index() merges both.
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict
+
+from config import CACHE_DIR
+from vfs import get_game_fs
+
+GENERATED_LISTS_DIR = CACHE_DIR / "lists"
+FINGERPRINT_FILE = "fingerprint.json"
+
+# list file -> (archive prefix, JSON key). "path" entries keep sub-folders and the .efx extension
+LIST_SPECS = {
+    "xmodel_list.json": ("xmodel/", "name"),
+    "materials.json": ("materials/", "name"),
+    "fx_files.json": ("fx/", "path"),
+}
+
+
+def generated_lists_dir(cod2_path) -> Path:
+    """Output folder for this install's generated lists"""
+    digest = hashlib.sha1(os.path.abspath(cod2_path).encode("utf-8")).hexdigest()[:12]
+    return GENERATED_LISTS_DIR / digest
+
+
+def iwd_fingerprint(cod2_path) -> str:
+    """Hash of the installed IWD set (paths, sizes, mtimes)"""
+    stamp = get_game_fs(cod2_path).archive_stamp
+    return hashlib.sha1(repr(stamp).encode("utf-8")).hexdigest()
+
+
+def _list_entries(fs, prefix: str, key: str) -> list:
+    entries = []
+    seen = set()
+    for game_path in fs.archived_paths(prefix):
+        rel = game_path[len(prefix):]
+        if not rel or rel.endswith("/"):
+            continue
+        if key == "path":
+            if not rel.lower().endswith(".efx"):
+                continue
+        elif "/" in rel:
+            continue
+        if rel.lower() not in seen:
+            seen.add(rel.lower())
+            entries.append({key: rel})
+    return entries
+
+
+def _read_fingerprint(out_dir: Path):
+    try:
+        with open(out_dir / FINGERPRINT_FILE, "r", encoding="utf-8") as f:
+            return json.load(f).get("fingerprint")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _write_json(path: Path, data):
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+_known_fingerprints: Dict[str, str] = {}
+_lock = threading.Lock()
+
+
+def build_stock_lists(cod2_path, force: bool = False) -> dict:
+    """
+    Writes the three stock lists for this install unless they already match its IWDs.
+
+    Returns:
+        dict with:
+            rebuilt: bool
+            fingerprint: str
+            seconds: float
+            xmodel_json, material_json, fx_json: Path
+            counts: Dict[str, int]      # entries per list (only when rebuilt)
+    """
+    start = time.perf_counter()
+    out_dir = generated_lists_dir(cod2_path)
+    fingerprint = iwd_fingerprint(cod2_path)
+    result = {
+        "rebuilt": False,
+        "fingerprint": fingerprint,
+        "xmodel_json": out_dir / "xmodel_list.json",
+        "material_json": out_dir / "materials.json",
+        "fx_json": out_dir / "fx_files.json",
+        "counts": {},
+    }
+
+    with _lock:
+        up_to_date = not force and (
+            _known_fingerprints.get(str(out_dir)) == fingerprint
+            or _read_fingerprint(out_dir) == fingerprint
+        )
+        if not up_to_date:
+            fs = get_game_fs(cod2_path)
+            out_dir.mkdir(parents=True, exist_ok=True)
+            for filename, (prefix, key) in LIST_SPECS.items():
+                entries = _list_entries(fs, prefix, key)
+                _write_json(out_dir / filename, entries)
+                result["counts"][filename] = len(entries)
+            # Written last, so an interrupted build is redone next time
+            _write_json(out_dir / FINGERPRINT_FILE, {
+                "fingerprint": fingerprint,
+                "archives": [Path(a).name for a in fs.archives],
+            })
+            result["rebuilt"] = True
+            print(f"[Stock lists] Rebuilt from {len(fs.archives)} IWDs: {result['counts']}")
+        _known_fingerprints[str(out_dir)] = fingerprint
+
+    result["seconds"] = time.perf_counter() - start
+    return result
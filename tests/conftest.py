@@ -0,0 +1,33 @@
+# conftest.py
+"""Points every on-disk cache at the test's own temporary folder"""
+
+from collections import OrderedDict
+from pathlib import Path
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import dep_cache
+import stock_index
+import stock_lists
+import texture_preview
+import vfs
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    cache = dep_cache.DependencyCache(cache_dir / "dependencies.sqlite")
+    monkeypatch.setattr(dep_cache, "_shared_cache", cache)
+    monkeypatch.setattr(dep_cache, "_shared_pid", os.getpid())
+    monkeypatch.setattr(vfs, "CACHE_DIR", cache_dir)
+    monkeypatch.setattr(vfs, "_filesystems", {})
+    monkeypatch.setattr(stock_index, "CACHE_DIR", cache_dir)
+    monkeypatch.setattr(stock_lists, "GENERATED_LISTS_DIR", cache_dir / "lists")
+    monkeypatch.setattr(texture_preview, "PREVIEW_CACHE_DIR", cache_dir / "previews")
+    monkeypatch.setattr(texture_preview, "_memory_cache", OrderedDict())
+    yield cache_dir
+    cache.close()
@@ -0,0 +1,88 @@
+# test_dxt.py
+"""Block decoding of dxt.decode_level() and cached previews (texture_preview)"""
+
+from pathlib import Path
+import struct
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import texture_preview
+from dxt import decode_level
+from iwi import FORMAT_ARGB8, FORMAT_DXT1, FORMAT_DXT3, FORMAT_DXT5, FORMAT_RGB8
+from texture_preview import get_iwi_preview
+
+RED_565, BLUE_565 = 0xF800, 0x001F
+
+
+def color_block(c0: int, c1: int, indices) -> bytes:
+    bits = sum(index << (2 * i) for i, index in enumerate(indices))
+    return struct.pack("<HHI", c0, c1, bits)
+
+
+def test_dxt1_four_and_three_colour_blocks():
+    four = decode_level(FORMAT_DXT1, color_block(RED_565, BLUE_565, [i % 4 for i in range(16)]), 4, 4)
+    assert four.shape == (4, 4, 4)
+    assert four[0].tolist() == [[255, 0, 0, 255], [0, 0, 255, 255], [170, 0, 85, 255], [85, 0, 170, 255]]
+
+    # c0 <= c1: index 2 is the midpoint and index 3 is transparent black
+    three = decode_level(FORMAT_DXT1, color_block(BLUE_565, RED_565, [i % 4 for i in range(16)]), 4, 4)
+    assert three[0, 2].tolist() == [127, 0, 127, 255]
+    assert three[0, 3].tolist() == [0, 0, 0, 0]
+
+
+def test_dxt3_and_dxt5_alpha():
+    colour = color_block(RED_565, BLUE_565, [0] * 16)
+    explicit = sum(i << (4 * i) for i in range(16)).to_bytes(8, "little")
+    dxt3 = decode_level(FORMAT_DXT3, explicit + colour, 4, 4)
+    assert dxt3[:, :, 3].ravel().tolist() == [i * 17 for i in range(16)]
+    assert dxt3[0, 0, :3].tolist() == [255, 0, 0]
+
+    indices = sum((i % 8) << (3 * i) for i in range(16)).to_bytes(6, "little")
+    eight = decode_level(FORMAT_DXT5, bytes([255, 0]) + indices + colour, 4, 4)
+    assert eight[0, :, 3].tolist() + eight[1, :, 3].tolist() == [255, 0, 218, 182, 145, 109, 72, 36]
+
+    six = decode_level(FORMAT_DXT5, bytes([0, 255]) + indices + colour, 4, 4)
+    assert six[0, :, 3].tolist() + six[1, :, 3].tolist() == [0, 255, 51, 102, 153, 204, 0, 255]
+
+
+def test_partial_blocks_are_cropped():
+    blocks = color_block(RED_565, RED_565, [0] * 16) + color_block(BLUE_565, BLUE_565, [0] * 16)
+    image = decode_level(FORMAT_DXT1, blocks, 6, 2)
+    assert image.shape == (2, 6, 4)
+    assert image[1, 3].tolist() == [255, 0, 0, 255]
+    assert image[1, 4].tolist() == [0, 0, 255, 255]
+
+    with pytest.raises(ValueError, match="block data"):
+        decode_level(FORMAT_DXT1, blocks, 12, 4)
+
+
+def test_uncompressed_formats_are_stored_bgr():
+    assert decode_level(FORMAT_RGB8, bytes([1, 2, 3]), 1, 1).tolist() == [[[3, 2, 1, 255]]]
+    assert decode_level(FORMAT_ARGB8, bytes([1, 2, 3, 4]), 1, 1).tolist() == [[[3, 2, 1, 4]]]
+
+
+def test_preview_decodes_one_mip_and_caches_it(tmp_path, monkeypatch):
+    # DXT1 64x32 with 7 levels, stored smallest first; the 16x8 level is blue, the others red
+    dims = [(64 >> i or 1, 32 >> i or 1) for i in range(7)]
+    levels = []
+    for i, (w, h) in enumerate(dims):
+        colour = BLUE_565 if i == 2 else RED_565
+        levels.append(color_block(colour, colour, [0] * 16) * (max(1, w // 4) * max(1, h // 4)))
+    data = b"".join(reversed(levels))
+    path = tmp_path / "wall_c.iwi"
+    path.write_bytes(struct.pack("<3sBBBHHH4I", b"IWi", 5, FORMAT_DXT1, 0, 64, 32, 1, 28 + len(data), 0, 0, 0) + data)
+
+    image = get_iwi_preview(path, 16)
+
+    assert image.size == (16, 8)
+    assert np.asarray(image)[4, 8].tolist() == [0, 0, 255, 255]
+    assert len(list(texture_preview.PREVIEW_CACHE_DIR.glob("*.png"))) == 1
+
+    monkeypatch.setattr(texture_preview, "decode_iwi_preview", lambda *args: pytest.fail("decoded twice"))
+    assert get_iwi_preview(path, 16) is image
+    texture_preview._memory_cache.clear()
+    assert get_iwi_preview(path, 16).size == (16, 8)      # from the PNG cache
@@ -0,0 +1,162 @@
+# test_iwd_writer.py
+"""Incremental updates, compression policy and reproducible output of iwd_writer"""
+
+from pathlib import Path
+import os
+import sys
+import zipfile
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import iwd_writer
+from iwd_writer import pack_iwd, read_manifest, update_iwd, _member_level
+
+# An even number of seconds, so +1 s stays inside the same 2-second DOS time slot
+BASE_MTIME_NS = 1_700_000_000 * 10**9
+
+
+def make_tree(cod2: Path, files: dict) -> list:
+    """Writes {game path: bytes} under cod2/raw and returns the source paths"""
+    paths = []
+    for name, data in files.items():
+        path = cod2 / "raw" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        os.utime(path, ns=(BASE_MTIME_NS, BASE_MTIME_NS))
+        paths.append(path)
+    return paths
+
+
+def dos_time_slot(date_time: tuple) -> tuple:
+    """What a zip header can tell apart: DOS times have 2-second resolution"""
+    return date_time[:5] + (date_time[5] // 2,)
+
+
+def test_update_reuses_unchanged_and_drops_removed(tmp_path):
+    cod2 = tmp_path / "cod2"
+    a, b = make_tree(cod2, {"maps/a.gsc": b"main() {}\n" * 40, "maps/b.gsc": b"init() {}\n" * 40})
+    out = tmp_path / "out" / "test.iwd"
+    pack_iwd([a, b], out, cod2, jobs=1)
+
+    report = update_iwd([a], out, cod2, jobs=1)
+
+    assert (report["reused"], report["compressed"], report["removed"]) == (1, 0, 1)
+    with zipfile.ZipFile(out) as zf:
+        assert zf.namelist() == ["maps/a.gsc"]
+        assert zf.read("maps/a.gsc") == a.read_bytes()
+
+
+def test_update_recompresses_same_size_edit_in_same_dos_time_slot(tmp_path):
+    cod2 = tmp_path / "cod2"
+    (src,) = make_tree(cod2, {"maps/a.gsc": b"level.x = 1;\n" * 40})
+    out = tmp_path / "out" / "test.iwd"
+    pack_iwd([src], out, cod2, jobs=1)
+
+    edited = b"level.x = 2;\n" * 40
+    src.write_bytes(edited)
+    os.utime(src, ns=(BASE_MTIME_NS + 10**9, BASE_MTIME_NS + 10**9))
+    with zipfile.ZipFile(out) as zf:
+        old_info = zf.getinfo("maps/a.gsc")
+    assert old_info.file_size == len(edited)
+    assert dos_time_slot(old_info.date_time) == dos_time_slot(zipfile.ZipInfo.from_file(src).date_time)
+
+    report = update_iwd([src], out, cod2, jobs=1)
+
+    assert (report["reused"], report["compressed"]) == (0, 1)
+    with zipfile.ZipFile(out) as zf:
+        assert zf.read("maps/a.gsc") == edited
+
+
+def test_store_members_are_not_compressed(tmp_path, monkeypatch):
+    cod2 = tmp_path / "cod2"
+    (src,) = make_tree(cod2, {"sound/music.mp3": b"ID3" + bytes(4000)})
+
+    def no_compression(*args, **kwargs):
+        raise AssertionError("STORE member was compressed")
+
+    monkeypatch.setattr(iwd_writer, "_trial_deflate", no_compression)
+    monkeypatch.setattr(iwd_writer, "deflate_file", no_compression)
+    monkeypatch.setattr(iwd_writer.zlib, "compressobj", no_compression)
+    out = tmp_path / "out" / "test.iwd"
+    report = pack_iwd([src], out, cod2, jobs=1)
+
+    assert report["stored"] == 1
+    with zipfile.ZipFile(out) as zf:
+        info = zf.getinfo("sound/music.mp3")
+        assert info.compress_type == zipfile.ZIP_STORED
+        assert _member_level(info) is None
+        assert zf.read("sound/music.mp3") == src.read_bytes()
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_text_assets_use_level_9(tmp_path, jobs):
+    text = b"// generated\n" + b"setDvar(\"x\", 1);\n" * 200
+    cod2 = tmp_path / "cod2"
+    files = make_tree(cod2, {
+        "maps/mp/mp_test.gsc": text,
+        "maps/mp/mp_test.csv": text,
+        "fx/custom/fire.efx": text,
+        "materials/custom_wall": text,
+        "readme.txt": text,
+    })
+    out = tmp_path / "out" / "test.iwd"
+    pack_iwd(files, out, cod2, jobs=jobs)
+
+    with zipfile.ZipFile(out) as zf:
+        levels = {zi.filename: (zi.compress_type, _member_level(zi)) for zi in zf.infolist()}
+    deflated = zipfile.ZIP_DEFLATED
+    assert levels == {
+        "maps/mp/mp_test.gsc": (deflated, 9),
+        "maps/mp/mp_test.csv": (deflated, 9),
+        "fx/custom/fire.efx": (deflated, 9),
+        "materials/custom_wall": (deflated, 9),
+        "readme.txt": (deflated, iwd_writer.DEFLATE_LEVEL),
+    }
+
+
+def test_update_recompresses_members_whose_policy_level_changed(tmp_path, monkeypatch):
+    cod2 = tmp_path / "cod2"
+    files = make_tree(cod2, {"maps/a.gsc": b"main() {}\n" * 40, "readme.txt": b"notes\n" * 40})
+    out = tmp_path / "out" / "test.iwd"
+    pack_iwd(files, out, cod2, jobs=1)
+
+    monkeypatch.setitem(iwd_writer.COMPRESSION_POLICY, ".gsc", 1)
+    report = update_iwd(files, out, cod2, jobs=1)
+
+    assert (report["reused"], report["compressed"]) == (1, 1)
+    with zipfile.ZipFile(out) as zf:
+        assert _member_level(zf.getinfo("maps/a.gsc")) == 1
+        assert _member_level(zf.getinfo("readme.txt")) == iwd_writer.DEFLATE_LEVEL
+        assert zf.read("maps/a.gsc") == files[0].read_bytes()
+
+
+def test_reproducible_update_matches_a_fresh_pack(tmp_path, monkeypatch):
+    cod2 = tmp_path / "cod2"
+    files = make_tree(cod2, {
+        "maps/mp/mp_test.gsc": b"main() { maps\\mp\\_load::main(); }\n" * 30,
+        "materials/custom_wall": b"colorMap custom_wall_c\n" * 30,
+        "sound/music.mp3": b"ID3" + bytes(3000),
+    })
+    fresh = tmp_path / "fresh" / "test.iwd"
+    pack_iwd(files, fresh, cod2, jobs=1, reproducible=True)
+
+    updated = tmp_path / "updated" / "test.iwd"
+    with monkeypatch.context() as m:
+        m.setitem(iwd_writer.COMPRESSION_POLICY, ".gsc", 1)
+        pack_iwd(files, updated, cod2, jobs=1, reproducible=True)
+    assert updated.read_bytes() != fresh.read_bytes()
+
+    report = update_iwd(files, updated, cod2, jobs=1, reproducible=True)
+
+    assert report["reused"] == 0
+    assert updated.read_bytes() == fresh.read_bytes()
+    fresh_manifest, updated_manifest = read_manifest(fresh), read_manifest(updated)
+    assert updated_manifest["sha256"] == fresh_manifest["sha256"] == report["sha256"]
+    assert updated_manifest["content_digest"] == fresh_manifest["content_digest"]
+
+    # Now the manifest matches, so everything is reused and the bytes stay the same
+    again = update_iwd(files, updated, cod2, jobs=1, reproducible=True)
+    assert again["reused"] == len(files)
+    assert updated.read_bytes() == fresh.read_bytes()
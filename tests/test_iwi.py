@@ -0,0 +1,72 @@
+# test_iwi.py
+"""IWI header fields, mip layout and video memory (iwi, texture_report)"""
+
+from pathlib import Path
+import struct
+import sys
+import zipfile
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from iwi import (FLAG_CUBEMAP, FLAG_NOMIPMAPS, FORMAT_DXT1, FORMAT_RGB8, IwiFormatError,
+                 gpu_bytes, level_size, mip_offsets, parse_iwi_header)
+from texture_report import read_texture_header
+from vfs import get_game_fs
+
+# DXT1 64x32 with all 7 mip levels: 16 x 8 blocks of 8 bytes, then 8 x 4, 4 x 2, 2 x 1 and three single blocks
+DXT1_MIP_SIZES = [1024, 256, 64, 16, 8, 8, 8]
+
+
+def iwi_header(fmt: int, width: int, height: int, data_size: int, flags: int = 0,
+               magic: bytes = b"IWi", version: int = 5) -> bytes:
+    return struct.pack("<3sBBBHHH4I", magic, version, fmt, flags, width, height, 1,
+                       28 + data_size, 0, 0, 0)
+
+
+def test_dxt1_header_with_full_mip_chain():
+    header = parse_iwi_header(iwi_header(FORMAT_DXT1, 64, 32, sum(DXT1_MIP_SIZES)))
+
+    assert header == {
+        "format": "DXT1", "format_id": FORMAT_DXT1, "flags": 0, "width": 64, "height": 32,
+        "faces": 1, "mips": 7, "file_size": 28 + sum(DXT1_MIP_SIZES),
+    }
+    assert [level_size(FORMAT_DXT1, w, h) for w, h in ((64, 32), (32, 16), (2, 1))] == [1024, 256, 8]
+    offsets = mip_offsets(header)
+    assert offsets[0] == (header["file_size"] - 1024, 1024)   # largest level is last in the file
+    assert offsets[-1] == (28, 8)
+    assert gpu_bytes(header) == sum(DXT1_MIP_SIZES)
+
+
+def test_flags_and_rgb8_padding():
+    single = parse_iwi_header(iwi_header(FORMAT_RGB8, 4, 4, 48, flags=FLAG_NOMIPMAPS))
+    assert (single["format"], single["mips"], single["faces"]) == ("RGB8", 1, 1)
+    assert gpu_bytes(single) == 4 * 4 * 4
+
+    cube = parse_iwi_header(iwi_header(FORMAT_DXT1, 4, 4, 6 * 8, flags=FLAG_CUBEMAP | FLAG_NOMIPMAPS))
+    assert cube["faces"] == 6
+    assert gpu_bytes(cube) == 6 * 8
+
+
+def test_rejects_other_files():
+    with pytest.raises(IwiFormatError, match="not an IWI"):
+        parse_iwi_header(iwi_header(FORMAT_DXT1, 4, 4, 8, magic=b"DDS"))
+    with pytest.raises(IwiFormatError, match="version"):
+        parse_iwi_header(iwi_header(FORMAT_DXT1, 4, 4, 8, version=6))
+    with pytest.raises(IwiFormatError, match="too short"):
+        parse_iwi_header(b"IWi\x05")
+
+
+def test_read_texture_header_from_an_iwd(tmp_path):
+    cod2 = tmp_path / "cod2"
+    (cod2 / "main").mkdir(parents=True)
+    data = iwi_header(FORMAT_DXT1, 64, 32, sum(DXT1_MIP_SIZES)) + bytes(sum(DXT1_MIP_SIZES))
+    with zipfile.ZipFile(cod2 / "main" / "iw_00.iwd", "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("images/wall_c.iwi", data)
+    entry = get_game_fs(cod2).resolve_archived("images/wall_c.iwi")
+
+    header = read_texture_header(entry)
+
+    assert (header["format"], header["width"], header["height"], header["mips"]) == ("DXT1", 64, 32, 7)
+    assert header["gpu_bytes"] == sum(DXT1_MIP_SIZES)
@@ -0,0 +1,113 @@
+# test_iwi_encoder.py
+"""DXT encode/decode round trips, mip chains and .iwi output of iwi_encoder"""
+
+from pathlib import Path
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dxt import decode_level, encode_level
+from iwi import (FLAG_NOMIPMAPS, FORMAT_ARGB8, FORMAT_DXT1, FORMAT_DXT5, IwiFormatError,
+                 build_iwi, mip_offsets, parse_iwi_header)
+from iwi_encoder import build_mipmaps, encode_files, encode_image, format_id
+
+
+def ramp(width: int, height: int, alpha: bool = False) -> np.ndarray:
+    """Red-to-green along x (colours on one line, as DXT assumes per block); alpha along y"""
+    y, x = np.mgrid[0:height, 0:width]
+    rgba = np.empty((height, width, 4), dtype=np.uint8)
+    rgba[:, :, 0] = 255 - x * 255 // max(1, width - 1)
+    rgba[:, :, 1] = x * 255 // max(1, width - 1)
+    rgba[:, :, 2] = 64
+    rgba[:, :, 3] = y * 255 // max(1, height - 1) if alpha else 255
+    return rgba
+
+
+def test_dxt1_round_trip():
+    # Colours that 5:6:5 represents exactly come back unchanged, one per block
+    exact = np.zeros((8, 8, 4), dtype=np.uint8)
+    exact[:4, :4] = (255, 0, 0, 255)
+    exact[:4, 4:] = (0, 255, 0, 255)
+    exact[4:, :4] = (0, 0, 255, 255)
+    exact[4:, 4:] = (255, 255, 255, 255)
+    data = encode_level(FORMAT_DXT1, exact)
+    assert len(data) == 4 * 8
+    assert np.array_equal(decode_level(FORMAT_DXT1, data, 8, 8), exact)
+
+    smooth = ramp(16, 16)
+    decoded = decode_level(FORMAT_DXT1, encode_level(FORMAT_DXT1, smooth), 16, 16)
+    assert np.abs(decoded.astype(int) - smooth).max() <= 8
+
+
+def test_dxt1_keeps_cutout_alpha():
+    rgba = ramp(4, 4)
+    rgba[:2, :, 3] = 0
+    decoded = decode_level(FORMAT_DXT1, encode_level(FORMAT_DXT1, rgba), 4, 4)
+    assert decoded[:2, :, 3].max() == 0
+    assert decoded[2:, :, 3].min() == 255
+
+
+def test_dxt5_round_trip():
+    rgba = ramp(16, 8, alpha=True)
+    data = encode_level(FORMAT_DXT5, rgba)
+    assert len(data) == 4 * 2 * 16
+    decoded = decode_level(FORMAT_DXT5, data, 16, 8)
+    assert np.abs(decoded.astype(int) - rgba).max() <= 8
+    # Each block spans ~109 alpha levels over 8 palette entries: at most half a step off
+    assert np.abs(decoded[:, :, 3].astype(int) - rgba[:, :, 3]).max() <= 8
+
+    # Edges that are not a multiple of 4 are padded on encode and cropped on decode
+    odd = ramp(6, 3, alpha=True)
+    assert decode_level(FORMAT_DXT5, encode_level(FORMAT_DXT5, odd), 6, 3).shape == (3, 6, 4)
+
+
+def test_box_filtered_mip_chain():
+    pixels = np.zeros((2, 4, 4), dtype=np.uint8)
+    pixels[:, :2] = (200, 0, 0, 255)
+    pixels[:, 2:] = (0, 100, 0, 255)
+    pixels[1, 3] = (0, 100, 0, 55)
+    levels = build_mipmaps(Image.fromarray(pixels, "RGBA"))
+
+    assert [level.shape for level in levels] == [(2, 4, 4), (1, 2, 4), (1, 1, 4)]
+    assert levels[1].tolist() == [[[200, 0, 0, 255], [0, 100, 0, 205]]]
+    assert levels[2].tolist() == [[[100, 50, 0, 230]]]
+    assert [level.shape for level in build_mipmaps(Image.fromarray(pixels, "RGBA"), filter="lanczos")] == \
+        [(2, 4, 4), (1, 2, 4), (1, 1, 4)]
+    with pytest.raises(ValueError, match="filter"):
+        build_mipmaps(Image.fromarray(pixels, "RGBA"), filter="bicubic")
+
+
+def test_encode_image_writes_a_readable_iwi():
+    rgba = ramp(32, 16, alpha=True)
+    image = Image.fromarray(rgba, "RGBA")
+    assert format_id("auto", image) == FORMAT_DXT5
+    assert format_id("auto", image.convert("RGB")) == FORMAT_DXT1
+
+    data = encode_image(image, "ARGB8")
+    header = parse_iwi_header(data)
+    assert (header["format"], header["width"], header["height"], header["mips"]) == ("ARGB8", 32, 16, 6)
+    assert header["file_size"] == len(data)
+    offset, size = mip_offsets(header)[0]
+    assert np.array_equal(decode_level(FORMAT_ARGB8, data[offset:offset + size], 32, 16), rgba)
+
+    single = parse_iwi_header(encode_image(image, "DXT1", mipmaps=False))
+    assert single["mips"] == 1 and single["flags"] & FLAG_NOMIPMAPS
+    with pytest.raises(IwiFormatError, match="mip 1"):
+        build_iwi(FORMAT_DXT1, 8, 8, [bytes(32), bytes(16)])
+
+
+def test_encode_files_reports_errors_per_file(tmp_path):
+    Image.fromarray(ramp(8, 8), "RGBA").save(tmp_path / "wall.png")
+    (tmp_path / "broken.tga").write_bytes(b"not an image")
+
+    results = encode_files([tmp_path / "wall.png", tmp_path / "broken.tga"], tmp_path / "out", jobs=1)
+
+    assert results[0]["error"] is None
+    assert (results[0]["format"], results[0]["mips"]) == ("DXT1", 4)
+    assert parse_iwi_header((tmp_path / "out" / "wall.iwi").read_bytes())["format"] == "DXT1"
+    assert results[1]["error"]
+    assert not (tmp_path / "out" / "broken.iwi").exists()
@@ -0,0 +1,74 @@
+# test_map_scanner.py
+"""Entity/brace bookkeeping of map_scanner.scan_map_file()"""
+
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from map_scanner import scan_map_file
+
+# A patch in worldspawn (followed by another brush) and one inside a brush entity
+PATCH_MAP = """iwmap 4
+// entity 0
+{
+"classname" "worldspawn"
+"_color" "1 1 1"
+// brush 0
+{
+ ( 0 0 64 ) ( 64 0 64 ) ( 0 64 64 ) caulk 64 64 0 0 0 0 lightmap_gray 16384 16384 0 0 0 0
+ ( 0 0 0 ) ( 0 64 0 ) ( 64 0 0 ) caulk 64 64 0 0 0 0 lightmap_gray 16384 16384 0 0 0 0
+}
+// brush 1
+{
+ curve
+ {
+  metal_plate
+  lightmap_gray
+  3 3 16 8
+  (
+   v 0 0 0 t 0 0
+  )
+ }
+}
+// brush 2
+{
+ ( 0 0 128 ) ( 64 0 128 ) ( 0 64 128 ) caulk 64 64 0 0 0 0 lightmap_gray 16384 16384 0 0 0 0
+ ( 0 0 64 ) ( 0 64 64 ) ( 64 0 64 ) caulk 64 64 0 0 0 0 lightmap_gray 16384 16384 0 0 0 0
+}
+}
+// entity 1
+{
+"classname" "script_brushmodel"
+"targetname" "door"
+// brush 0
+{
+ mesh
+ {
+  wood_door
+  lightmap_gray
+  2 2 16 8
+  (
+   v 0 0 0 t 0 0
+  )
+ }
+}
+}
+// entity 2
+{
+"classname" "misc_model"
+"model" "xmodel/prop_crate"
+}
+"""
+
+
+def test_patches_do_not_close_their_entity(tmp_path):
+    map_path = tmp_path / "patches.map"
+    map_path.write_bytes(PATCH_MAP.replace("\n", "\r\n").encode("latin1"))
+
+    result = scan_map_file(map_path)
+
+    assert [e["classname"] for e in result["entities"]] == ["worldspawn", "script_brushmodel", "misc_model"]
+    assert result["entities"][1]["targetname"] == "door"
+    assert result["entities"][2]["model"] == "xmodel/prop_crate"
+    assert result["patch_materials"] == {"metal_plate", "wood_door"}
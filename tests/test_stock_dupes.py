@@ -0,0 +1,58 @@
+# test_stock_dupes.py
+"""Size + CRC32 matching of pack candidates against the stock IWDs"""
+
+from pathlib import Path
+import sys
+import zipfile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import stock_dupes
+from stock_dupes import classify_stock_files
+
+STOCK = {
+    "materials/wall": b"colorMap wall_c\n" * 8,
+    "images/wall_c.iwi": b"IWi" + bytes(61),
+    "sound/ambient.mp3": b"ID3" + bytes(100),
+}
+
+
+def test_classify_by_size_and_crc(tmp_path, monkeypatch):
+    cod2 = tmp_path / "cod2"
+    (cod2 / "main").mkdir(parents=True)
+    with zipfile.ZipFile(cod2 / "main" / "iw_00.iwd", "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in STOCK.items():
+            zf.writestr(name, data)
+
+    candidates = {
+        "materials/wall": STOCK["materials/wall"],               # identical copy
+        "images/wall_c.iwi": b"IWi" + b"\x01" * 61,              # same size, other content
+        "sound/ambient.mp3": b"ID3" + bytes(50),                 # other size
+        "maps/mp/mp_test.gsc": b"main() {}\n",                   # not a stock path
+    }
+    files = []
+    for name, data in candidates.items():
+        path = cod2 / "raw" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        files.append(path)
+
+    real_crc32 = stock_dupes.file_crc32
+    hashed = []
+
+    def counting_crc32(path):
+        hashed.append(Path(path).name)
+        return real_crc32(path)
+
+    monkeypatch.setattr(stock_dupes, "file_crc32", counting_crc32)
+
+    result = classify_stock_files(str(cod2), files, jobs=1)
+
+    raw = cod2 / "raw"
+    assert result["duplicates"] == [raw / "materials" / "wall"]
+    assert result["overrides"] == sorted([raw / "images" / "wall_c.iwi", raw / "sound" / "ambient.mp3"])
+    assert result["custom"] == [raw / "maps" / "mp" / "mp_test.gsc"]
+    # Only candidates with a stock file of the same size are hashed, and only once
+    assert sorted(hashed) == ["wall", "wall_c.iwi"]
+    classify_stock_files(str(cod2), files, jobs=1)
+    assert len(hashed) == 2
@@ -0,0 +1,64 @@
+# test_stock_lists.py
+"""Regeneration of the stock asset lists from the installed IWDs"""
+
+from pathlib import Path
+import json
+import sys
+import zipfile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stock_index import get_stock_index
+from stock_lists import build_stock_lists
+from vfs import get_game_fs
+
+
+def write_iwd(path: Path, names):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(path, "w") as zf:
+        for name in names:
+            zf.writestr(name, b"x")
+
+
+def read_list(path: Path) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_lists_are_rebuilt_only_when_the_iwds_change(tmp_path):
+    cod2 = tmp_path / "cod2"
+    write_iwd(cod2 / "main" / "iw_00.iwd", [
+        "xmodel/prop_crate", "xmodel/viewmodels/skipped",
+        "materials/wall", "fx/fire/torch.efx", "fx/fire/readme.txt",
+    ])
+
+    first = build_stock_lists(cod2)
+    assert first["rebuilt"]
+    assert read_list(first["xmodel_json"]) == [{"name": "prop_crate"}]
+    assert read_list(first["material_json"]) == [{"name": "wall"}]
+    assert read_list(first["fx_json"]) == [{"path": "fire/torch.efx"}]
+
+    assert not build_stock_lists(cod2)["rebuilt"]
+
+    write_iwd(cod2 / "main" / "iw_01.iwd", ["xmodel/prop_barrel"])
+    get_game_fs(cod2, revalidate=True)
+    second = build_stock_lists(cod2)
+    assert second["rebuilt"]
+    assert second["fingerprint"] != first["fingerprint"]
+    assert read_list(second["xmodel_json"]) == [{"name": "prop_barrel"}, {"name": "prop_crate"}]
+
+
+def test_stock_index_merges_shipped_and_generated_lists(tmp_path):
+    cod2 = tmp_path / "cod2"
+    write_iwd(cod2 / "main" / "iw_00.iwd", ["xmodel/prop_crate", "materials/wall", "fx/fire/torch.efx"])
+    shipped = tmp_path / "lists"
+    shipped.mkdir()
+    (shipped / "xmodel_list.json").write_text(json.dumps([{"name": "Shipped_Model"}]))
+
+    stock = get_stock_index(shipped / "xmodel_list.json", shipped / "materials.json",
+                            shipped / "fx_files.json", cod2_path=str(cod2))
+
+    assert stock.has_xmodel("shipped_model") and stock.has_xmodel("PROP_CRATE")
+    assert stock.has_material("wall")
+    assert stock.has_fx("fx/fire/torch.efx")
+    assert not stock.has_xmodel("custom_model")
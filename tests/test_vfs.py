@@ -0,0 +1,61 @@
+# test_vfs.py
+"""Lookup order and IWD re-indexing of vfs.GameFileSystem"""
+
+from pathlib import Path
+import sys
+import zipfile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vfs import get_game_fs
+
+
+def write_iwd(path: Path, members: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+
+
+def write_loose(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def test_loose_files_shadow_iwds_and_later_iwds_win(tmp_path):
+    cod2 = tmp_path / "cod2"
+    write_iwd(cod2 / "main" / "iw_00.iwd", {
+        "materials/wall": b"stock wall",
+        "materials/floor": b"stock floor",
+        "xmodel/crate": b"stock crate",
+    })
+    write_iwd(cod2 / "main" / "iw_01.iwd", {"materials/floor": b"patched floor"})
+    write_loose(cod2 / "main" / "materials" / "wall", b"main wall")
+    write_loose(cod2 / "raw" / "materials" / "wall", b"raw wall")
+    write_loose(cod2 / "main" / "xmodel" / "crate", b"main crate")
+
+    fs = get_game_fs(cod2)
+
+    assert fs.read_bytes("materials/wall") == b"raw wall"
+    assert fs.read_bytes("xmodel/crate") == b"main crate"
+    assert fs.read_bytes("materials/floor") == b"patched floor"
+    assert fs.read_bytes("materials/missing") is None
+
+    member = fs.resolve_archived("MATERIALS/WALL")
+    assert member.source.name == "iw_00.iwd" and not member.is_loose
+    assert member.read_bytes() == b"stock wall"
+    assert member.read_head(5) == b"stock"
+
+
+def test_revalidate_picks_up_new_iwds(tmp_path):
+    cod2 = tmp_path / "cod2"
+    write_iwd(cod2 / "main" / "iw_00.iwd", {"materials/wall": b"stock wall"})
+    fs = get_game_fs(cod2)
+    write_iwd(cod2 / "main" / "iw_01.iwd", {"materials/wall": b"patched wall"})
+
+    # Within STALE_CHECK_SECONDS the cached view is reused without re-stamping
+    assert get_game_fs(cod2) is fs
+
+    fresh = get_game_fs(cod2, revalidate=True)
+    assert fresh is not fs
+    assert fresh.read_bytes("materials/wall") == b"patched wall"
@@ -0,0 +1,56 @@
+# test_xmodel_reader.py
+"""Header and material table parsing of xmodel_reader on synthetic files"""
+
+from pathlib import Path
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vfs import VfsEntry
+from xmodel_reader import XModelFormatError, parse_xmodel_header, read_xmodel
+
+
+def xmodel_blob(version: int = 20, collision_size: int = 16) -> bytes:
+    blob = struct.pack("<HB6f", version, 0, -1.0, -2.0, -3.0, 4.0, 5.0, 6.0)
+    for distance, name in ((0.0, b"crate_lod0"), (500.0, b"crate_lod1"), (0.0, b""), (0.0, b"")):
+        blob += struct.pack("<f", distance) + name + b"\0"
+    blob += struct.pack("<i", -1)
+    blob += bytes(collision_size)
+    blob += struct.pack("<H", 2) + b"wood\0metal\0"
+    blob += struct.pack("<H", 1) + b"wood\0"
+    return blob
+
+
+def test_parse_header():
+    info = parse_xmodel_header(xmodel_blob())
+
+    assert info["version"] == 20
+    assert info["bounds"] == [[-1.0, -2.0, -3.0], [4.0, 5.0, 6.0]]
+    assert info["lods"] == [{"name": "crate_lod0", "distance": 0.0},
+                            {"name": "crate_lod1", "distance": 500.0}]
+    assert info["collision_lod"] == -1
+    assert info["header_size"] == 27 + 4 * 4 + len("crate_lod0\0crate_lod1\0\0\0") + 4
+
+
+# The larger collision block puts the table outside the head, so head and tail are read separately
+@pytest.mark.parametrize("collision_size", [16, 8000])
+def test_read_xmodel(tmp_path, collision_size):
+    path = tmp_path / "crate"
+    path.write_bytes(xmodel_blob(collision_size=collision_size))
+
+    info = read_xmodel(VfsEntry.from_file(path, "xmodel/crate"))
+
+    assert info["surfs"] == ["crate_lod0", "crate_lod1"]
+    assert info["parts"] == "crate_lod0"
+    assert info["lod_materials"] == [["wood", "metal"], ["wood"]]
+    assert info["materials"] == ["wood", "metal"]
+
+
+def test_rejects_other_versions_and_truncated_headers():
+    with pytest.raises(XModelFormatError, match="version 25"):
+        parse_xmodel_header(xmodel_blob(version=25))
+    with pytest.raises(XModelFormatError):
+        parse_xmodel_header(xmodel_blob()[:40])
@@ -0,0 +1,128 @@
+# test_xmodel_render.py
+"""Skeleton posing (xmodel_parts), rasterization (xmodel_render) and thumbnail batches (model_thumbnails)"""
+
+from pathlib import Path
+import struct
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model_thumbnails import images_complete, render_thumbnails
+from xmodel_parts import XModelPartsFormatError, bone_transforms, read_xmodelparts
+from xmodel_render import _rasterize, load_xmodel_mesh, render_mesh
+from xmodel_surfs import RIGID_VERTEX
+
+# sin(45 deg) * 32767: a quarter turn about Z
+QUARTER_TURN_Z = 23170
+
+
+def parts_blob(version: int = 20, second_parent: int = 1) -> bytes:
+    """Root tag_origin; j_lid at (10, 0, 0) turned 90 degrees about Z; j_handle 5 units along j_lid's X"""
+    blob = struct.pack("<HHH", version, 2, 1)
+    blob += struct.pack("<b3f3h", 0, 10.0, 0.0, 0.0, 0, 0, QUARTER_TURN_Z)
+    blob += struct.pack("<b3f3h", second_parent, 5.0, 0.0, 0.0, 0, 0, 0)
+    return blob + b"tag_origin\0j_lid\0j_handle\0" + bytes(8)
+
+
+def test_read_xmodelparts_and_pose():
+    parts = read_xmodelparts(parts_blob())
+    assert parts["names"] == ["tag_origin", "j_lid", "j_handle"]
+    assert parts["parents"].tolist() == [-1, 0, 1]
+    assert parts["offsets"].tolist() == [[0, 0, 0], [10, 0, 0], [5, 0, 0]]
+
+    rotations, translations = bone_transforms(parts)
+    assert np.allclose(translations, [[0, 0, 0], [10, 0, 0], [10, 5, 0]], atol=1e-3)
+    assert np.allclose(rotations[2] @ [1, 0, 0], [0, 1, 0], atol=1e-4)
+    assert np.allclose(rotations[0], np.eye(3))
+
+
+def test_read_xmodelparts_rejects_bad_files():
+    with pytest.raises(XModelPartsFormatError, match="version"):
+        read_xmodelparts(parts_blob(version=19))
+    with pytest.raises(XModelPartsFormatError, match="bad parent"):
+        read_xmodelparts(parts_blob(second_parent=2))
+    with pytest.raises(XModelPartsFormatError, match="names truncated"):
+        read_xmodelparts(parts_blob()[:-20])
+
+
+def test_rasterize_single_triangle():
+    # Right triangle over the top-left half of an 8x8 image: pixel centres with x + y <= 7 are inside
+    screen = np.array([[0, 0, 1], [8, 0, 1], [0, 8, 1]], dtype=np.float32)
+    expected = sorted(y * 8 + x for y in range(8) for x in range(8) if x + y <= 7)
+    for triangle in ([0, 1, 2], [0, 2, 1]):     # either winding
+        pixels, owners = _rasterize(screen, np.array([triangle]), 8)
+        assert sorted(pixels.tolist()) == expected
+        assert set(owners.tolist()) == {0}
+
+
+def test_rasterize_keeps_the_nearest_fragment_and_clips():
+    # Triangle 1 covers the whole 4x4 image in front of triangle 0 and reaches outside it
+    screen = np.array([[0, 0, 0], [4, 0, 0], [0, 4, 0],
+                       [-1, -1, 5], [12, -1, 5], [-1, 12, 5]], dtype=np.float32)
+    pixels, owners = _rasterize(screen, np.array([[0, 1, 2], [3, 4, 5]]), 4)
+    assert sorted(pixels.tolist()) == list(range(16))
+    assert set(owners.tolist()) == {1}
+
+    # Degenerate and off-screen triangles draw nothing
+    pixels, owners = _rasterize(screen, np.array([[0, 0, 1], [3, 3, 3]]), 4)
+    assert len(pixels) == len(owners) == 0
+
+
+def test_render_mesh_fills_the_frame():
+    vertices = np.array([[0, 0, 0], [0, 10, 0], [0, 0, 10], [0, 10, 10]], dtype=np.float32)
+    image = np.asarray(render_mesh(vertices, np.array([[0, 1, 2], [1, 3, 2]]), size=64, yaw=0, pitch=0))
+    assert image.shape == (64, 64, 4)
+    assert image[32, 32, 3] == 255
+    assert image[1, 1, 3] == 0                  # margin stays transparent
+    assert image[32, 32, 0] > 0
+
+
+def xmodel_blob(lod: str) -> bytes:
+    blob = struct.pack("<HB6f", 20, 0, 0, 0, 0, 1, 1, 1)
+    for name in (lod, "", "", ""):
+        blob += struct.pack("<f", 0.0) + name.encode() + b"\0"
+    return blob + struct.pack("<i", -1) + bytes(16) + struct.pack("<H", 1) + b"wood\0"
+
+
+def surfs_blob() -> bytes:
+    """One rigid surface on j_lid: two triangles of a 1x1 square"""
+    verts = np.zeros(4, dtype=RIGID_VERTEX)
+    verts["position"] = [(0, 0, 0), (1, 0, 0), (0, 0, 1), (1, 0, 1)]
+    tris = np.array([[0, 1, 2], [1, 3, 2]], dtype="<u2")
+    return struct.pack("<HH", 20, 1) + struct.pack("<BHHh", 0, 4, 2, 1) + verts.tobytes() + tris.tobytes()
+
+
+def test_render_thumbnails(tmp_path):
+    main = tmp_path / "cod2" / "main"
+    for folder, name, data in (("xmodel", "crate", xmodel_blob("crate_lod0")),
+                               ("xmodelsurfs", "crate_lod0", surfs_blob()),
+                               ("xmodelparts", "crate_lod0", parts_blob()),
+                               ("xmodel", "barrel", xmodel_blob("barrel_lod0")),
+                               ("xmodelsurfs", "barrel_lod0", surfs_blob()),
+                               ("xmodelparts", "barrel_lod0", b"junk"),
+                               ("xmodel", "broken", b"junk")):
+        (main / folder).mkdir(parents=True, exist_ok=True)
+        (main / folder / name).write_bytes(data)
+
+    vertices, triangles, skeleton_error = load_xmodel_mesh(main.parent, "crate")
+    assert skeleton_error is None
+    assert np.allclose(vertices[1], [10, 1, 0], atol=1e-3)     # (1, 0, 0) on j_lid
+    assert triangles.tolist() == [[0, 1, 2], [1, 3, 2]]
+
+    thumbs, full = tmp_path / "thumbnails", tmp_path / "xmodel"
+    render_thumbnails(main.parent, ["crate"], thumb_dir=thumbs, full_dir=full, jobs=1)
+    assert not images_complete(thumbs)        # only a pass over every model counts
+
+    totals = []
+    result = render_thumbnails(main.parent, thumb_dir=thumbs, full_dir=full, jobs=1, on_total=totals.append)
+
+    assert totals == [3]
+    assert result["rendered"] == ["barrel"]
+    assert result["skipped"] == ["crate"]
+    assert list(result["failed"]) == ["broken"]
+    assert "skeleton ignored" in result["warnings"]["barrel"]
+    assert (thumbs / "crate.png").is_file() and (full / "crate.png").is_file()
+    assert images_complete(thumbs)
@@ -0,0 +1,95 @@
+# test_xmodel_surfs.py
+"""xmodelsurfs decoding and per-map model counts (model_budget)"""
+
+from pathlib import Path
+import struct
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model_budget import count_model_instances
+from xmodel_surfs import (RIGID_VERTEX, WEIGHT, WEIGHTED_VERTEX, XModelSurfsFormatError,
+                          read_xmodelsurfs, surfs_stats)
+
+
+def rigid_surface(bone: int, positions, indices) -> bytes:
+    verts = np.zeros(len(positions), dtype=RIGID_VERTEX)
+    verts["position"] = positions
+    verts["uv"] = [(i / 4, 0.5) for i in range(len(positions))]
+    tris = np.asarray(indices, dtype="<u2")
+    return struct.pack("<BHHh", 0, len(verts), len(tris), bone) + verts.tobytes() + tris.tobytes()
+
+
+def weighted_surface() -> bytes:
+    """Two vertices: one on bone 3 with an extra weight on bone 4, one on bone 5 only"""
+    data = struct.pack("<BHHh", 0, 2, 1, -1) + struct.pack("<H", 1)
+    for bone, offset, extra in ((3, (1.0, 2.0, 3.0), [(4, (0.0, 0.0, 1.0), 0.25)]), (5, (4.0, 5.0, 6.0), [])):
+        vert = np.zeros(1, dtype=WEIGHTED_VERTEX)
+        vert["weight_count"], vert["bone"], vert["offset"] = len(extra), bone, offset
+        weights = np.array(extra, dtype=WEIGHT)
+        data += vert.tobytes() + weights.tobytes()
+    return data + np.array([[0, 1, 1]], dtype="<u2").tobytes()
+
+
+def surfs_blob() -> bytes:
+    rigid = rigid_surface(2, [(0, 0, 0), (1, 0, 0), (0, 1, 0)], [[0, 1, 2], [0, 0, 1]])
+    return struct.pack("<HH", 20, 2) + rigid + weighted_surface()
+
+
+def test_read_rigid_and_weighted_surfaces():
+    rigid, weighted = read_xmodelsurfs(surfs_blob())
+
+    assert (rigid["verts"], rigid["tris"], rigid["bone"]) == (3, 2, 2)
+    assert rigid["indices"].tolist() == [[0, 1, 2], [0, 0, 1]]
+    assert rigid["positions"].tolist() == [[0, 0, 0], [1, 0, 0], [0, 1, 0]]
+    assert rigid["bones"].tolist() == [2, 2, 2]
+    assert rigid["uvs"][:, 0].tolist() == [0.0, 0.25, 0.5]
+
+    assert (weighted["verts"], weighted["tris"], weighted["bone"]) == (2, 1, -1)
+    assert weighted["positions"].tolist() == [[1, 2, 3], [4, 5, 6]]
+    assert weighted["bones"].tolist() == [3, 5]
+
+    assert surfs_stats([rigid, weighted]) == {"surfaces": 2, "verts": 5, "tris": 3, "degenerate_tris": 2}
+
+
+def test_rejects_bad_files():
+    blob = surfs_blob()
+    with pytest.raises(XModelSurfsFormatError, match="version"):
+        read_xmodelsurfs(struct.pack("<HH", 19, 0))
+    with pytest.raises(XModelSurfsFormatError, match="truncated"):
+        read_xmodelsurfs(blob[:-4])
+    with pytest.raises(XModelSurfsFormatError, match="trailing"):
+        read_xmodelsurfs(blob + b"\0")
+    bad_index = struct.pack("<HH", 20, 1) + rigid_surface(0, [(0, 0, 0)] * 3, [[0, 1, 3]])
+    with pytest.raises(XModelSurfsFormatError, match="out of range"):
+        read_xmodelsurfs(bad_index)
+
+
+def map_source(*entities: dict) -> str:
+    lines = ["iwmap 4"]
+    for ent in ({"classname": "worldspawn"},) + entities:
+        lines += ["{"] + [f'"{k}" "{v}"' for k, v in ent.items()] + ["}"]
+    return "\n".join(lines) + "\n"
+
+
+def test_count_model_instances_expands_prefabs(tmp_path):
+    cod2 = tmp_path / "cod2"
+    prefabs = cod2 / "map_source" / "prefabs"
+    prefabs.mkdir(parents=True)
+    crate = {"classname": "misc_model", "model": "xmodel/prop_crate"}
+    (cod2 / "map_source" / "mp_test.map").write_text(map_source(
+        crate, crate,
+        {"classname": "misc_prefab", "model": "prefabs/crates.map"},
+        {"classname": "misc_prefab", "model": "prefabs/crates.map"},
+    ))
+    (prefabs / "crates.map").write_text(map_source(
+        crate, {"classname": "misc_model", "model": "xmodel/prop_barrel"},
+        {"classname": "misc_prefab", "model": "prefabs/crates.map"},     # contains itself: adds nothing
+    ))
+
+    counts = count_model_instances(str(cod2), "mp_test", jobs=1)
+
+    assert counts == {"prop_crate": 4, "prop_barrel": 2}
@@ -0,0 +1,103 @@
+# texture_preview.py
+"""
+Preview images of .iwi textures.
+
+Only the smallest mip level that still covers the requested size is read and
+decoded (see dxt.py), then scaled to fit. Previews are kept in memory and as
+PNGs under CACHE_DIR/previews, keyed by the file's size/mtime (or IWD CRC), so
+a texture is decoded once until it changes.
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import os
+import threading
+from typing import Union
+
+from PIL import Image
+
+from config import CACHE_DIR
+from dxt import decode_level
+from iwi import HEADER_SIZE, mip_dimensions, mip_offsets, parse_iwi_header
+from vfs import VfsEntry
+
+PREVIEW_CACHE_DIR = CACHE_DIR / "previews"
+DEFAULT_PREVIEW_SIZE = 256
+MEMORY_CACHE_ITEMS = 64
+
+_memory_cache: "OrderedDict[str, Image.Image]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def pick_mip(header: dict, size: int) -> int:
+    """Index (0 = full size) of the smallest stored level whose longer side is still >= size"""
+    best = 0
+    for i, (w, h) in enumerate(mip_dimensions(header["width"], header["height"], header["mips"])):
+        if max(w, h) < size:
+            break
+        best = i
+    return best
+
+
+def _read_range(entry: VfsEntry, offset: int, size: int) -> bytes:
+    if entry.is_loose:
+        with open(entry.source, "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+    return entry.read_bytes()[offset:offset + size]
+
+
+def decode_iwi_preview(entry: VfsEntry, size: int = DEFAULT_PREVIEW_SIZE) -> Image.Image:
+    """Decodes the level chosen by pick_mip() and scales it to fit size x size (uncached)"""
+    header = parse_iwi_header(entry.read_head(HEADER_SIZE))
+    level = pick_mip(header, size)
+    offset, length = mip_offsets(header)[level]
+    w, h = mip_dimensions(header["width"], header["height"], level + 1)[level]
+    if header["faces"] > 1:
+        length //= header["faces"]     # cube maps: first face only
+    pixels = decode_level(header["format_id"], _read_range(entry, offset, length), w, h)
+
+    image = Image.fromarray(pixels, "RGBA")
+    if max(w, h) > size:
+        image.thumbnail((size, size), Image.LANCZOS)
+    return image
+
+
+def _cache_name(entry: VfsEntry, size: int) -> str:
+    key = f"{entry.cache_key}|{entry.stamp}|{size}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def get_iwi_preview(source: Union[Path, str, VfsEntry], size: int = DEFAULT_PREVIEW_SIZE) -> Image.Image:
+    """
+    Cached preview of a texture (a path, or a VfsEntry for textures inside an IWD).
+    Raises IwiFormatError / ValueError for unreadable files.
+    """
+    entry = source if isinstance(source, VfsEntry) else VfsEntry.from_file(source)
+    name = _cache_name(entry, size)
+    with _lock:
+        image = _memory_cache.get(name)
+        if image is not None:
+            _memory_cache.move_to_end(name)
+            return image
+
+    png_path = PREVIEW_CACHE_DIR / f"{name}.png"
+    try:
+        image = Image.open(png_path)
+        image.load()
+    except (OSError, ValueError):
+        image = decode_iwi_preview(entry, size)
+        try:
+            PREVIEW_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp_path = png_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            image.save(tmp_path, "PNG")
+            os.replace(tmp_path, png_path)
+        except OSError as e:
+            print(f"[WARNING] Could not cache preview: {e}")
+
+    with _lock:
+        _memory_cache[name] = image
+        while len(_memory_cache) > MEMORY_CACHE_ITEMS:
+            _memory_cache.popitem(last=False)
+    return image
@@ -0,0 +1,142 @@
+# texture_report.py
+"""
+Video memory used by a map's textures.
+
+The textures are those of every material the map uses (brushes, models, FX
+shaders and the loadscreen), as listed by get_textures_from_material().
+Only the IWI header of each texture is read, loose or from inside an IWD;
+headers are scanned on the worker pool and cached.
+"""
+
+from pathlib import Path
+import time
+from typing import Dict, List
+
+from dep_cache import get_dependency_cache
+from dep_graph import DependencyGraph
+from dir_index import get_directory_index
+from helpers import get_textures_for_materials
+from iwi import HEADER_SIZE, IwiFormatError, gpu_bytes, parse_iwi_header
+from vfs import VfsEntry, get_game_fs
+from worker_pool import parallel_map
+
+
+def read_texture_header(entry: VfsEntry) -> dict:
+    """
+    parse_iwi_header() of a texture plus its video memory (gpu_bytes),
+    or {"error": str} if the file is not a readable IWI.
+    """
+    cache = get_dependency_cache()
+    cached = cache.get("iwi", entry.cache_key, entry.stamp)
+    if cached is not None:
+        return cached
+
+    try:
+        header = parse_iwi_header(entry.read_head(HEADER_SIZE))
+        header["gpu_bytes"] = gpu_bytes(header)
+    except (IwiFormatError, OSError) as e:
+        header = {"error": str(e)}
+    cache.put("iwi", entry.cache_key, header, entry.stamp)
+    return header
+
+
+def _texture_headers_bulk(entries: Dict[str, VfsEntry], jobs: int = None) -> Dict[str, dict]:
+    cache = get_dependency_cache()
+    results: Dict[str, dict] = {}
+    to_read: List[str] = []
+    for name, entry in entries.items():
+        cached = cache.get("iwi", entry.cache_key, entry.stamp)
+        if cached is None:
+            to_read.append(name)
+        else:
+            results[name] = cached
+
+    headers = parallel_map(read_texture_header, [entries[n] for n in to_read], jobs=jobs)
+    results.update(zip(to_read, headers))
+    return results
+
+
+def resolve_texture(cod2_path, name: str) -> VfsEntry:
+    """images/<name> anywhere under main/images (as the packer finds it), else from the IWDs; None if missing"""
+    found = get_directory_index(Path(cod2_path) / "main" / "images").find(name)
+    if found:
+        return VfsEntry.from_file(found, f"images/{name}")
+    return get_game_fs(cod2_path).resolve_archived(f"images/{name}")
+
+
+def map_texture_memory(cod2_path, mapname: str, jobs: int = None, top: int = 20,
+                       graph: DependencyGraph = None) -> dict:
+    """
+    Video memory of every texture the map's materials use, heaviest first.
+    Pass an already built `graph` to skip the map analysis.
+
+    Returns:
+        dict with:
+            textures: List[dict]    # sorted by gpu_bytes, descending; each with:
+                                    #   name, file, in_iwd (stock archive vs. loose), format,
+                                    #   width, height, mips, gpu_bytes, materials (users)
+            top: List[dict]         # the first `top` textures
+            total_bytes: int        # all textures
+            custom_bytes: int       # loose textures, i.e. what the map ships
+            missing: List[str]      # referenced but not found
+            unreadable: List[str]   # found but not a readable IWI
+            seconds: float
+    """
+    start = time.perf_counter()
+    cod2_path = str(cod2_path)
+    if graph is None:
+        graph = DependencyGraph(cod2_path, mapname, jobs=jobs).build()
+
+    materials = sorted({n.name for n in graph.nodes.values() if n.kind == "material"})
+    users: Dict[str, List[str]] = {}
+    for material, tex_bases in get_textures_for_materials(cod2_path, materials, jobs).items():
+        for base in tex_bases:
+            users.setdefault(f"{base}.iwi", []).append(material)
+    for node in graph.nodes.values():
+        if node.kind == "loadscreen":
+            for child in node.children.values():
+                users.setdefault(child.name, []).append(node.name)
+
+    entries: Dict[str, VfsEntry] = {}
+    missing: List[str] = []
+    for name in sorted(users):
+        entry = resolve_texture(cod2_path, name)
+        if entry is None:
+            missing.append(name)
+        else:
+            entries[name] = entry
+
+    headers = _texture_headers_bulk(entries, jobs)
+    textures = []
+    unreadable = []
+    for name, entry in entries.items():
+        header = headers[name]
+        if "error" in header:
+            unreadable.append(name)
+            continue
+        textures.append({
+            "name": name,
+            "file": str(entry.source) if entry.is_loose else f"{entry.source.name}:{entry.member}",
+            "in_iwd": not entry.is_loose,
+            "format": header["format"],
+            "width": header["width"],
+            "height": header["height"],
+            "mips": header["mips"],
+            "gpu_bytes": header["gpu_bytes"],
+            "materials": sorted(users[name]),
+        })
+
+    textures.sort(key=lambda t: (-t["gpu_bytes"], t["name"]))
+    total = sum(t["gpu_bytes"] for t in textures)
+    custom = sum(t["gpu_bytes"] for t in textures if not t["in_iwd"])
+    print(f"[Textures] {mapname}: {len(textures)} textures, {total / 1048576:.1f} MB "
+          f"({custom / 1048576:.1f} MB custom), {len(missing)} missing, {len(unreadable)} unreadable")
+    return {
+        "textures": textures,
+        "top": textures[:top],
+        "total_bytes": total,
+        "custom_bytes": custom,
+        "missing": missing,
+        "unreadable": unreadable,
+        "seconds": time.perf_counter() - start,
+    }
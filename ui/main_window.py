@@ -92,7 +92,7 @@ class MapScriptGeneratorApp:
         model_tab = ttk.Frame(top_notebook)
         top_notebook.add(model_tab, text=" Model Viewer ")
 
-        self.model_viewer = ModelViewerTab(model_tab)
+        self.model_viewer = ModelViewerTab(model_tab, self)
         self.model_viewer.pack(fill="both", expand=True)
 
         tools_setup_tab = ttk.Frame(top_notebook)
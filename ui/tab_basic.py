@@ -1,9 +1,10 @@
 # ui/tab_basic.py
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from pathlib import Path
 
 from config import DEFAULT_CSV_CONTENT
+from iwi_encoder import create_loadscreen
 
 class BasicFilesTab(ttk.Frame):
     def __init__(self, parent, app):
@@ -26,6 +27,13 @@ class BasicFilesTab(ttk.Frame):
         self.csv_text = tk.Text(self, height=3, width=80, wrap="word")
         self.csv_text.pack(fill="x", pady=6)
 
+        loadscreen_frame = ttk.Frame(self)
+        loadscreen_frame.pack(anchor="w", pady=(0, 6))
+        ttk.Button(loadscreen_frame, text="Create loadscreen from image...",
+                   command=self.create_loadscreen_from_image).pack(side="left")
+        self.loadscreen_label = ttk.Label(loadscreen_frame, text="", foreground="gray", font=("Segoe UI", 8))
+        self.loadscreen_label.pack(side="left", padx=10)
+
         ttk.Separator(self, orient="horizontal").pack(fill="x", pady=20)
 
         ttk.Label(self, text="Arena File (mp/mp_mapname.arena)", font=("Segoe UI", 10, "bold")).pack(anchor="w", pady=(10,4))
@@ -190,9 +198,38 @@ class BasicFilesTab(ttk.Frame):
         self.update_missing_status()
         messagebox.showinfo("Created", "Missing files created successfully")
 
+    def create_loadscreen_from_image(self):
+        """Encodes a PNG/TGA to main/images/loadscreen_<map>.iwi and writes its material stub"""
+        mapname = self.app.map_name.get().strip()
+        if not mapname:
+            messagebox.showwarning("No map", "Select or enter a map name first")
+            return
+
+        image_path = filedialog.askopenfilename(
+            title="Loadscreen image",
+            filetypes=[("Images", "*.png *.tga *.jpg *.jpeg *.bmp"), ("All files", "*.*")]
+        )
+        if not image_path:
+            return
+
+        cod2 = Path(self.app.cod2_path.get())
+        result = create_loadscreen(cod2, mapname, image_path)
+        if result["error"]:
+            messagebox.showerror("Loadscreen Error", f"Could not encode {image_path}:\n{result['error']}")
+            return
+
+        self.loadscreen_label.config(text=f"{result['material']}.iwi: {result['format']} "
+                                          f"{result['width']}x{result['height']}")
+        print(f"[DEBUG Basic] Created loadscreen: {result['output']}")
+        messagebox.showinfo("Loadscreen created",
+                            f"Texture: {result['output']}\n"
+                            f"Material stub: {result['gdt']}\n\n"
+                            f"Compile the {result['material']} material with the Asset Manager.")
+
     def clear_all_ui(self):
         """Clear all UI elements when switching maps"""
         self.csv_text.delete("1.0", tk.END)
+        self.loadscreen_label.config(text="")
         self.longname_entry.delete(0, tk.END)
         for var in self.gametype_vars.values():
             var.set(False)
@@ -5,11 +5,16 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from pathlib import Path
 from PIL import Image, ImageTk
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
 import urllib.request
 import zipfile
 import shutil
 import tempfile
 
+from model_thumbnails import images_complete, render_thumbnails
+
 
 MODELS = [
     "american_radio.png",
@@ -1567,21 +1572,44 @@ SUGGESTED_FILTERS = [
 DOWNLOAD_URL = "https://github.com/Grimm1/cod2xmodelimages/archive/refs/heads/main.zip"
 INNER_FOLDER_NAME = "cod2xmodelimages-main"
 
+# How often (ms) the UI takes progress from a running thumbnail render
+RENDER_POLL_MS = 100
+
+# Thumbnails are opened and resized on these threads; the Tk thread only makes the PhotoImages,
+# at most THUMB_BATCH per tick every THUMB_POLL_MS
+THUMB_SIZE = 220
+THUMB_WORKERS = 4
+THUMB_POLL_MS = 15
+THUMB_BATCH = 6
+
 class ModelViewerTab(ttk.Frame):
-    def __init__(self, parent):
+    def __init__(self, parent, app=None):
         super().__init__(parent)
-        self.models = sorted(MODELS)
-        self.filtered = self.models[:]
+        self.app = app
+        self.filtered = []
         self.current_filter = ""
         self.page = 1
         self.per_page = 30
         self.thumb_cache = {}
         self.current_full = None
+        self.render_btn = None
+        self._render_events = None
+        self._render_cancel = None
+
+        self._thumb_pool = ThreadPoolExecutor(max_workers=THUMB_WORKERS, thread_name_prefix="thumb")
+        self._thumb_results = queue.Queue()
+        self._thumb_futures = []
+        self._thumb_labels = {}  # filename -> image label on the current page
+        self._page_token = 0
+        self._thumb_draining = False
+        self._placeholder = None
 
         self.script_dir = Path(__file__).parent.parent
         self.thumb_dir = self.script_dir / "thumbnails"
         self.xmodel_dir = self.script_dir / "xmodel"
 
+        self.models = self.load_model_names()
+        self.filtered = self.models[:]
         self.images_ready = self.check_images_ready()
 
         self.create_widgets()
@@ -1589,9 +1617,19 @@ class ModelViewerTab(ttk.Frame):
         if self.images_ready:
             self.render_page()
 
+    def load_model_names(self):
+        """Stock model list plus any rendered model (e.g. custom ones) with a thumbnail"""
+        names = set(MODELS)
+        if self.thumb_dir.exists():
+            names.update(p.name for p in self.thumb_dir.glob("*.png"))
+        return sorted(names)
+
     def check_images_ready(self):
         if not self.thumb_dir.exists() or not self.xmodel_dir.exists():
             return False
+        # A finished render of every model, or a full image set from before the renderer
+        if images_complete(self.thumb_dir):
+            return True
         thumb_count = len(list(self.thumb_dir.glob("*.png")))
         xmodel_count = len(list(self.xmodel_dir.glob("*.png")))
         return thumb_count > 100 and xmodel_count > 100
@@ -1604,6 +1642,7 @@ class ModelViewerTab(ttk.Frame):
         left = ttk.Frame(main_container, width=900)
         left.pack(side="left", fill="y")
         left.pack_propagate(False)
+        self.left_panel = left
 
         if self.images_ready:
             self.build_normal_ui(left)
@@ -1638,7 +1677,7 @@ class ModelViewerTab(ttk.Frame):
             )
         else:
             self.full_label.config(
-                text="Model images not installed yet.\nDownload them from the left panel to enable previews.",
+                text="Model images not installed yet.\nDownload or render them from the left panel to enable previews.",
                 foreground="#888",
                 font=("Segoe UI", 16),
                 justify="center"
@@ -1671,6 +1710,8 @@ class ModelViewerTab(ttk.Frame):
         self.page_label = ttk.Label(pag_frame, text="", foreground="#ccc", font=("Segoe UI", 11))
         self.page_label.pack(side="left", padx=50)
         ttk.Button(pag_frame, text="Next", command=self.next_page).pack(side="left")
+        self.render_btn = ttk.Button(pag_frame, text="Render new/custom models", command=self.render_images)
+        self.render_btn.pack(side="right")
 
         # ── FIXED SCROLLABLE THUMBNAIL GRID (full height/width scrollbars, no truncation) ──
         thumb_container = ttk.Frame(parent)
@@ -1719,6 +1760,95 @@ class ModelViewerTab(ttk.Frame):
         for c in range(3):
             self.grid_frame.grid_columnconfigure(c, weight=1, uniform="col")
 
+    def build_setup_ui(self, parent):
+        ttk.Label(parent, text="Model preview images are not installed",
+                  font=("Segoe UI", 14, "bold")).pack(pady=(60, 20))
+        ttk.Label(parent, text="Download the prerendered stock images (~500-600MB),\n"
+                               "or render previews of every stock and custom model from your CoD2 files.",
+                  justify="center", font=("Segoe UI", 11)).pack(pady=(0, 30))
+        ttk.Button(parent, text="Download images", command=self.download_images, width=40).pack(pady=6)
+        self.render_btn = ttk.Button(parent, text="Render from game files", command=self.render_images, width=40)
+        self.render_btn.pack(pady=6)
+
+    def render_images(self):
+        """Renders previews of models without up-to-date images; a second click cancels"""
+        if self._render_cancel is not None:
+            self._render_cancel.set()
+            self.status_label.config(text="Cancelling after the current batch...")
+            return
+        if self.app is None:
+            return
+        cod2_path = Path(self.app.cod2_path.get())
+        if not cod2_path.is_dir():
+            messagebox.showerror("Path Error", "CoD2 path not valid")
+            return
+
+        events = queue.Queue()
+        cancel = threading.Event()
+        self._render_events = events
+        self._render_cancel = cancel
+
+        def worker():
+            try:
+                result = render_thumbnails(cod2_path, thumb_dir=self.thumb_dir, full_dir=self.xmodel_dir,
+                                           on_total=lambda n: events.put(("total", n)),
+                                           on_model=lambda r: events.put(("model", r)), cancel=cancel)
+                events.put(("done", result))
+            except Exception as e:
+                events.put(("error", e))
+
+        threading.Thread(target=worker, daemon=True).start()
+        self.render_btn.config(text="Cancel rendering")
+        self.status_label.config(text="Listing models...")
+        self.after(RENDER_POLL_MS, self.drain_render_events, events, {"total": 0, "done": 0})
+
+    def drain_render_events(self, events, progress):
+        if events is not self._render_events:
+            return
+        while True:
+            try:
+                kind, value = events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "total":
+                progress["total"] = value
+            elif kind == "model":
+                progress["done"] += 1
+                self.thumb_cache.pop(f"{value['name']}.png", None)
+            else:
+                self.finish_render(kind, value)
+                return
+        self.status_label.config(text=f"Rendering models: {progress['done']} / {progress['total']}")
+        self.after(RENDER_POLL_MS, self.drain_render_events, events, progress)
+
+    def finish_render(self, kind, value):
+        self._render_events = None
+        self._render_cancel = None
+        self.render_btn.config(text="Render new/custom models" if self.images_ready else "Render from game files")
+        if kind == "error":
+            self.status_label.config(text="")
+            messagebox.showerror("Render Failed", str(value))
+            return
+
+        result = value
+        self.status_label.config(text=f"{len(result['rendered'])} rendered, {len(result['failed'])} failed"
+                                      + (" (cancelled)" if result["cancelled"] else ""))
+        self.after(5000, lambda: self.status_label.config(text=""))
+        if result["failed"]:
+            print(f"[Thumbnails] Failed: {', '.join(sorted(result['failed'])[:20])}")
+        for name, warning in sorted(result["warnings"].items())[:20]:
+            print(f"[Thumbnails] {name}: {warning}")
+
+        self.models = self.load_model_names()
+        if not self.images_ready and self.check_images_ready():
+            self.images_ready = True
+            for widget in self.left_panel.winfo_children():
+                widget.destroy()
+            self.build_normal_ui(self.left_panel)
+            self.full_label.config(text="Select a model thumbnail on the left\nto view the full-size preview here")
+        if self.images_ready:
+            self.apply_filters()
+
     def add_filter_button(self, parent, text, query):
         btn = ttk.Button(parent, text=text, command=lambda q=query: self.set_filter(q))
         btn.grid(row=self.filter_row, column=self.filter_col, padx=4, pady=4, sticky="w")
@@ -1803,6 +1933,13 @@ class ModelViewerTab(ttk.Frame):
         for widget in self.grid_frame.winfo_children():
             widget.destroy()
 
+        # Drop the previous page's decodes that have not started; results of running ones are ignored
+        for future in self._thumb_futures:
+            future.cancel()
+        self._thumb_futures = []
+        self._thumb_labels = {}
+        self._page_token += 1
+
         start = (self.page - 1) * self.per_page
         end = start + self.per_page
         page_items = self.filtered[start:end]
@@ -1814,10 +1951,15 @@ class ModelViewerTab(ttk.Frame):
             frame = ttk.Frame(self.grid_frame, relief="ridge", borderwidth=2, padding=12)
             frame.grid(row=row, column=col, padx=12, pady=12, sticky="nsew")
 
-            photo = self.get_thumbnail(name)
-            img_label = ttk.Label(frame, image=photo, background="#f0f0f0")
-            img_label.image = photo
+            # Cached thumbnails show at once; the rest start as placeholders and are decoded off-thread
+            photo = self.thumb_cache.get(name)
+            img_label = ttk.Label(frame, image=photo or self.get_placeholder(), background="#f0f0f0")
+            img_label.image = photo or self.get_placeholder()
             img_label.pack()
+            if photo is None:
+                self._thumb_labels[name] = img_label
+                self._thumb_futures.append(
+                    self._thumb_pool.submit(self.decode_thumbnail, name, self._page_token))
 
             name_label = ttk.Label(frame, text=name.replace(".png", ""), foreground="#ccc",
                                    background="#2d2d2d", font=("Segoe UI", 9), anchor="center")
@@ -1836,25 +1978,53 @@ class ModelViewerTab(ttk.Frame):
         total_pages = max(1, (len(self.filtered) + self.per_page - 1) // self.per_page)
         self.page_label.config(text=f"Page {self.page} / {total_pages}  •  {len(self.filtered)} models total")
 
-    def get_thumbnail(self, filename):
-        if filename in self.thumb_cache:
-            return self.thumb_cache[filename]
+        if self._thumb_futures and not self._thumb_draining:
+            self._thumb_draining = True
+            self.after(THUMB_POLL_MS, self.drain_thumbnails)
+
+    def destroy(self):
+        self._thumb_pool.shutdown(wait=False, cancel_futures=True)
+        super().destroy()
 
+    def get_placeholder(self):
+        if self._placeholder is None:
+            self._placeholder = ImageTk.PhotoImage(Image.new("RGB", (THUMB_SIZE, THUMB_SIZE), "#333333"))
+        return self._placeholder
+
+    def decode_thumbnail(self, filename, token):
+        """Worker thread: opens and resizes one thumbnail (None if missing or unreadable)"""
+        img = None
         path = self.thumb_dir / filename
         if path.exists():
             try:
-                img = Image.open(path)
-                img = img.resize((220, 220), Image.LANCZOS)
-                photo = ImageTk.PhotoImage(img)
-                self.thumb_cache[filename] = photo
-                return photo
+                with Image.open(path) as src:
+                    img = src.resize((THUMB_SIZE, THUMB_SIZE), Image.LANCZOS)
             except Exception as e:
                 print(f"Thumb error {filename}: {e}")
+        self._thumb_results.put((token, filename, img))
 
-        img = Image.new("RGB", (220, 220), "#333333")
-        photo = ImageTk.PhotoImage(img)
-        self.thumb_cache[filename] = photo
-        return photo
+    def drain_thumbnails(self):
+        """Tk thread: swaps decoded thumbnails in for their placeholders, a few per tick"""
+        for _ in range(THUMB_BATCH):
+            try:
+                token, filename, img = self._thumb_results.get_nowait()
+            except queue.Empty:
+                break
+            if token != self._page_token:
+                continue  # from a page that is no longer shown
+
+            photo = ImageTk.PhotoImage(img) if img is not None else self.get_placeholder()
+            self.thumb_cache[filename] = photo
+            label = self._thumb_labels.pop(filename, None)
+            if label is not None and label.winfo_exists():
+                label.config(image=photo)
+                label.image = photo
+
+        if self._thumb_labels:
+            self.after(THUMB_POLL_MS, self.drain_thumbnails)
+        else:
+            self._thumb_futures = []
+            self._thumb_draining = False
 
     def show_full(self, filename):
         self.current_full = filename
@@ -7,6 +7,8 @@ import zipfile
 import os
 import shutil
 
+from vfs import get_game_fs
+
 class ToolsSetupTab(ttk.Frame):
     def __init__(self, parent, app):
         super().__init__(parent)
@@ -150,6 +152,8 @@ class ToolsSetupTab(ttk.Frame):
         xmodels_path = Path(self.cod2_path) / "main" / "xmodel"
         if xmodels_path.exists():
             self.xmodel_status.config(text="✓ Exists", foreground="green")
+        elif get_game_fs(self.cod2_path).archived_paths("xmodel/"):
+            self.xmodel_status.config(text="✓ Read from IWDs (extract only for Radiant/Asset Manager)", foreground="green")
         else:
             self.xmodel_status.config(text="✗ Missing (need to extract)", foreground="red")
 
@@ -161,6 +165,8 @@ class ToolsSetupTab(ttk.Frame):
         fx_path = Path(self.cod2_path) / "main" / "fx"
         if fx_path.exists():
             self.fx_status.config(text="✓ Exists", foreground="green")
+        elif get_game_fs(self.cod2_path).archived_paths("fx/"):
+            self.fx_status.config(text="✓ Read from IWDs (extract only for Radiant/EffectsEd)", foreground="green")
         else:
             self.fx_status.config(text="✗ Missing (need to extract)", foreground="red")
 
@@ -0,0 +1,277 @@
+# vfs.py
+"""
+Read-only view of the game files in raw/, main/ and every main/iw_*.iwd.
+
+Only the IWD central directories are read. They are indexed once, in game
+search order, and the index is cached under CACHE_DIR, stamped with each
+archive's size and mtime. Members are read on demand by seeking to their
+local header, so nothing has to be extracted.
+
+Lookup order: loose files in raw/ and then main/ come first, so
+work-in-progress assets shadow stock ones. The IWDs come next, and an archive
+that sorts later wins (iw_15 over iw_00), as in the game.
+
+get_game_fs() re-stamps the IWDs at most every STALE_CHECK_SECONDS, so hot
+lookup loops (and pool workers) do not glob and stat main/ on every call.
+"""
+
+from pathlib import Path
+import hashlib
+import marshal
+import os
+import sys
+import threading
+import time
+import zipfile
+import zlib
+from typing import Dict, List, Optional
+
+from config import CACHE_DIR
+from iwd_writer import iter_raw_member
+
+ARCHIVE_PATTERN = "iw_*.iwd"
+LOOSE_ROOTS = ("raw", "main")
+
+_INDEX_FORMAT = 1
+# Minimum time between two is_stale() checks of a cached GameFileSystem
+STALE_CHECK_SECONDS = 2.0
+# Compressed bytes read at a time by VfsEntry.read_head()
+HEAD_CHUNK_SIZE = 4096
+
+
+class VfsEntry:
+    """A resolved game path: either a loose file or a member of an IWD"""
+
+    __slots__ = ("game_path", "source", "member", "size", "crc",
+                 "compress_type", "compress_size", "header_offset", "mtime")
+
+    def __init__(self, game_path: str, source: Path, member: str = None, size: int = 0, crc: int = 0,
+                 compress_type: int = zipfile.ZIP_STORED, compress_size: int = 0,
+                 header_offset: int = 0, mtime: int = 0):
+        self.game_path = game_path
+        self.source = source
+        self.member = member
+        self.size = size
+        self.crc = crc
+        self.compress_type = compress_type
+        self.compress_size = compress_size
+        self.header_offset = header_offset
+        self.mtime = mtime
+
+    @classmethod
+    def from_file(cls, path: Path, game_path: str = None) -> "VfsEntry":
+        """Entry for a loose file on disk"""
+        path = Path(path)
+        st = os.stat(path)
+        return cls(game_path or path.name, path, size=st.st_size, mtime=st.st_mtime_ns)
+
+    @property
+    def is_loose(self) -> bool:
+        return self.member is None
+
+    @property
+    def cache_key(self) -> str:
+        """Stable key for caching parse results of this file"""
+        if self.is_loose:
+            return str(self.source)
+        return f"{self.source}/{self.member}"
+
+    @property
+    def stamp(self) -> tuple:
+        """Changes whenever the content does: (size, mtime) for loose files, (size, crc) for members"""
+        if self.is_loose:
+            return self.size, self.mtime
+        return self.size, self.crc
+
+    def read_bytes(self) -> bytes:
+        if self.is_loose:
+            return self.source.read_bytes()
+        zinfo = zipfile.ZipInfo(self.member)
+        zinfo.header_offset = self.header_offset
+        zinfo.compress_size = self.compress_size
+        with open(self.source, "rb") as fp:
+            data = b"".join(iter_raw_member(fp, zinfo))
+        if self.compress_type == zipfile.ZIP_DEFLATED:
+            data = zlib.decompress(data, -15)
+        elif self.compress_type != zipfile.ZIP_STORED:
+            raise zipfile.BadZipFile(f"{self.member}: unsupported compression {self.compress_type}")
+        if len(data) != self.size:
+            raise zipfile.BadZipFile(f"{self.member}: size mismatch in {self.source.name}")
+        return data
+
+    def read_head(self, size: int) -> bytes:
+        """The first `size` bytes (fewer if the file is shorter), inflating only as much as needed"""
+        if self.is_loose:
+            with open(self.source, "rb") as f:
+                return f.read(size)
+        zinfo = zipfile.ZipInfo(self.member)
+        zinfo.header_offset = self.header_offset
+        zinfo.compress_size = self.compress_size
+        with open(self.source, "rb") as fp:
+            if self.compress_type == zipfile.ZIP_STORED:
+                data = b""
+                for chunk in iter_raw_member(fp, zinfo, HEAD_CHUNK_SIZE):
+                    data += chunk
+                    if len(data) >= size:
+                        break
+                return data[:size]
+            if self.compress_type != zipfile.ZIP_DEFLATED:
+                raise zipfile.BadZipFile(f"{self.member}: unsupported compression {self.compress_type}")
+            inflater = zlib.decompressobj(-15)
+            data = b""
+            for chunk in iter_raw_member(fp, zinfo, HEAD_CHUNK_SIZE):
+                data += inflater.decompress(chunk, size - len(data))
+                if len(data) >= size or inflater.eof:
+                    break
+            return data
+
+    def __repr__(self):
+        where = self.source if self.is_loose else f"{self.source.name}:{self.member}"
+        return f"VfsEntry({self.game_path!r} -> {where})"
+
+
+def _archive_stamp(main_dir: Path) -> tuple:
+    stamp = []
+    for path in sorted(main_dir.glob(ARCHIVE_PATTERN), key=lambda p: p.name.lower()):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        stamp.append((str(path), st.st_size, st.st_mtime_ns))
+    return tuple(stamp)
+
+
+def _read_central_directories(stamp: tuple) -> Dict[str, tuple]:
+    """
+    Maps lower-cased member names to (archive index, name, header_offset,
+    compress_type, compress_size, file_size, crc). Later archives override earlier ones.
+    """
+    members: Dict[str, tuple] = {}
+    for idx, (archive, _size, _mtime) in enumerate(stamp):
+        try:
+            with zipfile.ZipFile(archive) as zf:
+                infos = zf.infolist()
+        except (OSError, zipfile.BadZipFile) as e:
+            print(f"[WARNING] Skipping unreadable IWD {archive}: {e}")
+            continue
+        for zi in infos:
+            if zi.is_dir():
+                continue
+            members[zi.filename.lower()] = (
+                idx, zi.filename, zi.header_offset, zi.compress_type,
+                zi.compress_size, zi.file_size, zi.CRC
+            )
+    return members
+
+
+def _index_path(main_dir: Path) -> Path:
+    digest = hashlib.sha1(os.path.abspath(main_dir).encode("utf-8")).hexdigest()[:12]
+    return CACHE_DIR / f"vfs_index_{digest}.marshal"
+
+
+def _load_or_build_index(main_dir: Path, stamp: tuple) -> Dict[str, tuple]:
+    header = (_INDEX_FORMAT, sys.version_info[:2], stamp)
+    index_path = _index_path(main_dir)
+
+    try:
+        with open(index_path, "rb") as f:
+            blob = marshal.load(f)
+        if blob[0] == header:
+            return blob[1]
+    except (OSError, EOFError, ValueError, TypeError, IndexError):
+        pass
+
+    members = _read_central_directories(stamp)
+    try:
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = index_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            marshal.dump((header, members), f)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        print(f"[WARNING] Could not write IWD index cache: {e}")
+    return members
+
+
+class GameFileSystem:
+    def __init__(self, cod2_path: Path):
+        self.cod2_path = Path(cod2_path)
+        self.main_dir = self.cod2_path / "main"
+        self._roots = [self.cod2_path / base for base in LOOSE_ROOTS]
+        self._stamp = _archive_stamp(self.main_dir)
+        self._archives = [Path(archive) for archive, _size, _mtime in self._stamp]
+        self._members = _load_or_build_index(self.main_dir, self._stamp)
+        self.checked_at = time.monotonic()
+
+    def is_stale(self) -> bool:
+        """True if an IWD was added, removed or modified since the index was built"""
+        return _archive_stamp(self.main_dir) != self._stamp
+
+    @property
+    def archive_stamp(self) -> tuple:
+        """(path, size, mtime) of every indexed IWD, lowest priority first"""
+        return self._stamp
+
+    @property
+    def archives(self) -> List[Path]:
+        """Indexed IWDs, lowest priority first"""
+        return list(self._archives)
+
+    def resolve(self, game_path: str) -> Optional[VfsEntry]:
+        """Finds game_path (e.g. 'xmodel/foo') as a loose file or IWD member, or returns None"""
+        game_path = game_path.replace("\\", "/").lstrip("/")
+        for root in self._roots:
+            loose = root / game_path
+            try:
+                st = os.stat(loose)
+            except OSError:
+                continue
+            if os.path.isfile(loose):
+                return VfsEntry(game_path, loose, size=st.st_size, mtime=st.st_mtime_ns)
+        return self.resolve_archived(game_path)
+
+    def resolve_archived(self, game_path: str) -> Optional[VfsEntry]:
+        """Like resolve() but only looks inside the IWDs"""
+        info = self._members.get(game_path.replace("\\", "/").lstrip("/").lower())
+        if info is None:
+            return None
+        idx, name, header_offset, compress_type, compress_size, file_size, crc = info
+        return VfsEntry(game_path, self._archives[idx], name, file_size, crc,
+                        compress_type, compress_size, header_offset)
+
+    def exists(self, game_path: str) -> bool:
+        return self.resolve(game_path) is not None
+
+    def read_bytes(self, game_path: str) -> Optional[bytes]:
+        entry = self.resolve(game_path)
+        return entry.read_bytes() if entry else None
+
+    def archived_paths(self, prefix: str = "") -> List[str]:
+        """Sorted game paths of all IWD members starting with prefix (case-insensitive)"""
+        prefix = prefix.lower()
+        return sorted(info[1] for key, info in self._members.items() if key.startswith(prefix))
+
+
+_filesystems: Dict[str, GameFileSystem] = {}
+_lock = threading.Lock()
+
+
+def get_game_fs(cod2_path, revalidate: bool = False) -> GameFileSystem:
+    """
+    Returns a cached view of this install, re-indexing the IWDs only if they
+    changed. They are checked at most every STALE_CHECK_SECONDS, or right away
+    with revalidate=True (done once at the start of an analysis).
+    """
+    key = os.path.abspath(cod2_path)
+    now = time.monotonic()
+    with _lock:
+        fs = _filesystems.get(key)
+        if fs is not None and (revalidate or now - fs.checked_at >= STALE_CHECK_SECONDS):
+            if fs.is_stale():
+                fs = None
+            else:
+                fs.checked_at = now
+        if fs is None:
+            fs = GameFileSystem(Path(key))
+            _filesystems[key] = fs
+        return fs
@@ -0,0 +1,97 @@
+# worker_pool.py
+"""
+Shared process pool for CPU-bound parsing (maps, prefabs, xmodels, materials).
+
+The pool is created on first use and kept for the life of the process, so
+repeated analyses do not pay the worker start-up cost again. Small batches
+run inline, where a round-trip to the pool would cost more than it saves.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import os
+import threading
+
+# Batches smaller than this are not worth sending to the pool
+MIN_PARALLEL_ITEMS = 4
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def default_jobs() -> int:
+    return os.cpu_count() or 1
+
+
+def get_process_pool(jobs: int = None) -> ProcessPoolExecutor:
+    """Returns the shared pool, recreating it if a different size is requested"""
+    global _pool, _pool_workers
+    jobs = jobs or default_jobs()
+    with _pool_lock:
+        if _pool is None or _pool_workers != jobs:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=jobs)
+            _pool_workers = jobs
+        return _pool
+
+
+def _discard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+
+
+def parallel_map(func, *iterables, jobs: int = None, min_items: int = MIN_PARALLEL_ITEMS) -> list:
+    """
+    Like map(func, *iterables) but spread across the shared process pool.
+    Results come back in input order. func must be a picklable top-level function.
+    Fewer than min_items calls run inline; pass min_items=1 when each call is
+    heavy enough to be worth a worker on its own.
+    """
+    args = list(zip(*iterables))
+    jobs = jobs or default_jobs()
+    if jobs <= 1 or len(args) < min_items:
+        return [func(*a) for a in args]
+
+    workers = min(jobs, len(args))
+    chunksize = max(1, len(args) // (workers * 4))
+    try:
+        pool = get_process_pool(jobs)
+        return list(pool.map(func, *zip(*args), chunksize=chunksize))
+    except (BrokenProcessPool, OSError) as e:
+        print(f"[WARNING] Worker pool failed, continuing serially: {e}")
+        _discard_pool()
+        return [func(*a) for a in args]
+
+
+def imap_bounded(func, *iterables, jobs: int = None, window: int = None):
+    """
+    Lazily yields func(*args) in input order, computed on the shared pool with at
+    most `window` tasks in flight (default: 2 per worker). Use this instead of
+    parallel_map when results are large and should be consumed as they arrive.
+    """
+    jobs = jobs or default_jobs()
+    if jobs <= 1:
+        for args in zip(*iterables):
+            yield func(*args)
+        return
+
+    window = window or jobs * 2
+    pool = get_process_pool(jobs)
+    pending = deque()
+    try:
+        for args in zip(*iterables):
+            pending.append(pool.submit(func, *args))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Abandoned or failed: don't leave queued work behind
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,112 @@
+# xmodel_parts.py
+"""
+Reader for CoD2 xmodelparts files (the skeleton shared by a model's LODs).
+
+Layout (little-endian):
+
+    uint16  version                 # 20
+    uint16  relative_count          # bones with a parent and a local transform
+    uint16  absolute_count          # root bones, at the model origin
+    per relative bone:
+        int8    parent              # index into all bones
+        float   offset[3]
+        int16   rotation[3]         # quaternion x, y, z * 32767; w >= 0 is implied
+    char    names[absolute_count + relative_count][]
+    ...part classification (ignored)...
+
+Root bones come first in bone order, so bone i >= absolute_count is relative
+bone i - absolute_count. Vertices in xmodelsurfs are stored relative to their
+bone; bone_transforms() gives what places them in model space.
+"""
+
+import struct
+from typing import Tuple
+
+import numpy as np
+
+XMODELPARTS_VERSION = 20
+MAX_BONES = 128
+
+_FILE_HEADER = struct.Struct("<HHH")
+_RELATIVE_BONE = np.dtype([("parent", "i1"), ("offset", "<f4", 3), ("rotation", "<i2", 3)])
+
+
+class XModelPartsFormatError(ValueError):
+    pass
+
+
+def read_xmodelparts(data: bytes) -> dict:
+    """
+    Decodes the bone hierarchy.
+
+    Returns:
+        dict with:
+            names: list[str]            # every bone, roots first
+            parents: np.ndarray         # (bones,) int; -1 for roots
+            offsets: np.ndarray         # (bones, 3) float32, relative to the parent
+            quats: np.ndarray           # (bones, 4) float32 x, y, z, w, relative to the parent
+    """
+    if len(data) < _FILE_HEADER.size:
+        raise XModelPartsFormatError("file too short")
+    version, relative_count, absolute_count = _FILE_HEADER.unpack_from(data)
+    if version != XMODELPARTS_VERSION:
+        raise XModelPartsFormatError(f"unsupported version {version}")
+    total = relative_count + absolute_count
+    if not 0 < total <= MAX_BONES:
+        raise XModelPartsFormatError(f"bad bone count {total}")
+
+    pos = _FILE_HEADER.size
+    end = pos + relative_count * _RELATIVE_BONE.itemsize
+    if end > len(data):
+        raise XModelPartsFormatError("bone data truncated")
+    relative = np.frombuffer(data, dtype=_RELATIVE_BONE, count=relative_count, offset=pos)
+    pos = end
+
+    names = []
+    for _ in range(total):
+        name_end = data.find(b"\0", pos)
+        if name_end < 0:
+            raise XModelPartsFormatError("bone names truncated")
+        names.append(data[pos:name_end].decode("ascii", "replace"))
+        pos = name_end + 1
+
+    parents = np.full(total, -1, dtype=np.int64)
+    offsets = np.zeros((total, 3), dtype=np.float32)
+    quats = np.zeros((total, 4), dtype=np.float32)
+    quats[:, 3] = 1
+    parents[absolute_count:] = relative["parent"]
+    offsets[absolute_count:] = relative["offset"]
+    xyz = relative["rotation"].astype(np.float32) / 32767
+    quats[absolute_count:, :3] = xyz
+    quats[absolute_count:, 3] = np.sqrt(np.clip(1 - (xyz * xyz).sum(axis=1), 0, 1))
+
+    for i in range(absolute_count, total):
+        if not 0 <= parents[i] < i:
+            raise XModelPartsFormatError(f"bone {i} has bad parent {parents[i]}")
+
+    return {"names": names, "parents": parents, "offsets": offsets, "quats": quats}
+
+
+def _quat_matrices(q: np.ndarray) -> np.ndarray:
+    """(N, 4) x, y, z, w quaternions -> (N, 3, 3) rotation matrices"""
+    x, y, z, w = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], axis=-1),
+        np.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], axis=-1),
+        np.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], axis=-1),
+    ], axis=1)
+
+
+def bone_transforms(parts: dict) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Model-space pose of every bone: (bones, 3, 3) rotations and (bones, 3)
+    translations, so a bone-relative point p is at rotation @ p + translation.
+    """
+    local = _quat_matrices(parts["quats"])
+    rotations = local.copy()
+    translations = parts["offsets"].astype(np.float32).copy()
+    for i, parent in enumerate(parts["parents"]):
+        if parent >= 0:     # parents always come first
+            rotations[i] = rotations[parent] @ local[i]
+            translations[i] = rotations[parent] @ parts["offsets"][i] + translations[parent]
+    return rotations, translations
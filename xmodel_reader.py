@@ -0,0 +1,186 @@
+# xmodel_reader.py
+"""
+Structured reader for CoD2 xmodel files.
+
+Layout (little-endian):
+
+    uint16  version                         # 20 for CoD2
+    uint8   flags
+    float   mins[3], maxs[3]                # bounds
+    4 x { float distance; char name[] }     # LOD table; unused LODs have an empty name
+    int32   collision_lod                   # -1: no collision
+    ...collision surfaces (variable size)...
+    per LOD: uint16 count; char material[count][]   # last thing in the file
+
+Each LOD name is an xmodelsurfs file; the skeleton (xmodelparts) is shared by
+all LODs and named after LOD 0. Only the first HEAD_BYTES and last TAIL_BYTES
+of a loose file are read.
+"""
+
+import math
+import re
+import struct
+from typing import List, Optional
+
+from vfs import VfsEntry
+
+XMODEL_VERSION = 20
+MAX_LODS = 4
+MAX_NAME = 64
+MAX_MATERIALS_PER_LOD = 64
+HEAD_BYTES = 512
+TAIL_BYTES = 4096
+
+_BOUNDS = struct.Struct("<HB6f")
+_FLOAT = struct.Struct("<f")
+_INT = struct.Struct("<i")
+_NAME_RE = re.compile(rb"[A-Za-z0-9_~/\.&\-]*\Z")
+
+
+class XModelFormatError(ValueError):
+    pass
+
+
+def _read_name(buf: bytes, pos: int):
+    end = buf.find(b"\0", pos, pos + MAX_NAME + 1)
+    if end < 0:
+        raise XModelFormatError(f"unterminated name at offset {pos}")
+    raw = buf[pos:end]
+    if not _NAME_RE.match(raw):
+        raise XModelFormatError(f"invalid name at offset {pos}")
+    return raw.decode("ascii"), end + 1
+
+
+def parse_xmodel_header(head: bytes) -> dict:
+    """
+    Parses the fixed part of an xmodel: version, bounds, LOD table and collision LOD.
+
+    Returns:
+        dict with:
+            version: int
+            bounds: list[list[float]]       # [mins, maxs]
+            lods: list[dict]                # {"name": str, "distance": float}, used LODs only
+            collision_lod: int              # -1 if the model has no collision
+            header_size: int                # bytes consumed
+    """
+    if len(head) < _BOUNDS.size:
+        raise XModelFormatError("file too short")
+    version, _flags, *bounds = _BOUNDS.unpack_from(head)
+    if version != XMODEL_VERSION:
+        raise XModelFormatError(f"unsupported version {version}")
+    if not all(math.isfinite(v) for v in bounds):
+        raise XModelFormatError("corrupt bounds")
+
+    pos = _BOUNDS.size
+    lods = []
+    for _ in range(MAX_LODS):
+        if pos + _FLOAT.size > len(head):
+            raise XModelFormatError("LOD table truncated")
+        (distance,) = _FLOAT.unpack_from(head, pos)
+        name, pos = _read_name(head, pos + _FLOAT.size)
+        if not name:
+            continue
+        if not math.isfinite(distance) or distance < 0 or (lods and distance < lods[-1]["distance"]):
+            raise XModelFormatError(f"bad LOD distance {distance}")
+        lods.append({"name": name, "distance": distance})
+    if not lods:
+        raise XModelFormatError("no LODs")
+
+    if pos + _INT.size > len(head):
+        raise XModelFormatError("header truncated")
+    (collision_lod,) = _INT.unpack_from(head, pos)
+    if not -1 <= collision_lod < len(lods):
+        raise XModelFormatError(f"bad collision LOD {collision_lod}")
+
+    return {
+        "version": version,
+        "bounds": [list(bounds[:3]), list(bounds[3:])],
+        "lods": lods,
+        "collision_lod": collision_lod,
+        "header_size": pos + _INT.size,
+    }
+
+
+def _parse_material_blocks(buf: bytes, pos: int, lod_count: int) -> Optional[List[List[str]]]:
+    blocks = []
+    try:
+        for _ in range(lod_count):
+            if pos + 2 > len(buf):
+                return None
+            count = buf[pos] | (buf[pos + 1] << 8)
+            if not 0 < count <= MAX_MATERIALS_PER_LOD:
+                return None
+            pos += 2
+            names = []
+            for _ in range(count):
+                name, pos = _read_name(buf, pos)
+                if not name:
+                    return None
+                names.append(name)
+            blocks.append(names)
+    except XModelFormatError:
+        return None
+    return blocks if pos == len(buf) else None
+
+
+def parse_material_table(tail: bytes, lod_count: int) -> Optional[List[List[str]]]:
+    """
+    Finds the per-LOD material table at the end of the file. The collision data
+    before it has no fixed size, so the table is located by trying each start
+    offset from the end until one parses exactly up to the last byte.
+    Returns one list of material names per LOD, or None.
+    """
+    if not tail.endswith(b"\0"):
+        return None
+    # A count is 1..64, so its high byte is 0: only offsets just before a zero byte are tried
+    end = len(tail)
+    while True:
+        zero = tail.rfind(b"\0", 1, end)
+        if zero < 0:
+            return None
+        if 0 < tail[zero - 1] <= MAX_MATERIALS_PER_LOD:
+            blocks = _parse_material_blocks(tail, zero - 1, lod_count)
+            if blocks is not None:
+                return blocks
+        end = zero
+
+
+def _read_head_tail(entry: VfsEntry, head_size: int, tail_size: int):
+    """First and last bytes of the file plus the tail's offset; loose files are not read in full"""
+    if entry.is_loose and entry.size > head_size + tail_size:
+        with open(entry.source, "rb") as f:
+            head = f.read(head_size)
+            tail_offset = f.seek(-tail_size, 2)
+            return head, f.read(), tail_offset
+    data = entry.read_bytes()
+    return data[:head_size], data, 0
+
+
+def read_xmodel(entry: VfsEntry) -> dict:
+    """
+    Reads an xmodel's header and material table.
+
+    Returns:
+        dict with:
+            version, bounds, lods, collision_lod    # see parse_xmodel_header()
+            surfs: list[str]                        # xmodelsurfs names, LOD 0 first
+            parts: str                              # xmodelparts name
+            materials: list[str]                    # all LODs, first use first
+            lod_materials: list[list[str]]          # per LOD ([] if the table wasn't found)
+    Raises XModelFormatError if the header is not a CoD2 xmodel.
+    """
+    head, tail, tail_offset = _read_head_tail(entry, HEAD_BYTES, TAIL_BYTES)
+    info = parse_xmodel_header(head)
+    header_size = info.pop("header_size")
+    if tail_offset < header_size:
+        tail = tail[header_size - tail_offset:]
+    lods = info["lods"]
+
+    lod_materials = parse_material_table(tail, len(lods)) or [[] for _ in lods]
+    info.update({
+        "surfs": list(dict.fromkeys(lod["name"] for lod in lods)),
+        "parts": lods[0]["name"],
+        "materials": list(dict.fromkeys(m for block in lod_materials for m in block)),
+        "lod_materials": lod_materials,
+    })
+    return info
@@ -0,0 +1,190 @@
+# xmodel_render.py
+"""
+CPU renderer for xmodel previews.
+
+load_xmodel_mesh() reads a model's LOD geometry from its xmodelsurfs and
+places every vertex in model space with the bone poses from its xmodelparts.
+render_mesh() draws the mesh flat-shaded with a z-buffer, entirely in NumPy:
+triangles are grouped by the size of their screen bounding box, every pixel
+centre of each group is tested against all of its triangles at once, and the
+nearest fragment per pixel wins.
+"""
+
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from vfs import get_game_fs
+from xmodel_parts import XModelPartsFormatError, bone_transforms, read_xmodelparts
+from xmodel_reader import read_xmodel
+from xmodel_surfs import read_xmodelsurfs
+
+# Camera: three-quarter view from the model's front left, looking down a little
+VIEW_YAW = 35.0
+VIEW_PITCH = 25.0
+LIGHT_DIRECTION = (0.4, 0.6, 0.7)       # towards the light, in view space (right, up, to camera)
+AMBIENT = 0.35
+BASE_COLOR = (200, 196, 188)
+MARGIN = 0.06                           # of the image size, on each side
+
+# Upper bound on pixel tests per batch: triangles x box width x box height
+_RASTER_BATCH = 1 << 22
+
+
+def load_xmodel_mesh(cod2_path, name: str, lod: int = 0) -> Tuple[np.ndarray, np.ndarray, Optional[str]]:
+    """
+    Model-space geometry of one LOD of xmodel/<name> (loose or inside an IWD).
+    Vertices stay bone-relative when the xmodelparts file is missing or unreadable.
+
+    Returns:
+        (vertices (V, 3) float32, triangles (T, 3) int64, skeleton_error)
+        skeleton_error is None, or why an unreadable xmodelparts file was ignored
+    Raises FileNotFoundError for a missing model or surfs file and ValueError
+    (XModelFormatError, XModelSurfsFormatError) for unreadable ones.
+    """
+    fs = get_game_fs(cod2_path)
+    entry = fs.resolve(f"xmodel/{name}")
+    if entry is None:
+        raise FileNotFoundError(f"xmodel/{name} not found")
+    info = read_xmodel(entry)
+    lod_name = info["lods"][min(lod, len(info["lods"]) - 1)]["name"]
+    surfs_entry = fs.resolve(f"xmodelsurfs/{lod_name}")
+    if surfs_entry is None:
+        raise FileNotFoundError(f"xmodelsurfs/{lod_name} not found")
+    surfaces = read_xmodelsurfs(surfs_entry.read_bytes())
+
+    rotations = translations = None
+    skeleton_error = None
+    parts_entry = fs.resolve(f"xmodelparts/{info['parts']}")
+    if parts_entry is not None:
+        try:
+            rotations, translations = bone_transforms(read_xmodelparts(parts_entry.read_bytes()))
+        except XModelPartsFormatError as e:
+            skeleton_error = str(e)
+
+    vertices, triangles = [], []
+    base = 0
+    for s in surfaces:
+        positions = s["positions"].astype(np.float32)
+        if rotations is not None:
+            bones = s["bones"]
+            valid = (bones >= 0) & (bones < len(rotations))
+            b = bones[valid]
+            positions[valid] = np.einsum("nij,nj->ni", rotations[b], positions[valid]) + translations[b]
+        vertices.append(positions)
+        triangles.append(s["indices"].astype(np.int64) + base)
+        base += s["verts"]
+    if not vertices:
+        return np.zeros((0, 3), dtype=np.float32), np.zeros((0, 3), dtype=np.int64), skeleton_error
+    return np.concatenate(vertices), np.concatenate(triangles), skeleton_error
+
+
+def _view_basis(yaw: float, pitch: float) -> np.ndarray:
+    """Rows: screen right, screen up and towards the camera, in model space (Z up)"""
+    a, e = math.radians(yaw), math.radians(pitch)
+    to_camera = np.array([math.cos(e) * math.cos(a), math.cos(e) * math.sin(a), math.sin(e)])
+    right = np.cross(-to_camera, [0.0, 0.0, 1.0])
+    right /= np.linalg.norm(right)
+    up = np.cross(right, -to_camera)
+    return np.stack([right, up, to_camera]).astype(np.float32)
+
+
+def _flat_shades(view: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """(T,) Lambert intensity per face; normals are turned towards the camera, as winding varies"""
+    v0, v1, v2 = (view[triangles[:, i]] for i in range(3))
+    normals = np.cross(v1 - v0, v2 - v0)
+    normals *= np.where(normals[:, 2] < 0, -1, 1)[:, None]
+    normals /= np.maximum(np.linalg.norm(normals, axis=1), 1e-12)[:, None]
+    light = np.asarray(LIGHT_DIRECTION, dtype=np.float32)
+    light /= np.linalg.norm(light)
+    return AMBIENT + (1 - AMBIENT) * np.clip(normals @ light, 0, 1)
+
+
+def _rasterize(screen: np.ndarray, triangles: np.ndarray, size: int):
+    """
+    Z-buffered coverage of (T, 3) triangles over (V, 3) screen-space vertices
+    (x, y in pixels, z larger = nearer). Returns (pixel indices, triangle ids)
+    of the visible fragments, one per covered pixel.
+    """
+    p0, p1, p2 = (screen[triangles[:, i]] for i in range(3))
+    area = (p1[:, 0] - p0[:, 0]) * (p2[:, 1] - p0[:, 1]) - (p1[:, 1] - p0[:, 1]) * (p2[:, 0] - p0[:, 0])
+    corners = np.stack([p0, p1, p2])
+    x0 = np.clip(np.floor(corners[:, :, 0].min(axis=0) - 0.5), 0, size).astype(np.int64)
+    y0 = np.clip(np.floor(corners[:, :, 1].min(axis=0) - 0.5), 0, size).astype(np.int64)
+    x1 = np.clip(np.ceil(corners[:, :, 0].max(axis=0) + 0.5), 0, size).astype(np.int64)
+    y1 = np.clip(np.ceil(corners[:, :, 1].max(axis=0) + 0.5), 0, size).astype(np.int64)
+    visible = (np.abs(area) > 1e-9) & (x1 > x0) & (y1 > y0)
+
+    # Bucket by the power of two that covers the box, so each bucket is one regular grid
+    extent = np.maximum(x1 - x0, y1 - y0)
+    buckets = np.where(visible, np.ceil(np.log2(np.maximum(extent, 1))).astype(np.int64), -1)
+
+    pixels, depths, owners = [], [], []
+    for k in np.unique(buckets[buckets >= 0]):
+        box = 1 << int(k)
+        ids = np.nonzero(buckets == k)[0]
+        grid = np.arange(box)
+        step = max(1, _RASTER_BATCH // (box * box))
+        for start in range(0, len(ids), step):
+            t = ids[start:start + step]
+            px = x0[t, None, None] + grid[None, None, :]
+            py = y0[t, None, None] + grid[None, :, None]
+            cx, cy = px + 0.5, py + 0.5
+            a, b, c = p0[t], p1[t], p2[t]
+            sign = np.sign(area[t])[:, None, None]
+            w0 = sign * ((b[:, 0, None, None] - cx) * (c[:, 1, None, None] - cy)
+                         - (b[:, 1, None, None] - cy) * (c[:, 0, None, None] - cx))
+            w1 = sign * ((c[:, 0, None, None] - cx) * (a[:, 1, None, None] - cy)
+                         - (c[:, 1, None, None] - cy) * (a[:, 0, None, None] - cx))
+            w2 = sign * ((a[:, 0, None, None] - cx) * (b[:, 1, None, None] - cy)
+                         - (a[:, 1, None, None] - cy) * (b[:, 0, None, None] - cx))
+            inside = ((w0 >= 0) & (w1 >= 0) & (w2 >= 0)
+                      & (px < x1[t, None, None]) & (py < y1[t, None, None]))
+            tri, gy, gx = np.nonzero(inside)
+            if not len(tri):
+                continue
+            weights = np.stack([w0[tri, gy, gx], w1[tri, gy, gx], w2[tri, gy, gx]], axis=1)
+            z = (weights * np.stack([a[tri, 2], b[tri, 2], c[tri, 2]], axis=1)).sum(axis=1) / np.abs(area[t][tri])
+            pixels.append(py[tri, gy, 0] * size + px[tri, 0, gx])
+            depths.append(z)
+            owners.append(t[tri])
+
+    if not pixels:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    pixels = np.concatenate(pixels)
+    depths = np.concatenate(depths)
+    owners = np.concatenate(owners)
+    order = np.lexsort((-depths, pixels))       # per pixel, nearest first
+    pixels = pixels[order]
+    first = np.ones(len(pixels), dtype=bool)
+    first[1:] = pixels[1:] != pixels[:-1]
+    return pixels[first], owners[order][first]
+
+
+def render_mesh(vertices: np.ndarray, triangles: np.ndarray, size: int = 512,
+                yaw: float = VIEW_YAW, pitch: float = VIEW_PITCH) -> Image.Image:
+    """
+    Flat-shaded, z-buffered orthographic view of the mesh, scaled to fill a
+    size x size RGBA image with a transparent background.
+    """
+    image = np.zeros((size * size, 4), dtype=np.uint8)
+    if len(triangles):
+        view = vertices.astype(np.float32) @ _view_basis(yaw, pitch).T
+        used = view[np.unique(triangles)]
+        lo, hi = used.min(axis=0), used.max(axis=0)
+        scale = size * (1 - 2 * MARGIN) / max(float((hi - lo)[:2].max()), 1e-6)
+        center = (lo + hi) / 2
+
+        screen = np.empty_like(view)
+        screen[:, 0] = (view[:, 0] - center[0]) * scale + size / 2
+        screen[:, 1] = size / 2 - (view[:, 1] - center[1]) * scale
+        screen[:, 2] = view[:, 2]
+
+        pixels, owners = _rasterize(screen, triangles, size)
+        shades = _flat_shades(view, triangles)
+        colors = np.clip(np.outer(shades, BASE_COLOR), 0, 255).astype(np.uint8)
+        image[pixels, :3] = colors[owners]
+        image[pixels, 3] = 255
+    return Image.fromarray(image.reshape(size, size, 4), "RGBA")
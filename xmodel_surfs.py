@@ -0,0 +1,153 @@
+# xmodel_surfs.py
+"""
+Reader for CoD2 xmodelsurfs files (the geometry of one model LOD).
+
+Layout (little-endian):
+
+    uint16  version                 # 20
+    uint16  surface_count
+    per surface:
+        uint8   tile_mode
+        uint16  vert_count
+        uint16  tri_count
+        int16   bone                # >= 0: rigid, every vertex on this bone; -1: weighted
+        uint16  blend_count         # weighted surfaces only
+        vertices                    # RIGID_VERTEX, or WEIGHTED_VERTEX + extra weights
+        uint16  indices[tri_count * 3]
+
+Rigid vertices and the index buffers are decoded in bulk with NumPy; weighted
+vertices vary in size and are walked one by one.
+"""
+
+import struct
+from typing import List
+
+import numpy as np
+
+XMODELSURFS_VERSION = 20
+
+_FILE_HEADER = struct.Struct("<HH")
+_SURFACE_HEADER = struct.Struct("<BHHh")
+_BLEND_COUNT = struct.Struct("<H")
+
+_VERTEX_COMMON = [
+    ("normal", "<f4", 3),
+    ("color", "u1", 4),
+    ("uv", "<f4", 2),
+    ("binormal", "<f4", 3),
+    ("tangent", "<f4", 3),
+]
+RIGID_VERTEX = np.dtype(_VERTEX_COMMON + [("position", "<f4", 3)])
+# Followed by (weight_count) x WEIGHT
+WEIGHTED_VERTEX = np.dtype(_VERTEX_COMMON + [("weight_count", "u1"), ("bone", "<u2"), ("offset", "<f4", 3)])
+WEIGHT = np.dtype([("bone", "<u2"), ("offset", "<f4", 3), ("weight", "<f4")])
+_WEIGHT_COUNT_AT = WEIGHTED_VERTEX.fields["weight_count"][1]
+
+
+class XModelSurfsFormatError(ValueError):
+    pass
+
+
+def _weighted_vertices(data: bytes, pos: int, count: int):
+    """Decodes variable-size weighted vertices; returns (vertices, positions = first-bone offsets, end)"""
+    stride = WEIGHTED_VERTEX.itemsize
+    starts = np.empty(count, dtype=np.int64)
+    for i in range(count):
+        if pos + stride > len(data):
+            raise XModelSurfsFormatError("vertex data truncated")
+        starts[i] = pos
+        pos += stride + data[pos + _WEIGHT_COUNT_AT] * WEIGHT.itemsize
+    if pos > len(data):
+        raise XModelSurfsFormatError("vertex data truncated")
+    buf = np.frombuffer(data, dtype=np.uint8)
+    rows = buf[starts[:, None] + np.arange(stride)]
+    verts = rows.view(WEIGHTED_VERTEX).reshape(count)
+    return verts, verts["offset"], pos
+
+
+def read_xmodelsurfs(data: bytes) -> List[dict]:
+    """
+    Decodes every surface of an xmodelsurfs file.
+
+    Returns:
+        list of dicts with:
+            verts: int
+            tris: int
+            bone: int                   # -1 for weighted surfaces
+            indices: np.ndarray         # (tris, 3) uint16
+            positions: np.ndarray       # (verts, 3) float32, relative to the vertex's bone
+            bones: np.ndarray           # (verts,) bone of each vertex (the first-weighted bone)
+            uvs: np.ndarray             # (verts, 2) float32
+    """
+    if len(data) < _FILE_HEADER.size:
+        raise XModelSurfsFormatError("file too short")
+    version, surface_count = _FILE_HEADER.unpack_from(data)
+    if version != XMODELSURFS_VERSION:
+        raise XModelSurfsFormatError(f"unsupported version {version}")
+
+    pos = _FILE_HEADER.size
+    surfaces = []
+    for _ in range(surface_count):
+        if pos + _SURFACE_HEADER.size > len(data):
+            raise XModelSurfsFormatError("surface header truncated")
+        _tile, vert_count, tri_count, bone = _SURFACE_HEADER.unpack_from(data, pos)
+        pos += _SURFACE_HEADER.size
+
+        if bone >= 0:
+            end = pos + vert_count * RIGID_VERTEX.itemsize
+            if end > len(data):
+                raise XModelSurfsFormatError("vertex data truncated")
+            verts = np.frombuffer(data, dtype=RIGID_VERTEX, count=vert_count, offset=pos)
+            positions = verts["position"]
+            bones = np.full(vert_count, bone, dtype=np.int64)
+            pos = end
+        else:
+            pos += _BLEND_COUNT.size
+            verts, positions, pos = _weighted_vertices(data, pos, vert_count)
+            bones = verts["bone"].astype(np.int64)
+
+        end = pos + tri_count * 6
+        if end > len(data):
+            raise XModelSurfsFormatError("index data truncated")
+        indices = np.frombuffer(data, dtype="<u2", count=tri_count * 3, offset=pos).reshape(tri_count, 3)
+        if tri_count and int(indices.max()) >= vert_count:
+            raise XModelSurfsFormatError("index out of range")
+        pos = end
+
+        surfaces.append({
+            "verts": vert_count,
+            "tris": tri_count,
+            "bone": bone,
+            "indices": indices,
+            "positions": positions,
+            "bones": bones,
+            "uvs": verts["uv"],
+        })
+
+    if pos != len(data):
+        raise XModelSurfsFormatError(f"{len(data) - pos} trailing bytes")
+    return surfaces
+
+
+def surfs_stats(surfaces: List[dict]) -> dict:
+    """
+    Totals for one LOD.
+
+    Returns:
+        dict with:
+            surfaces: int
+            verts: int
+            tris: int
+            degenerate_tris: int    # triangles with a repeated index (zero area)
+    """
+    degenerate = 0
+    for s in surfaces:
+        idx = s["indices"]
+        degenerate += int(np.count_nonzero(
+            (idx[:, 0] == idx[:, 1]) | (idx[:, 1] == idx[:, 2]) | (idx[:, 0] == idx[:, 2])))
+    return {
+        "surfaces": len(surfaces),
+        "verts": sum(s["verts"] for s in surfaces),
+        "tris": sum(s["tris"] for s in surfaces),
+        "degenerate_tris": degenerate,
+    }